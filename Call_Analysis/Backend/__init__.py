@@ -0,0 +1,8 @@
+# This file makes Backend a proper Python package
+import os
+import sys
+
+# The Ollama client and response cache live in ollama_shared/ at the repository root, shared with Lamma Code Assist
+_REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _REPOSITORY_ROOT not in sys.path:
+    sys.path.append(_REPOSITORY_ROOT)
@@ -0,0 +1,276 @@
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Prompt for each chunk of the transcript (the "map" step)
+MAP_PROMPT = """You are analysing part {index} of {total} of a call transcript between a customer and a call \
+agent about a complaint on a purchase made on a retail website.
+
+Transcript part:
+{chunk}
+
+Answer with exactly these three sections and nothing else:
+SUMMARY: what happened in this part, in two or three sentences.
+CUSTOMER SENTIMENT: Positive, Neutral or Negative, then a short reason.
+AGENT PERFORMANCE: how well the agent handled this part (empathy, clarity, accuracy, progress towards a fix).
+"""
+
+# Prompt that merges the analyses of consecutive parts into one (the "reduce" step)
+REDUCE_PROMPT = """Below are analyses of consecutive parts of one call transcript, in call order.
+
+{analyses}
+
+Merge them into one analysis of the whole stretch of the call, keeping events in order. Answer with \
+exactly these three sections and nothing else:
+SUMMARY: what happened, in a few sentences.
+CUSTOMER SENTIMENT: how the customer's sentiment changed, e.g. "Negative -> Neutral", then a short reason.
+AGENT PERFORMANCE: how well the agent handled the call so far.
+"""
+
+# Prompt that turns the merged analysis into the final report
+FINAL_PROMPT = """Below is an analysis of a complete call transcript between a customer and a call agent \
+about a complaint on a purchase made on a retail website, in call order.
+
+{analyses}
+
+Write the final report with exactly these sections and nothing else:
+SUMMARY: the whole call in one paragraph.
+SENTIMENT TRAJECTORY: the customer's sentiment at the start, middle and end, e.g. "Negative -> Neutral -> Positive", \
+then one sentence on why it changed.
+AGENT SCORE: a whole number from 1 (poor) to 10 (excellent).
+AGENT FEEDBACK: what the agent did well and what they should improve.
+"""
+
+SENTIMENTS = ("Positive", "Neutral", "Negative", "Mixed")
+_SECTION = re.compile(r"^\s*\**\s*(SUMMARY|CUSTOMER SENTIMENT|AGENT PERFORMANCE|SENTIMENT TRAJECTORY|AGENT SCORE|"
+                      r"AGENT FEEDBACK)\s*\**\s*:\s*", re.IGNORECASE | re.MULTILINE)
+
+
+def make_splitter(chunk_size=1000, chunk_overlap=100):
+    """The character-based splitter the app used before TurnSplitter, kept for comparison."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,  # Size of each chunk in characters
+        chunk_overlap=chunk_overlap,  # Overlap for better context retention
+        separators=["\n\n", "\n", ".", " "]  # Smart split on sentences
+    )
+
+
+def parse_sections(text):
+    """
+    Splits a model answer into {"SUMMARY": ..., "AGENT SCORE": ..., ...} by its section headings.
+    Text before the first heading is kept under "SUMMARY" if the model left the headings out.
+    """
+    sections = {}
+    matches = list(_SECTION.finditer(text))
+    if not matches or text[:matches[0].start()].strip():
+        sections["SUMMARY"] = text[:matches[0].start() if matches else len(text)].strip()
+    for match, next_match in zip(matches, matches[1:] + [None]):
+        end = next_match.start() if next_match else len(text)
+        sections[match.group(1).upper()] = text[match.end():end].strip()
+    return sections
+
+
+def parse_sentiment(text):
+    """Returns the first sentiment label mentioned in the text, or "Unknown"."""
+    match = re.search(r"\b(" + "|".join(SENTIMENTS) + r")\b", text or "", re.IGNORECASE)
+    return match.group(1).capitalize() if match else "Unknown"
+
+
+def parse_score(text):
+    """Returns the agent score as an int from 1 to 10, or None if the model gave none."""
+    match = re.search(r"\d+(?:\.\d+)?", text or "")
+    if match is None:
+        return None
+    return max(1, min(10, round(float(match.group()))))
+
+
+class CallAnalysis:
+    """The result of analysing one transcript."""
+
+    def __init__(self, summary, sentiment_trajectory, sentiment_notes, agent_score, agent_feedback,
+                 chunk_analyses, final_text, stats):
+        self.summary = summary  # One paragraph
+        self.sentiment_trajectory = sentiment_trajectory  # Customer sentiment per chunk, in call order
+        self.sentiment_notes = sentiment_notes  # The model's description of how the sentiment changed
+        self.agent_score = agent_score  # 1-10, or None
+        self.agent_feedback = agent_feedback
+        self.chunk_analyses = chunk_analyses  # Raw answer of the model for every chunk
+        self.final_text = final_text  # Raw answer of the final step
+        self.stats = stats  # Chunks, LLM calls, reduce levels and timings
+
+    def to_dict(self):
+        return {
+            "summary": self.summary,
+            "sentiment_trajectory": self.sentiment_trajectory,
+            "sentiment_notes": self.sentiment_notes,
+            "agent_score": self.agent_score,
+            "agent_feedback": self.agent_feedback,
+            "stats": self.stats,
+        }
+
+
+class AnalysisCancelled(Exception):
+    """Raised by MapReduceAnalyzer.analyze when its cancel event is set."""
+
+
+class MapReduceAnalyzer:
+    """
+    Analyses a call transcript with map-reduce:
+
+    1. Map: every chunk is analysed on its own. Up to `max_in_flight` prompts are sent at the same time,
+       so a long call takes about (chunks / max_in_flight) x model latency instead of chunks x latency.
+    2. Reduce: the chunk analyses are merged `fan_in` at a time, level by level, until at most `fan_in`
+       are left, so no prompt grows with the length of the call.
+    3. Final: one prompt turns what is left into the summary, sentiment trajectory and agent score.
+
+    `llm` is anything with an `invoke(prompt) -> str` method, e.g. PooledOllamaLLM, langchain's OllamaLLM
+    or StubLLM, and for streaming also a `stream(prompt)` method that yields text pieces.
+    Ollama only runs prompts in parallel up to its OLLAMA_NUM_PARALLEL setting; more in flight just queue.
+    """
+
+    def __init__(self, llm, splitter, max_in_flight=4, fan_in=4):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if fan_in < 2:
+            raise ValueError("fan_in must be at least 2")
+        self.llm = llm
+        self.splitter = splitter  # Anything with a split_text(text) -> list of str method
+        self.max_in_flight = max_in_flight
+        self.fan_in = fan_in
+
+    def _generate(self, stage, index, prompt, stream, events, cancel_event):
+        """Runs one prompt on a worker thread. Streamed pieces are put on `events` for the calling thread."""
+        try:
+            if cancel_event.is_set():
+                raise AnalysisCancelled()
+            if not stream:
+                return self.llm.invoke(prompt)
+            sent_time = time.perf_counter()
+            parts = []
+            pieces = self.llm.stream(prompt)
+            try:
+                for piece in pieces:
+                    if cancel_event.is_set():
+                        raise AnalysisCancelled()
+                    if not parts:
+                        first_token_seconds = time.perf_counter() - sent_time
+                    parts.append(piece)
+                    events.put((stage, index, piece, first_token_seconds))
+            finally:
+                close = getattr(pieces, "close", None)
+                if close is not None:
+                    close()  # Closing the stream drops the connection, which makes Ollama stop generating
+            return "".join(parts)
+        finally:
+            events.put((stage, index, None, None))  # Done (or failed); the exception comes with the result
+
+    def _run(self, stage, prompts, executor, report, on_token, cancel_event, stream):
+        """
+        Sends prompts concurrently and returns the answers in the same order. Callbacks are made on the
+        calling thread, so they may update a UI that is not thread-safe.
+        """
+        events = queue.Queue()
+        futures = [executor.submit(self._generate, stage, index, prompt, stream, events, cancel_event)
+                   for index, prompt in enumerate(prompts)]
+        report(stage, 0, len(prompts))
+        done = 0
+        while done < len(prompts):
+            if cancel_event.is_set():
+                raise AnalysisCancelled()
+            try:
+                event_stage, index, piece, first_token_seconds = events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if piece is None:
+                done += 1
+                report(stage, done, len(prompts))
+            else:
+                on_token(event_stage, index, piece, first_token_seconds)
+        return [future.result() for future in futures]
+
+    def analyze(self, transcript, on_progress=None, on_token=None, cancel_event=None):
+        """
+        Analyses a transcript and returns a CallAnalysis.
+
+        `on_progress(stage, done, total)` is called as the "map", "reduce" and "final" steps advance.
+        With `on_token(stage, index, text, first_token_seconds)` the chunk analyses and the final report
+        are streamed: it is called for every piece of text as it arrives, with the time the prompt took
+        to produce its first token. Setting `cancel_event` (a threading.Event) stops every prompt in
+        flight and raises AnalysisCancelled.
+        """
+        if not transcript.strip():
+            raise ValueError("The transcript is empty")
+        report = on_progress or (lambda stage, done, total: None)
+        stream = on_token is not None
+        on_token = on_token or (lambda stage, index, text, first_token_seconds: None)
+        cancel_event = cancel_event or threading.Event()
+        start_time = time.perf_counter()
+        first_token = []
+
+        def record_token(stage, index, text, first_token_seconds):
+            if not first_token:
+                first_token.append(time.perf_counter() - start_time)
+            on_token(stage, index, text, first_token_seconds)
+
+        chunks = self.splitter.split_text(transcript)
+        calls = 0
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="call-analysis")
+        finished = False
+        try:
+            # Step 1: analyse every chunk concurrently
+            prompts = [MAP_PROMPT.format(index=index + 1, total=len(chunks), chunk=chunk)
+                       for index, chunk in enumerate(chunks)]
+            chunk_analyses = self._run("map", prompts, executor, report, record_token, cancel_event, stream)
+            calls += len(prompts)
+            map_seconds = time.perf_counter() - start_time
+
+            # Step 2: merge neighbouring analyses until they fit in one final prompt
+            partials = chunk_analyses
+            levels = 0
+            while len(partials) > self.fan_in:
+                levels += 1
+                groups = [partials[start:start + self.fan_in] for start in range(0, len(partials), self.fan_in)]
+                prompts = [REDUCE_PROMPT.format(analyses=self._join(group)) for group in groups]
+                partials = self._run("reduce", prompts, executor, report, record_token, cancel_event, False)
+                calls += len(prompts)
+            reduce_seconds = time.perf_counter() - start_time - map_seconds
+
+            # Step 3: one final report
+            final_text = self._run("final", [FINAL_PROMPT.format(analyses=self._join(partials))], executor, report,
+                                   record_token, cancel_event, stream)[0]
+            calls += 1
+            finished = True
+        finally:
+            if not finished:
+                cancel_event.set()  # Also stops the workers when a callback raised, e.g. on a Streamlit rerun
+            executor.shutdown(wait=finished, cancel_futures=True)
+
+        sections = parse_sections(final_text)
+        trajectory = [parse_sentiment(parse_sections(answer).get("CUSTOMER SENTIMENT")) for answer in chunk_analyses]
+        stats = {
+            "chunks": len(chunks),
+            "llm_calls": calls,
+            "reduce_levels": levels,
+            "max_in_flight": self.max_in_flight,
+            "first_token_seconds": first_token[0] if first_token else None,
+            "map_seconds": map_seconds,
+            "reduce_seconds": reduce_seconds,
+            "total_seconds": time.perf_counter() - start_time,
+        }
+        return CallAnalysis(
+            summary=sections.get("SUMMARY", ""),
+            sentiment_trajectory=trajectory,
+            sentiment_notes=sections.get("SENTIMENT TRAJECTORY", ""),
+            agent_score=parse_score(sections.get("AGENT SCORE")),
+            agent_feedback=sections.get("AGENT FEEDBACK", ""),
+            chunk_analyses=chunk_analyses,
+            final_text=final_text,
+            stats=stats,
+        )
+
+    @staticmethod
+    def _join(analyses):
+        return "\n\n".join(f"Part {index + 1}:\n{analysis.strip()}" for index, analysis in enumerate(analyses))
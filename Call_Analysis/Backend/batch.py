@@ -0,0 +1,371 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from Backend.analysis import AnalysisCancelled
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    call_id TEXT PRIMARY KEY,
+    source TEXT,
+    transcript_hash TEXT NOT NULL,
+    cache_key TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    latency_seconds REAL,
+    error TEXT,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, not_before);
+CREATE TABLE IF NOT EXISTS results (
+    cache_key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Columns of the results file, one row per call
+RESULT_COLUMNS = ["call_id", "source", "status", "cached", "attempts", "agent_score", "sentiment_start",
+                  "sentiment_end", "sentiment_trajectory", "summary", "sentiment_notes", "agent_feedback",
+                  "chunks", "llm_calls", "latency_seconds", "transcript_hash", "error"]
+
+
+def transcript_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_transcripts(path, id_field="id", text_field="transcript"):
+    """
+    Yields (call_id, source, transcript) from a directory of .txt files (searched recursively, the id
+    is the path without the extension) or a JSONL file with one {"id": ..., "transcript": ...} per line.
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if not name.endswith(".txt"):
+                    continue
+                file_path = os.path.join(root, name)
+                with open(file_path, "r", encoding="utf-8") as f:
+                    yield os.path.splitext(os.path.relpath(file_path, path))[0].replace(os.sep, "/"), file_path, f.read()
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                transcript = record[text_field]
+            except (ValueError, KeyError) as e:
+                raise ValueError(f"{path}:{line_number}: expected a JSON object with a '{text_field}' field ({e})")
+            call_id = str(record.get(id_field) or f"{os.path.basename(path)}:{line_number}")
+            yield call_id, f"{path}:{line_number}", transcript
+
+
+class JobQueue:
+    """
+    A persistent queue of transcripts to analyse, kept in one SQLite file.
+
+    Every call is a row in `jobs` that moves from "pending" to "running" to "done" or "failed".
+    Finished analyses are stored in `results` by cache key (the transcript hash plus the analysis
+    settings), so a transcript seen before, under any call id, is never sent to the model again.
+    Jobs still "running" when the file is opened were cut off by a crash and go back to "pending",
+    so only one batch process should use a queue file at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()  # One connection shared by the worker threads
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self.recovered = self._conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'").rowcount
+        self.cache_hits = 0  # Jobs completed from the results cache since the queue was opened
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add(self, call_id, source, transcript, settings_key):
+        """
+        Queues one call and returns True if it needs analysing. A call that is already queued keeps its
+        state unless its transcript or the analysis settings changed.
+        """
+        text_hash = transcript_hash(transcript)
+        cache_key = transcript_hash(f"{settings_key}\n{text_hash}")
+        with self._lock:
+            row = self._conn.execute("SELECT cache_key, status FROM jobs WHERE call_id = ?", (call_id,)).fetchone()
+            if row is not None and row[0] == cache_key:
+                return row[1] in ("pending", "running")
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO transcripts (hash, text) VALUES (?, ?)", (text_hash, transcript))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (call_id, source, transcript_hash, cache_key) VALUES (?, ?, ?, ?)",
+                    (call_id, source, text_hash, cache_key))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def claim(self, now=None):
+        """
+        Marks the next pending job as running and returns (call_id, cache_key, transcript), or None if no
+        job is due. Jobs whose result is already cached are completed on the way without being returned.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT call_id, cache_key, transcript_hash FROM jobs WHERE status = 'pending' AND not_before <= ? "
+                    "ORDER BY rowid LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                call_id, cache_key, text_hash = row
+                if self._conn.execute("SELECT 1 FROM results WHERE cache_key = ?", (cache_key,)).fetchone():
+                    self._conn.execute("UPDATE jobs SET status = 'done', cached = 1, error = NULL, latency_seconds = 0, "
+                                       "finished_at = ? WHERE call_id = ?", (now, call_id))
+                    self.cache_hits += 1
+                    continue
+                self._conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1 WHERE call_id = ?",
+                                   (call_id,))
+                text = self._conn.execute("SELECT text FROM transcripts WHERE hash = ?", (text_hash,)).fetchone()[0]
+                return call_id, cache_key, text
+
+    def complete(self, call_id, cache_key, result, latency_seconds):
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN")
+            self._conn.execute("INSERT OR REPLACE INTO results (cache_key, result, created_at) VALUES (?, ?, ?)",
+                               (cache_key, json.dumps(result), now))
+            self._conn.execute("UPDATE jobs SET status = 'done', cached = 0, error = NULL, latency_seconds = ?, "
+                               "finished_at = ? WHERE call_id = ?", (latency_seconds, now, call_id))
+            self._conn.execute("COMMIT")
+
+    def fail(self, call_id, error, max_attempts, retry_delay):
+        """Puts a failed job back in the queue after a growing delay, or marks it failed after max_attempts."""
+        with self._lock:
+            attempts = self._conn.execute("SELECT attempts FROM jobs WHERE call_id = ?", (call_id,)).fetchone()[0]
+            if attempts < max_attempts:
+                self._conn.execute("UPDATE jobs SET status = 'pending', error = ?, not_before = ? WHERE call_id = ?",
+                                   (error, time.time() + retry_delay * 2 ** (attempts - 1), call_id))
+                return True
+            self._conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE call_id = ?",
+                               (error, time.time(), call_id))
+            return False
+
+    def release(self, call_id):
+        """Puts a job that was interrupted back in the queue without counting the attempt."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'pending', attempts = attempts - 1 WHERE call_id = ?",
+                               (call_id,))
+
+    def retry_failed(self):
+        """Gives every failed job a fresh set of attempts."""
+        with self._lock:
+            return self._conn.execute("UPDATE jobs SET status = 'pending', attempts = 0, not_before = 0 "
+                                      "WHERE status = 'failed'").rowcount
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def next_due(self):
+        """Seconds until the next pending job may run, or None if nothing is pending."""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(not_before) FROM jobs WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def rows(self):
+        """Yields one flat dict per call, in the order the calls were queued, for the results file."""
+        with self._lock:
+            records = self._conn.execute(
+                "SELECT jobs.call_id, jobs.source, jobs.status, jobs.cached, jobs.attempts, jobs.latency_seconds, "
+                "jobs.transcript_hash, jobs.error, results.result FROM jobs "
+                "LEFT JOIN results ON results.cache_key = jobs.cache_key ORDER BY jobs.rowid").fetchall()
+        for call_id, source, status, cached, attempts, latency, text_hash, error, result in records:
+            result = json.loads(result) if result else {}
+            trajectory = result.get("sentiment_trajectory") or []
+            stats = result.get("stats") or {}
+            yield {
+                "call_id": call_id,
+                "source": source,
+                "status": status,
+                "cached": bool(cached),
+                "attempts": attempts,
+                "agent_score": result.get("agent_score"),
+                "sentiment_start": trajectory[0] if trajectory else None,
+                "sentiment_end": trajectory[-1] if trajectory else None,
+                "sentiment_trajectory": " -> ".join(trajectory) if trajectory else None,
+                "summary": result.get("summary"),
+                "sentiment_notes": result.get("sentiment_notes"),
+                "agent_feedback": result.get("agent_feedback"),
+                "chunks": stats.get("chunks"),
+                "llm_calls": stats.get("llm_calls"),
+                "latency_seconds": latency,
+                "transcript_hash": text_hash,
+                "error": error,
+            }
+
+
+def write_results(rows, path):
+    """
+    Writes the result rows to a .parquet file (needs pyarrow) or, for any other extension, a CSV file.
+    The file is written next to its final name and then moved into place, so readers never see half of it.
+    """
+    rows = list(rows)
+    temp_path = path + ".tmp"
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(rows, schema=pa.schema([
+            ("call_id", pa.string()), ("source", pa.string()), ("status", pa.string()), ("cached", pa.bool_()),
+            ("attempts", pa.int32()), ("agent_score", pa.int32()), ("sentiment_start", pa.string()),
+            ("sentiment_end", pa.string()), ("sentiment_trajectory", pa.string()), ("summary", pa.string()),
+            ("sentiment_notes", pa.string()), ("agent_feedback", pa.string()), ("chunks", pa.int32()),
+            ("llm_calls", pa.int32()), ("latency_seconds", pa.float64()), ("transcript_hash", pa.string()),
+            ("error", pa.string()),
+        ]))
+        pq.write_table(table, temp_path)
+    else:
+        with open(temp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(temp_path, path)
+    return len(rows)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class BatchRunner:
+    """
+    Drains a JobQueue with `workers` threads, each analysing one transcript at a time with `analyzer`.
+    Each analysis sends up to analyzer.max_in_flight prompts at once, so the model sees up to
+    workers x max_in_flight requests; keep that near Ollama's OLLAMA_NUM_PARALLEL.
+
+    A failed analysis is retried up to `max_attempts` times, `retry_delay` seconds later and then twice as
+    long each time. `stop()` interrupts the analyses in flight and puts them back in the queue.
+    """
+
+    def __init__(self, job_queue, analyzer, workers=2, max_attempts=3, retry_delay=5.0, on_job=None):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.queue = job_queue
+        self.analyzer = analyzer
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.on_job = on_job or (lambda call_id, status, latency_seconds, error: None)  # Called from worker threads
+        self._stopping = threading.Event()
+        self._cancel_events = set()
+        self._lock = threading.Lock()
+        self.latencies = []  # Seconds per analysed call in this run
+        self.analysed = 0
+        self.failed = 0
+        self.retried = 0
+        self.llm_calls = 0
+
+    def stop(self):
+        self._stopping.set()
+        with self._lock:
+            for cancel_event in self._cancel_events:
+                cancel_event.set()
+
+    def _process(self, call_id, cache_key, transcript):
+        cancel_event = threading.Event()
+        with self._lock:
+            self._cancel_events.add(cancel_event)
+        if self._stopping.is_set():
+            cancel_event.set()
+        start_time = time.perf_counter()
+        try:
+            analysis = self.analyzer.analyze(transcript, cancel_event=cancel_event)
+        except AnalysisCancelled:
+            self.queue.release(call_id)
+            return
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            will_retry = self.queue.fail(call_id, error, self.max_attempts, self.retry_delay)
+            with self._lock:
+                if will_retry:
+                    self.retried += 1
+                else:
+                    self.failed += 1
+            self.on_job(call_id, "retry" if will_retry else "failed", time.perf_counter() - start_time, error)
+            return
+        finally:
+            with self._lock:
+                self._cancel_events.discard(cancel_event)
+        latency = time.perf_counter() - start_time
+        self.queue.complete(call_id, cache_key, analysis.to_dict(), latency)
+        with self._lock:
+            self.analysed += 1
+            self.llm_calls += analysis.stats["llm_calls"]
+            self.latencies.append(latency)
+        self.on_job(call_id, "done", latency, None)
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            job = self.queue.claim()
+            if job is not None:
+                self._process(*job)
+                continue
+            counts = self.queue.counts()
+            if counts["pending"] == 0 and counts["running"] == 0:
+                return
+            # Other workers still busy, or retries waiting for their delay: check again shortly
+            wait = self.queue.next_due()
+            self._stopping.wait(0.2 if wait is None else min(max(wait, 0.05), 1.0))
+
+    def run(self):
+        """Processes the queue until it is empty or stop() is called, and returns a report dict."""
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch-worker") as executor:
+            futures = [executor.submit(self._worker) for _ in range(self.workers)]
+            try:
+                wait(futures, return_when=FIRST_EXCEPTION)
+            except KeyboardInterrupt:
+                self.stop()  # The executor then waits for the workers to put their jobs back
+                raise
+            if any(future.exception() for future in futures if future.done()):
+                self.stop()
+            for future in futures:
+                future.result()
+        return self.report(time.perf_counter() - start_time)
+
+    def report(self, wall_seconds):
+        counts = self.queue.counts()
+        return {
+            "wall_seconds": wall_seconds,
+            "analysed": self.analysed,
+            "cache_hits": self.queue.cache_hits,
+            "failed": self.failed,
+            "retried": self.retried,
+            "llm_calls": self.llm_calls,
+            "calls_per_minute": self.analysed * 60.0 / wall_seconds if wall_seconds > 0 else 0.0,
+            "latency_p50_seconds": percentile(self.latencies, 0.5),
+            "latency_p95_seconds": percentile(self.latencies, 0.95),
+            "latency_max_seconds": max(self.latencies) if self.latencies else None,
+            "queue": counts,
+        }
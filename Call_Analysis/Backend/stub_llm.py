@@ -0,0 +1,95 @@
+import re
+import threading
+import time
+
+_NEGATIVE = ("angry", "upset", "frustrat", "terrible", "unacceptable", "broken", "damaged", "refund", "complain",
+             "disappoint", "still waiting", "not happy", "wrong")
+_POSITIVE = ("thank", "great", "appreciate", "perfect", "resolved", "happy", "helpful", "wonderful")
+
+
+class StubLLM:
+    """
+    A local stand-in for PooledOllamaLLM that needs no model server.
+
+    It answers in the section format the analysis prompts ask for, with a sentiment guessed from keywords,
+    after `latency` seconds. `stream` yields the same answer word by word, the first after `latency`
+    seconds and then one every `token_latency` seconds. It counts calls and the most prompts it had in
+    flight at once, so the concurrency of the analysis can be checked offline.
+    """
+
+    def __init__(self, latency=0.0, agent_score=7, token_latency=0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.agent_score = agent_score
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sentiment(text):
+        text = text.lower()
+        negative = sum(text.count(word) for word in _NEGATIVE)
+        positive = sum(text.count(word) for word in _POSITIVE)
+        if negative > positive:
+            return "Negative"
+        return "Positive" if positive > negative else "Neutral"
+
+    @staticmethod
+    def _first_sentence(text):
+        text = " ".join(text.split())
+        return re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0][:200]
+
+    def _answer(self, prompt):
+        # Sections are only read from the analyses above the instructions, never from the instructions themselves
+        if "Write the final report" in prompt:
+            analyses = prompt.split("Write the final report", 1)[0]
+            sentiments = re.findall(r"CUSTOMER SENTIMENT:\s*(\w+)", analyses)
+            trajectory = " -> ".join(sentiments[:1] + sentiments[len(sentiments) // 2:][:1] + sentiments[-1:])
+            summaries = re.findall(r"SUMMARY:\s*(.+)", analyses)
+            return (f"SUMMARY: {' '.join(summary.strip() for summary in summaries)}\n"
+                    f"SENTIMENT TRAJECTORY: {trajectory or 'Neutral'}. The stub model does not explain changes.\n"
+                    f"AGENT SCORE: {self.agent_score}\n"
+                    f"AGENT FEEDBACK: The agent stayed polite and followed up on the order.")
+        if "Merge them" in prompt:
+            analyses = prompt.split("Merge them", 1)[0]
+            summaries = re.findall(r"SUMMARY:\s*(.+)", analyses)
+            sentiments = re.findall(r"CUSTOMER SENTIMENT:\s*(.+)", analyses)
+            return (f"SUMMARY: {' '.join(summary.strip() for summary in summaries)}\n"
+                    f"CUSTOMER SENTIMENT: {' -> '.join(sentiment.split()[0] for sentiment in sentiments)}\n"
+                    f"AGENT PERFORMANCE: Consistent across these parts.")
+        chunk = prompt.split("Transcript part:", 1)[-1].split("Answer with", 1)[0]
+        return (f"SUMMARY: {self._first_sentence(chunk)}\n"
+                f"CUSTOMER SENTIMENT: {self._sentiment(chunk)} (keyword estimate)\n"
+                f"AGENT PERFORMANCE: The agent responded to the customer.")
+
+    def _start(self):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def invoke(self, prompt, **kwargs):
+        self._start()
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return self._answer(prompt)
+        finally:
+            self._finish()
+
+    def stream(self, prompt, **kwargs):
+        self._start()
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            for position, word in enumerate(re.split(r"(?<=\s)", self._answer(prompt))):
+                if position and self.token_latency:
+                    time.sleep(self.token_latency)
+                yield word
+        finally:
+            self._finish()
@@ -0,0 +1,199 @@
+import re
+import threading
+
+# Context window the app runs llama3.2 with. Ollama cuts prompts to its num_ctx, so the same number is passed
+# to the model and used for the chunk budget.
+CONTEXT_WINDOW = 8192
+
+# "Agent: ...", "Customer: ...", "Priya (Agent): ..." at the start of a line
+_SPEAKER = re.compile(r"^\s*([A-Z][\w .'()&-]{0,40}?)\s*:\s")
+# Roughly the pieces the llama 3 tokenizer splits text into before byte-pair merging
+_PIECES = re.compile(r"'(?:s|t|re|ve|m|ll|d)\b|[^\W\d_]+|\d{1,3}|[^\w\s]+|\s+", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class EstimatedTokenCounter:
+    """
+    Estimates llama 3 token counts without a model server: one token per word piece, plus one per extra
+    eight letters in long words. It is within about 10% of the real count on English transcripts.
+    """
+
+    name = "estimate"
+
+    def count(self, text):
+        tokens = 0
+        for piece in _PIECES.findall(text):
+            if piece.isspace():
+                tokens += 1 if "\n" in piece or len(piece) > 1 else 0  # A single space merges into the next word
+            elif piece[0].isalpha():
+                tokens += 1 + (len(piece) - 1) // 8
+            else:
+                tokens += len(piece) if piece[0] in "!?.,;:" and len(piece) > 3 else 1
+        return tokens
+
+    def count_many(self, texts):
+        return [self.count(text) for text in texts]
+
+
+class OllamaTokenCounter:
+    """
+    Counts tokens with the model's own tokenizer, through the `prompt_eval_count` Ollama reports for
+    /api/embed. Counts include the begin-of-text token, so they are one above the bare text.
+
+    `count_many` costs one request for all the texts: it counts them together and scales the estimated
+    count of each text so the parts add up to the real total.
+    """
+
+    name = "ollama"
+
+    def __init__(self, model="llama3.2", num_ctx=CONTEXT_WINDOW):
+        self.model = model
+        # Same num_ctx and keep_alive as the generation requests, or Ollama would load the model again for them
+        self.options = {"num_ctx": num_ctx}
+        self.estimate = EstimatedTokenCounter()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def count(self, text):
+        with self._lock:
+            if text in self._cache:
+                return self._cache[text]
+        from ollama_shared.ollama_client import KEEP_ALIVE, get_session, ollama_host  # requests is only needed here
+        response = get_session().post(ollama_host() + "/api/embed", timeout=60, json={
+            "model": self.model, "input": text, "options": self.options, "keep_alive": KEEP_ALIVE})
+        response.raise_for_status()
+        tokens = response.json()["prompt_eval_count"]
+        with self._lock:
+            if len(self._cache) > 10000:
+                self._cache.clear()
+            self._cache[text] = tokens
+        return tokens
+
+    def count_many(self, texts):
+        estimates = self.estimate.count_many(texts)
+        if not texts:
+            return estimates
+        scale = self.count("\n".join(texts)) / max(1, sum(estimates))
+        return [max(1, round(estimate * scale)) for estimate in estimates]
+
+
+def make_token_counter(model="llama3.2", num_ctx=CONTEXT_WINDOW):
+    """Returns an OllamaTokenCounter if the Ollama server answers, otherwise an EstimatedTokenCounter."""
+    from ollama_shared.ollama_client import server_running
+    if server_running():
+        return OllamaTokenCounter(model, num_ctx)
+    print("Error counting tokens with Ollama: the server is not running, using estimated counts")
+    return EstimatedTokenCounter()
+
+
+def split_turns(text):
+    """
+    Splits a transcript into speaker turns: a line starting with "Name:" begins a turn and lines without
+    a speaker belong to the turn above. A transcript with no speaker labels is split into paragraphs.
+    """
+    lines = text.strip().splitlines()
+    if not any(_SPEAKER.match(line) for line in lines):
+        return [paragraph.strip() for paragraph in re.split(r"\n\s*\n", text) if paragraph.strip()]
+    turns = []
+    for line in lines:
+        if _SPEAKER.match(line) or not turns:
+            turns.append(line.rstrip())
+        elif line.strip():
+            turns[-1] += "\n" + line.rstrip()
+    return turns
+
+
+class TurnSplitter:
+    """
+    Splits a transcript into chunks of whole speaker turns, measured in model tokens.
+
+    Each chunk holds as many consecutive turns as fit in `share` of the model's context window; the rest
+    of the window is left for the prompt instructions and the answer. The last `overlap_turns` turns of
+    a chunk are repeated at the start of the next one for context. A turn too long for one chunk is split
+    at sentence ends, with its speaker label repeated on every part. Drop-in replacement for langchain's
+    text splitters in MapReduceAnalyzer.
+    """
+
+    def __init__(self, counter, context_window=CONTEXT_WINDOW, share=0.25, overlap_turns=1):
+        if not 0 < share <= 0.8:
+            raise ValueError("share must be above 0 and at most 0.8, leaving room for the prompt and the answer")
+        self.counter = counter
+        self.context_window = context_window
+        self.share = share
+        self.overlap_turns = overlap_turns
+        self.budget = int(context_window * share)  # Tokens per chunk
+
+    def _split_long_turn(self, turn):
+        """Splits one turn that is over the budget into parts at sentence ends (or words, if it must)."""
+        match = _SPEAKER.match(turn)
+        first_prefix = turn[:match.end()] if match else ""
+        prefix = f"{match.group(1)} (continued): " if match else ""
+        prefix_size = EstimatedTokenCounter().count(prefix) + 1
+        sentences = _SENTENCE_END.split(turn[len(first_prefix):])
+        pieces = []
+        for sentence, size in zip(sentences, self.counter.count_many(sentences)):
+            if size <= self.budget // 2:
+                pieces.append(sentence)
+                continue
+            words = sentence.split(" ")
+            step = max(1, len(words) * (self.budget // 2) // size)
+            pieces.extend(" ".join(words[start:start + step]) for start in range(0, len(words), step))
+        parts = []
+        current, current_size = [], prefix_size
+        for piece, size in zip(pieces, self.counter.count_many(pieces)):
+            if current and current_size + size + 1 > self.budget:
+                parts.append((prefix if parts else first_prefix) + " ".join(current))
+                current, current_size = [], prefix_size
+            current.append(piece)
+            current_size += size + 1
+        if current:
+            parts.append((prefix if parts else first_prefix) + " ".join(current))
+        return parts
+
+    def _pack(self, sizes):
+        """Groups turn indexes into chunks of at most `budget` tokens, counting one token per line break."""
+        chunks = []
+        current, current_size = [], 0
+        for index, size in enumerate(sizes):
+            cost = size + 1
+            if current and current_size + cost > self.budget:
+                chunks.append(current)
+                # Carry the last turns over for context, as long as they leave room for new ones
+                carried = current[-self.overlap_turns:] if self.overlap_turns else []
+                carried_size = sum(sizes[carried_index] + 1 for carried_index in carried)
+                if carried_size > self.budget // 4 or carried_size + cost > self.budget:
+                    carried, carried_size = [], 0
+                current, current_size = list(carried), carried_size
+            current.append(index)
+            current_size += cost
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _checked(self, turns):
+        """Joins turns into chunks, halving any chunk whose real token count is over the budget."""
+        text = "\n".join(turns)
+        if len(turns) == 1 or self.counter.count(text) <= self.budget:
+            return [text]
+        middle = len(turns) // 2
+        return self._checked(turns[:middle]) + self._checked(turns[middle:])
+
+    def split_text(self, text):
+        turns = split_turns(text)
+        sizes = self.counter.count_many(turns)
+        pieces, piece_sizes = [], []
+        for turn, size in zip(turns, sizes):
+            if size + 1 > self.budget:
+                parts = self._split_long_turn(turn)
+                pieces.extend(parts)
+                piece_sizes.extend(self.counter.count_many(parts))
+            else:
+                pieces.append(turn)
+                piece_sizes.append(size)
+        chunks = []
+        for group in self._pack(piece_sizes):
+            chunks.extend(self._checked([pieces[index] for index in group]))
+        return chunks
+
+    def count_tokens(self, text):
+        return self.counter.count(text)
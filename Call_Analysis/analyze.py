@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+from Backend.analysis import MapReduceAnalyzer, make_splitter
+from Backend.token_splitter import CONTEXT_WINDOW, EstimatedTokenCounter, TurnSplitter, make_token_counter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarises a call transcript and scores the customer sentiment "
+                                                 "and the agent, without the Streamlit app.")
+    parser.add_argument("transcript", help="Transcript text file, or - to read standard input")
+    parser.add_argument("--model", default="llama3.2", help="Ollama model name")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Chunk prompts sent to the model at the same time")
+    parser.add_argument("--fan-in", type=int, default=4, help="Analyses merged by each reduce prompt")
+    parser.add_argument("--splitter", choices=["turns", "characters"], default="turns",
+                        help="Chunks of whole speaker turns measured in tokens, or the old character chunks")
+    parser.add_argument("--context-window", type=int, default=CONTEXT_WINDOW, help="Model context window (num_ctx)")
+    parser.add_argument("--chunk-share", type=float, default=0.25, help="Share of the context window per chunk")
+    parser.add_argument("--overlap-turns", type=int, default=1, help="Turns repeated at the start of the next chunk")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Characters per chunk (--splitter characters)")
+    parser.add_argument("--chunk-overlap", type=int, default=100, help="Characters of overlap (--splitter characters)")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub model instead of Ollama")
+    parser.add_argument("--no-cache", action="store_true", help="Always ask the model instead of reusing cached "
+                                                                 "answers (see LLM_CACHE_* in the readme)")
+    parser.add_argument("--stub-latency", type=float, default=1.0, help="Seconds the stub model takes per prompt")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args()
+
+    if args.transcript == "-":
+        transcript = sys.stdin.read()
+    else:
+        with open(args.transcript, "r", encoding="utf-8") as f:
+            transcript = f.read()
+
+    if args.stub:
+        from Backend.stub_llm import StubLLM
+        llm = StubLLM(latency=args.stub_latency)
+    else:
+        from ollama_shared.llm_cache import CachedLLM, ResponseCache
+        from ollama_shared.ollama_client import KEEP_ALIVE, PooledOllamaLLM
+        llm = PooledOllamaLLM(model=args.model, num_ctx=args.context_window, keep_alive=KEEP_ALIVE)
+        response_cache = None if args.no_cache else ResponseCache.from_env()
+        if response_cache is not None:
+            llm = CachedLLM(llm, response_cache)
+
+    if args.splitter == "turns":
+        counter = EstimatedTokenCounter() if args.stub else make_token_counter(args.model, args.context_window)
+        splitter = TurnSplitter(counter, args.context_window, args.chunk_share, args.overlap_turns)
+    else:
+        splitter = make_splitter(args.chunk_size, args.chunk_overlap)
+    analyzer = MapReduceAnalyzer(llm, splitter, max_in_flight=args.max_in_flight, fan_in=args.fan_in)
+
+    def on_progress(stage, done, total):
+        print(f"{stage}: {done}/{total}", file=sys.stderr, flush=True)
+
+    analysis = analyzer.analyze(transcript, on_progress=on_progress)
+    if args.json:
+        print(json.dumps(analysis.to_dict(), indent=2))
+        return
+    stats = analysis.stats
+    print(f"Summary:\n{analysis.summary}\n")
+    print(f"Sentiment per chunk: {' -> '.join(analysis.sentiment_trajectory)}")
+    print(f"Sentiment trajectory: {analysis.sentiment_notes}\n")
+    print(f"Agent score: {analysis.agent_score}/10")
+    print(f"Agent feedback: {analysis.agent_feedback}\n")
+    print(f"{stats['chunks']} chunks, {stats['llm_calls']} LLM calls, {stats['reduce_levels']} reduce levels, "
+          f"map {stats['map_seconds']:.1f}s, reduce {stats['reduce_seconds']:.1f}s, total {stats['total_seconds']:.1f}s")
+    response_cache = getattr(llm, "cache", None)
+    if response_cache is not None:
+        cache_stats = response_cache.stats()
+        print(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+              f"{cache_stats['entries']} answers stored in {response_cache.path}")
+
+
+if __name__ == "__main__":
+    main()
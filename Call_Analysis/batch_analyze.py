@@ -0,0 +1,150 @@
+import argparse
+import importlib.util
+import json
+import signal
+import sys
+import threading
+from Backend.analysis import FINAL_PROMPT, MAP_PROMPT, REDUCE_PROMPT, MapReduceAnalyzer, make_splitter
+from Backend.batch import BatchRunner, JobQueue, read_transcripts, transcript_hash, write_results
+from Backend.token_splitter import CONTEXT_WINDOW, EstimatedTokenCounter, TurnSplitter, make_token_counter
+
+
+def settings_key(model, args):
+    """Everything that changes an analysis; a result is only reused for the same transcript and settings."""
+    prompts = transcript_hash(MAP_PROMPT + REDUCE_PROMPT + FINAL_PROMPT)
+    if args.splitter == "turns":
+        chunking = f"turns|{args.context_window}|{args.chunk_share}|{args.overlap_turns}"
+    else:
+        chunking = f"characters|{args.chunk_size}|{args.chunk_overlap}"
+    return f"{model}|{chunking}|{args.fan_in}|{prompts}"
+
+
+def format_seconds(value):
+    return "n/a" if value is None else f"{value:.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyses many call transcripts without the Streamlit app. Calls are "
+                                                 "kept in a SQLite job queue, so an interrupted run picks up where "
+                                                 "it stopped when started again with the same --db.")
+    parser.add_argument("inputs", nargs="*", help="Directories of .txt transcripts or JSONL files; leave out to "
+                                                  "finish the calls already queued in --db")
+    parser.add_argument("--db", default="batch_jobs.sqlite", help="Job queue and result cache")
+    parser.add_argument("--output", default="results.parquet", help="Results file: .parquet (columnar, needs pyarrow) "
+                                                                      "or .csv")
+    parser.add_argument("--report", help="Also write the throughput and latency report to this JSON file")
+    parser.add_argument("--id-field", default="id", help="JSONL field with the call id")
+    parser.add_argument("--text-field", default="transcript", help="JSONL field with the transcript")
+    parser.add_argument("--workers", type=int, default=2, help="Transcripts analysed at the same time")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Tries per transcript before it is marked failed")
+    parser.add_argument("--retry-delay", type=float, default=5.0, help="Seconds before the first retry, doubled "
+                                                                       "for every further retry")
+    parser.add_argument("--retry-failed", action="store_true", help="Queue the calls that failed in earlier runs again")
+    parser.add_argument("--model", default="llama3.2", help="Ollama model name")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Chunk prompts per transcript sent at once")
+    parser.add_argument("--fan-in", type=int, default=4, help="Analyses merged by each reduce prompt")
+    parser.add_argument("--splitter", choices=["turns", "characters"], default="turns",
+                        help="Chunks of whole speaker turns measured in tokens, or the old character chunks")
+    parser.add_argument("--context-window", type=int, default=CONTEXT_WINDOW, help="Model context window (num_ctx)")
+    parser.add_argument("--chunk-share", type=float, default=0.25, help="Share of the context window per chunk")
+    parser.add_argument("--overlap-turns", type=int, default=1, help="Turns repeated at the start of the next chunk")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Characters per chunk (--splitter characters)")
+    parser.add_argument("--chunk-overlap", type=int, default=100, help="Characters of overlap (--splitter characters)")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub model instead of Ollama")
+    parser.add_argument("--no-cache", action="store_true", help="Always ask the model instead of reusing cached "
+                                                                 "answers (see LLM_CACHE_* in the readme)")
+    parser.add_argument("--stub-latency", type=float, default=1.0, help="Seconds the stub model takes per prompt")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final report")
+    args = parser.parse_args()
+    if args.output.endswith(".parquet"):
+        # Checked now rather than after the whole batch has run
+        if importlib.util.find_spec("pyarrow") is None:
+            parser.error("writing .parquet needs pyarrow (pip install pyarrow), or pass --output results.csv")
+
+    if args.stub:
+        from Backend.stub_llm import StubLLM
+        llm = StubLLM(latency=args.stub_latency)
+        model = "stub"
+    else:
+        from ollama_shared.llm_cache import CachedLLM, ResponseCache
+        from ollama_shared.ollama_client import KEEP_ALIVE, PooledOllamaLLM, warm_up
+        llm = PooledOllamaLLM(model=args.model, num_ctx=args.context_window, keep_alive=KEEP_ALIVE)
+        response_cache = None if args.no_cache else ResponseCache.from_env()
+        if response_cache is not None:
+            llm = CachedLLM(llm, response_cache)
+        model = args.model
+        # Load the model before the workers start, so the first calls do not all wait for it
+        try:
+            print(f"{model} loaded in {warm_up(model, options={'num_ctx': args.context_window}):.1f}s", file=sys.stderr)
+        except Exception as e:
+            print(f"Error warming up {model}: {e}", file=sys.stderr)
+
+    if args.splitter == "turns":
+        counter = EstimatedTokenCounter() if args.stub else make_token_counter(args.model, args.context_window)
+        splitter = TurnSplitter(counter, args.context_window, args.chunk_share, args.overlap_turns)
+    else:
+        splitter = make_splitter(args.chunk_size, args.chunk_overlap)
+    analyzer = MapReduceAnalyzer(llm, splitter, max_in_flight=args.max_in_flight, fan_in=args.fan_in)
+    job_queue = JobQueue(args.db)
+    if job_queue.recovered:
+        print(f"Resuming {job_queue.recovered} calls that were running when the last run stopped", file=sys.stderr)
+    if args.retry_failed:
+        print(f"Queued {job_queue.retry_failed()} failed calls again", file=sys.stderr)
+
+    # Step 1: queue the transcripts; calls already done with the same transcript and settings are skipped
+    key = settings_key(model, args)
+    queued = seen = 0
+    for path in args.inputs:
+        for call_id, source, transcript in read_transcripts(path, args.id_field, args.text_field):
+            seen += 1
+            if not transcript.strip():
+                print(f"Skipping {call_id}: empty transcript", file=sys.stderr)
+                continue
+            queued += job_queue.add(call_id, source, transcript, key)
+    if args.inputs:
+        print(f"{seen} transcripts read, {queued} to analyse", file=sys.stderr)
+
+    # Step 2: analyse the queue with a pool of workers
+    print_lock = threading.Lock()
+
+    def on_job(call_id, status, latency_seconds, error):
+        if args.quiet:
+            return
+        with print_lock:
+            print(f"{status:>6} {call_id} in {latency_seconds:.1f}s" + (f": {error}" if error else ""),
+                  file=sys.stderr, flush=True)
+
+    runner = BatchRunner(job_queue, analyzer, workers=args.workers, max_attempts=args.max_attempts,
+                         retry_delay=args.retry_delay, on_job=on_job)
+    signal.signal(signal.SIGTERM, lambda signum, frame: runner.stop())
+    interrupted = False
+    try:
+        report = runner.run()
+    except KeyboardInterrupt:
+        interrupted = True
+        report = runner.report(0.0)
+        print("Interrupted; run again with the same --db to finish the remaining calls", file=sys.stderr)
+
+    # Step 3: write every call in the queue, including earlier runs, to the results file
+    rows = write_results(job_queue.rows(), args.output)
+    job_queue.close()
+
+    counts = report["queue"]
+    print(f"Wrote {rows} calls to {args.output} ({counts['done']} done, {counts['failed']} failed, "
+          f"{counts['pending'] + counts['running']} left)")
+    if not interrupted:
+        print(f"Analysed {report['analysed']} calls in {report['wall_seconds']:.1f}s "
+              f"({report['calls_per_minute']:.1f} calls/min), {report['cache_hits']} from cache, "
+              f"{report['retried']} retries, {report['failed']} failed, {report['llm_calls']} LLM calls")
+        print(f"Latency per call: p50 {format_seconds(report['latency_p50_seconds'])}, "
+              f"p95 {format_seconds(report['latency_p95_seconds'])}, "
+              f"max {format_seconds(report['latency_max_seconds'])}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if counts["failed"] or counts["pending"] or counts["running"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+from Backend.analysis import MapReduceAnalyzer, make_splitter
+from Backend.batch import read_transcripts
+from Backend.stub_llm import StubLLM
+from Backend.token_splitter import CONTEXT_WINDOW, TurnSplitter, make_token_counter, split_turns
+
+
+class RecordingLLM:
+    """The offline stub model, keeping every prompt it is sent so the prompts can be measured."""
+
+    def __init__(self):
+        self.llm = StubLLM()
+        self.prompts = []
+
+    def invoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return self.llm.invoke(prompt)
+
+
+def measure(splitter, transcript, counter, fan_in):
+    """Runs the analysis with the stub model and returns the chunks, LLM calls and prompt tokens it takes."""
+    llm = RecordingLLM()
+    analysis = MapReduceAnalyzer(llm, splitter, max_in_flight=1, fan_in=fan_in).analyze(transcript)
+    chunks = splitter.split_text(transcript)
+    turns = split_turns(transcript)
+    return {
+        "chunks": len(chunks),
+        "llm_calls": analysis.stats["llm_calls"],
+        "prompt_tokens": sum(counter.count_many(llm.prompts)),
+        "largest_chunk_tokens": max(counter.count_many(chunks)),
+        # A chunk that does not end with a whole turn cut a turn in two
+        "turns_cut": sum(1 for chunk in chunks[:-1] if not any(chunk.rstrip().endswith(turn) for turn in turns)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the token-budget turn splitter with the character "
+                                                 "splitter: chunks, LLM calls and prompt tokens per transcript.")
+    parser.add_argument("inputs", nargs="*", default=["samples"], help="Directories of .txt transcripts or JSONL files")
+    parser.add_argument("--model", default="llama3.2", help="Ollama model whose tokenizer counts the tokens")
+    parser.add_argument("--context-window", type=int, default=CONTEXT_WINDOW)
+    parser.add_argument("--chunk-share", type=float, default=0.25)
+    parser.add_argument("--overlap-turns", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Characters per chunk of the character splitter")
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--fan-in", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args()
+
+    counter = make_token_counter(args.model, args.context_window)
+    splitters = {
+        "characters": make_splitter(args.chunk_size, args.chunk_overlap),
+        "turns": TurnSplitter(counter, args.context_window, args.chunk_share, args.overlap_turns),
+    }
+    rows = []
+    for path in args.inputs:
+        for call_id, source, transcript in read_transcripts(path):
+            row = {"call_id": call_id, "transcript_tokens": counter.count(transcript)}
+            for name, splitter in splitters.items():
+                row[name] = measure(splitter, transcript, counter, args.fan_in)
+            rows.append(row)
+
+    totals = {name: {key: sum(row[name][key] for row in rows) for key in ("chunks", "llm_calls", "prompt_tokens",
+                                                                          "turns_cut")}
+              for name in splitters}
+    saved_calls = totals["characters"]["llm_calls"] - totals["turns"]["llm_calls"]
+    saved_tokens = totals["characters"]["prompt_tokens"] - totals["turns"]["prompt_tokens"]
+    if args.json:
+        print(json.dumps({"counter": counter.name, "transcripts": rows, "totals": totals,
+                          "saved_llm_calls": saved_calls, "saved_prompt_tokens": saved_tokens}, indent=2))
+        return
+
+    print(f"Tokens counted with: {counter.name}; turn chunks up to {splitters['turns'].budget} tokens "
+          f"({args.chunk_share:.0%} of {args.context_window}), character chunks of {args.chunk_size} characters")
+    print(f"{'Transcript':<32}{'Tokens':>8}  {'Chunks':>13}  {'LLM calls':>13}  {'Prompt tokens':>15}  {'Turns cut':>11}")
+    for row in rows + [dict(totals, call_id="Total", transcript_tokens=sum(row["transcript_tokens"] for row in rows))]:
+        characters, turns = row["characters"], row["turns"]
+        print(f"{row['call_id']:<32}{row['transcript_tokens']:>8}  "
+              f"{characters['chunks']:>6} -> {turns['chunks']:<3}  {characters['llm_calls']:>6} -> {turns['llm_calls']:<3}  "
+              f"{characters['prompt_tokens']:>7} -> {turns['prompt_tokens']:<5}  "
+              f"{characters['turns_cut']:>5} -> {turns['turns_cut']:<3}")
+    calls_share = saved_calls / totals["characters"]["llm_calls"] if totals["characters"]["llm_calls"] else 0.0
+    tokens_share = saved_tokens / totals["characters"]["prompt_tokens"] if totals["characters"]["prompt_tokens"] else 0.0
+    print(f"The turn splitter saves {saved_calls} LLM calls ({calls_share:.0%}) and {saved_tokens} prompt tokens "
+          f"({tokens_share:.0%}). Prompt tokens use the stub model's answers for the reduce and final prompts.")
+
+
+if __name__ == "__main__":
+    main()
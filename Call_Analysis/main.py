@@ -1,43 +1,130 @@
+import threading
+import time
 import streamlit as st
 from Frontend.ui import get_user_input
-from langchain_ollama import OllamaLLM
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from Backend.analysis import AnalysisCancelled, MapReduceAnalyzer
+from Backend.token_splitter import CONTEXT_WINDOW, TurnSplitter, make_token_counter
+from ollama_shared.llm_cache import CachedLLM, ResponseCache
+from ollama_shared.ollama_client import KEEP_ALIVE, PooledOllamaLLM, warm_up_in_background
 
 # Page title
 st.title("🧠 Call Insight - Smart Transcript Analyzer")
 
+# Any click starts a new run of this script. Stop the generation a previous run may have left in flight,
+# so a click on Cancel (or a new Submit) frees the model straight away.
+previous_run = st.session_state.get("cancel_event")
+if previous_run is not None:
+    previous_run.set()
+
 # Get user input
 user_prompt = get_user_input()
 
-# Initialize LLM
-llm = OllamaLLM(model="llama3.2")  # Ensure it's pulled
+MODEL = "llama3.2"  # Ensure it's pulled
+
+
+@st.cache_resource
+def load_analyzer():
+    """
+    Builds the analyzer once per Streamlit server and shares it with every rerun and session, so the
+    connections to Ollama, the response cache and the token counts are reused. The model starts loading
+    in the background straight away, while the page is shown.
+    """
+    warm_up_in_background(MODEL, options={"num_ctx": CONTEXT_WINDOW})
+
+    # Initialize LLM over the pooled connections; keep_alive keeps the model loaded between questions
+    # instead of Ollama's 5 minutes
+    llm = PooledOllamaLLM(model=MODEL, num_ctx=CONTEXT_WINDOW, keep_alive=KEEP_ALIVE)
+
+    # Answers are cached on disk, so re-running a transcript replays them instead of asking the model again
+    response_cache = ResponseCache.from_env()
+    if response_cache is not None:
+        llm = CachedLLM(llm, response_cache)
+
+    # Text splitter setup: chunks of whole speaker turns, up to a quarter of the context window in tokens
+    splitter = TurnSplitter(make_token_counter(MODEL), context_window=CONTEXT_WINDOW, share=0.25)
+
+    # Chunks are analysed concurrently, then merged into one summary, sentiment trajectory and agent score
+    return MapReduceAnalyzer(llm, splitter, max_in_flight=4, fan_in=4)
 
-# Text splitter setup
-splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,      # Size of each chunk in characters
-    chunk_overlap=100,    # Overlap for better context retention
-    separators=["\n\n", "\n", ".", " "]  # Smart split on sentences
-)
 
-# Submit button
-if st.button("Submit"):
+analyzer = load_analyzer()
+
+STAGES = {"map": "🔍 Analysing chunks", "reduce": "🧩 Merging analyses", "final": "📝 Writing the report"}
+RENDER_INTERVAL = 0.1  # Seconds between redraws of a streaming chunk
+
+submit_column, cancel_column = st.columns([1, 1])
+submitted = submit_column.button("Submit")
+if cancel_column.button("Cancel"):
+    st.info("Generation cancelled.")
+
+if submitted:
     if user_prompt.strip() == "":
         st.warning("Please enter a prompt.")
     else:
-        with st.spinner("Transcript Generation & Analysis in Progress..."):
-            # Step 1: Split into chunks
-            chunks = splitter.split_text(user_prompt)
+        cancel_event = threading.Event()
+        st.session_state["cancel_event"] = cancel_event
+        progress = st.progress(0.0, text="Transcript Generation & Analysis in Progress...")
+        first_token_metric = st.empty()
+        chunk_views = []  # One (status line, text box) per chunk, created when the chunk count is known
+        texts = {}  # (stage, index) -> text streamed so far
+        last_render = {}
+        final_view = None
+        start_time = time.perf_counter()
+
+        def on_progress(stage, done, total):
+            global final_view
+            progress.progress(done / total if total else 1.0, text=f"{STAGES[stage]}: {done} of {total}")
+            if stage == "map" and done == 0:
+                for index in range(total):
+                    with st.expander(f"Chunk {index + 1}", expanded=index < 2):
+                        chunk_views.append((st.empty(), st.empty()))
+                        chunk_views[-1][0].caption("⏳ Waiting for the model...")
+            elif stage == "map" and done == total:
+                for key, text in texts.items():
+                    if key[0] == "map":
+                        chunk_views[key[1]][1].markdown(text)
+            elif stage == "final" and done == 0:
+                st.subheader("📤 Report:")
+                final_view = st.empty()
 
-            # Step 2: Process each chunk
-            responses = []
-            for i, chunk in enumerate(chunks):
-                st.write(f"🔍 Processing chunk {i+1} of {len(chunks)}")
-                partial_response = llm.invoke(chunk)
-                responses.append(partial_response)
+        def on_token(stage, index, text, first_token_seconds):
+            key = (stage, index)
+            if key not in texts:
+                texts[key] = ""
+                if len(texts) == 1:
+                    first_token_metric.metric("Time to first token", f"{time.perf_counter() - start_time:.2f} s")
+                if stage == "map":
+                    chunk_views[index][0].caption(f"✍️ First token after {first_token_seconds:.2f} s")
+            texts[key] += text
+            now = time.perf_counter()
+            if now - last_render.get(key, 0.0) >= RENDER_INTERVAL:
+                last_render[key] = now
+                view = chunk_views[index][1] if stage == "map" else final_view
+                view.markdown(texts[key] + " ▌")
 
-            # Step 3: Combine results
-            final_response = "\n\n".join(responses)
+        try:
+            analysis = analyzer.analyze(user_prompt, on_progress=on_progress, on_token=on_token,
+                                        cancel_event=cancel_event)
+        except AnalysisCancelled:
+            st.info("Generation cancelled.")
+            st.stop()
+        progress.empty()
+        final_view.markdown(analysis.final_text)
 
         # Display output
-        st.subheader("📤 Response:")
-        st.success(final_response)
+        st.subheader("📤 Summary:")
+        st.success(analysis.summary)
+
+        st.subheader("😊 Customer Sentiment:")
+        st.write(" → ".join(analysis.sentiment_trajectory))
+        st.write(analysis.sentiment_notes)
+
+        st.subheader("🎧 Agent Performance:")
+        st.metric("Agent score", f"{analysis.agent_score}/10" if analysis.agent_score is not None else "n/a")
+        st.write(analysis.agent_feedback)
+
+        stats = analysis.stats
+        caption = f"{stats['chunks']} chunks, {stats['llm_calls']} LLM calls in {stats['total_seconds']:.1f}s"
+        if stats["first_token_seconds"] is not None:
+            caption += f", first token after {stats['first_token_seconds']:.2f}s"
+        st.caption(caption)
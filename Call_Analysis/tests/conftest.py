@@ -0,0 +1,10 @@
+class LineSplitter:
+    """Splits a transcript into chunks of a fixed number of lines, so the tests need no tokenizer."""
+
+    def __init__(self, lines_per_chunk):
+        self.lines_per_chunk = lines_per_chunk
+
+    def split_text(self, text):
+        lines = text.strip().splitlines()
+        return ["\n".join(lines[start:start + self.lines_per_chunk])
+                for start in range(0, len(lines), self.lines_per_chunk)]
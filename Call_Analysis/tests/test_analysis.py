@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+import pytest
+from Backend.analysis import AnalysisCancelled, MapReduceAnalyzer
+from Backend.stub_llm import StubLLM
+from conftest import LineSplitter
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "transcript_billing_dispute.txt")
+
+
+@pytest.fixture
+def transcript():
+    with open(SAMPLE, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_sections_come_from_the_chunks(transcript):
+    analyzer = MapReduceAnalyzer(StubLLM(agent_score=8), LineSplitter(10), fan_in=2)
+    analysis = analyzer.analyze(transcript)
+
+    assert analysis.stats["chunks"] == 5
+    assert analysis.stats["reduce_levels"] == 2  # 5 -> 3 -> 2 analyses
+    assert analysis.stats["llm_calls"] == 5 + 3 + 2 + 1
+    assert analysis.agent_score == 8
+    assert analysis.agent_feedback
+    assert len(analysis.sentiment_trajectory) == 5
+    assert set(analysis.sentiment_trajectory) <= {"Positive", "Neutral", "Negative"}
+    assert analysis.summary.startswith("Agent: Thank you for calling ShopNow")
+    # The instructions of the reduce and final prompts must not leak into the stub's answers
+    assert "in one paragraph" not in analysis.summary
+    assert "in a few sentences" not in analysis.summary
+    assert "how the customer" not in analysis.final_text
+
+
+def test_prompts_run_concurrently(transcript):
+    llm = StubLLM(latency=0.05)
+    MapReduceAnalyzer(llm, LineSplitter(5), max_in_flight=4).analyze(transcript)
+    assert llm.max_in_flight == 4
+
+
+def test_callbacks_arrive_in_order_on_the_calling_thread(transcript):
+    progress = []
+    tokens = []
+    threads = set()
+
+    def on_progress(stage, done, total):
+        threads.add(threading.current_thread())
+        progress.append((stage, done, total))
+
+    def on_token(stage, index, text, first_token_seconds):
+        threads.add(threading.current_thread())
+        assert first_token_seconds >= 0
+        tokens.append((stage, index, text))
+
+    analyzer = MapReduceAnalyzer(StubLLM(), LineSplitter(10), fan_in=2)
+    analysis = analyzer.analyze(transcript, on_progress=on_progress, on_token=on_token)
+
+    assert threads == {threading.current_thread()}
+    stages = [stage for stage, _, _ in progress]
+    assert stages == sorted(stages, key=["map", "reduce", "final"].index)
+    assert progress[0] == ("map", 0, 5)
+    assert progress[-1] == ("final", 1, 1)
+    # Every step (map, each reduce level, final) counts from 0 up to its number of prompts
+    steps = []
+    for stage, done, total in progress:
+        if done == 0:
+            steps.append((stage, total, []))
+        steps[-1][2].append(done)
+    assert [(stage, total) for stage, total, _ in steps] == [("map", 5), ("reduce", 3), ("reduce", 2), ("final", 1)]
+    for _, total, counts in steps:
+        assert counts == list(range(total + 1))
+
+    # Only the chunk analyses and the final report are streamed, and every chunk's pieces add up to its answer
+    assert {stage for stage, _, _ in tokens} == {"map", "final"}
+    assert [stage for stage, _, _ in tokens].index("final") > max(
+        position for position, (stage, _, _) in enumerate(tokens) if stage == "map")
+    for index, answer in enumerate(analysis.chunk_analyses):
+        assert "".join(text for stage, chunk, text in tokens if stage == "map" and chunk == index) == answer
+    assert "".join(text for stage, _, text in tokens if stage == "final") == analysis.final_text
+    assert analysis.stats["first_token_seconds"] is not None
+
+
+def test_cancel_stops_the_analysis(transcript):
+    llm = StubLLM(latency=0.2, token_latency=0.05)
+    cancel_event = threading.Event()
+    timer = threading.Timer(0.3, cancel_event.set)
+    timer.start()
+    start_time = time.perf_counter()
+    try:
+        with pytest.raises(AnalysisCancelled):
+            MapReduceAnalyzer(llm, LineSplitter(5), max_in_flight=2).analyze(
+                transcript, on_token=lambda *args: None, cancel_event=cancel_event)
+    finally:
+        timer.cancel()
+    assert time.perf_counter() - start_time < 1.5
+    assert llm.calls < 9  # The map step alone has 9 chunks
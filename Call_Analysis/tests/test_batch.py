@@ -0,0 +1,96 @@
+import pytest
+from Backend.analysis import MapReduceAnalyzer
+from Backend.batch import BatchRunner, JobQueue
+from Backend.stub_llm import StubLLM
+from conftest import LineSplitter
+
+
+class FailingLLM(StubLLM):
+    """A stub model that fails every prompt about a transcript containing "line dropped"."""
+
+    def invoke(self, prompt, **kwargs):
+        if "line dropped" in prompt:
+            raise RuntimeError("connection reset by the model server")
+        return super().invoke(prompt, **kwargs)
+
+    def stream(self, prompt, **kwargs):
+        if "line dropped" in prompt:
+            raise RuntimeError("connection reset by the model server")
+        return super().stream(prompt, **kwargs)
+
+
+TRANSCRIPTS = {
+    "call-1": "Agent: Thank you for calling.\nCustomer: My order arrived damaged.\nAgent: I will send a new one.",
+    "call-2": "Agent: Hello.\nCustomer: I want a refund, this is unacceptable.\nAgent: The refund is on its way.",
+    "call-3": "Agent: Good morning.\nCustomer: Where is my parcel?\nAgent: It arrives tomorrow. Thanks for waiting.",
+}
+
+
+def make_runner(job_queue, llm, **options):
+    return BatchRunner(job_queue, MapReduceAnalyzer(llm, LineSplitter(2)), **options)
+
+
+def queue_all(job_queue, transcripts):
+    """Queues every transcript and returns how many need analysing."""
+    return sum(job_queue.add(call_id, f"{call_id}.txt", text, "settings") for call_id, text in transcripts.items())
+
+
+def test_failing_job_is_retried_up_to_the_limit(tmp_path):
+    job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    transcripts = dict(TRANSCRIPTS, **{"call-4": "Agent: Hello?\nCustomer: Can you hear me, the line dropped."})
+    assert queue_all(job_queue, transcripts) == 4
+    events = []
+    runner = make_runner(job_queue, FailingLLM(), workers=2, max_attempts=3, retry_delay=0.01,
+                         on_job=lambda call_id, status, latency, error: events.append((call_id, status)))
+    report = runner.run()
+
+    assert [status for call_id, status in events if call_id == "call-4"] == ["retry", "retry", "failed"]
+    assert (report["analysed"], report["retried"], report["failed"]) == (3, 2, 1)
+    assert report["queue"] == {"pending": 0, "running": 0, "done": 3, "failed": 1}
+    rows = {row["call_id"]: row for row in job_queue.rows()}
+    assert rows["call-4"]["attempts"] == 3
+    assert rows["call-4"]["error"] == "RuntimeError: connection reset by the model server"
+    assert rows["call-1"]["status"] == "done" and rows["call-1"]["agent_score"] == 7
+
+    # --retry-failed gives it a fresh set of attempts
+    assert job_queue.retry_failed() == 1
+    assert job_queue.counts()["pending"] == 1
+    job_queue.close()
+
+
+def test_rerun_after_an_interrupted_run_queues_nothing(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    job_queue = JobQueue(path)
+    assert queue_all(job_queue, TRANSCRIPTS) == 3
+    runner = make_runner(job_queue, StubLLM(), workers=1)
+    # Interrupted after the first call is done, as by Ctrl+C
+    runner.on_job = lambda call_id, status, latency, error: runner.stop()
+    assert runner.run()["analysed"] == 1
+    job = job_queue.claim()  # And a crash while the next call was being analysed
+    assert job is not None
+    job_queue.close()
+
+    job_queue = JobQueue(path)
+    assert job_queue.recovered == 1  # The call cut off by the crash is pending again
+    assert queue_all(job_queue, TRANSCRIPTS) == 2  # The finished call is not queued again
+    llm = StubLLM()
+    assert make_runner(job_queue, llm, workers=2).run()["queue"]["done"] == 3
+    job_queue.close()
+
+    job_queue = JobQueue(path)
+    assert queue_all(job_queue, TRANSCRIPTS) == 0
+    # The same transcript under a new call id is answered from the results without the model
+    assert job_queue.add("call-1-copy", "copy.txt", TRANSCRIPTS["call-1"], "settings")
+    llm = StubLLM()
+    report = make_runner(job_queue, llm, workers=2).run()
+    assert (report["analysed"], report["cache_hits"], llm.calls) == (0, 1, 0)
+    # Changing the analysis settings queues the calls again
+    assert job_queue.add("call-1", "call-1.txt", TRANSCRIPTS["call-1"], "other settings")
+    job_queue.close()
+
+
+def test_workers_must_be_positive(tmp_path):
+    job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    with pytest.raises(ValueError):
+        make_runner(job_queue, StubLLM(), workers=0)
+    job_queue.close()
@@ -0,0 +1,101 @@
+import os
+import pytest
+from Backend.token_splitter import EstimatedTokenCounter, TurnSplitter, split_turns
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "transcript_billing_dispute.txt")
+
+
+class WordCounter:
+    """Counts one token per word, so budgets in the tests are easy to work out."""
+
+    name = "words"
+
+    def count(self, text):
+        return len(text.split())
+
+    def count_many(self, texts):
+        return [self.count(text) for text in texts]
+
+
+def make_turns(count, words_per_turn):
+    speakers = ["Agent", "Customer"]
+    return [f"{speakers[number % 2]}: " + " ".join(f"t{number}w{word}" for word in range(words_per_turn - 1))
+            for number in range(count)]
+
+
+def test_empty_transcript():
+    splitter = TurnSplitter(WordCounter(), context_window=400, share=0.1)
+    assert splitter.split_text("") == []
+    assert splitter.split_text("  \n\n  \n") == []
+
+
+def test_turns_are_packed_whole_with_overlap():
+    turns = make_turns(8, 8)  # Each turn costs 9 tokens with its line break; 4 fit in a budget of 40
+    splitter = TurnSplitter(WordCounter(), context_window=400, share=0.1, overlap_turns=1)
+    assert splitter.budget == 40
+    chunks = [chunk.split("\n") for chunk in splitter.split_text("\n".join(turns))]
+    assert chunks == [turns[0:4], turns[3:7], turns[6:8]]
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk[0] == previous[-1]  # The last turn is repeated for context
+
+
+def test_no_overlap():
+    turns = make_turns(8, 8)
+    splitter = TurnSplitter(WordCounter(), context_window=400, share=0.1, overlap_turns=0)
+    chunks = [chunk.split("\n") for chunk in splitter.split_text("\n".join(turns))]
+    assert chunks == [turns[0:4], turns[4:8]]
+
+
+def test_overlap_is_dropped_when_it_would_fill_the_chunk():
+    turns = make_turns(4, 18)  # Carrying an 18-word turn over would use more than a quarter of the budget
+    splitter = TurnSplitter(WordCounter(), context_window=400, share=0.1, overlap_turns=1)
+    chunks = [chunk.split("\n") for chunk in splitter.split_text("\n".join(turns))]
+    assert chunks == [turns[0:2], turns[2:4]]
+
+
+def test_turn_longer_than_the_budget_is_split_at_sentences():
+    sentences = [" ".join(f"s{number}w{word}" for word in range(9)) + "." for number in range(12)]
+    long_turn = "Customer: " + " ".join(sentences)  # 108 words against a budget of 40
+    text = "Agent: How can I help?\n" + long_turn + "\nAgent: I am sorry to hear that."
+    splitter = TurnSplitter(WordCounter(), context_window=400, share=0.1, overlap_turns=0)
+    chunks = splitter.split_text(text)
+
+    assert all(WordCounter().count(chunk) <= splitter.budget for chunk in chunks)
+    parts = [line for chunk in chunks for line in chunk.split("\n") if line.startswith("Customer")]
+    assert len(parts) > 2
+    assert parts[0].startswith("Customer: s0w0")
+    assert all(part.startswith("Customer (continued): ") for part in parts[1:])
+    words = " ".join(part.split(": ", 1)[1] for part in parts).split()
+    assert words == " ".join(sentences).split()  # Every word kept, in order
+
+
+def test_sentence_longer_than_the_budget_is_split_at_words():
+    long_turn = "Customer: " + " ".join(f"w{word}" for word in range(100))  # No sentence ends at all
+    splitter = TurnSplitter(WordCounter(), context_window=400, share=0.1)
+    chunks = splitter.split_text(long_turn)
+    assert len(chunks) > 2
+    assert all(WordCounter().count(chunk) <= splitter.budget for chunk in chunks)
+    assert [word for chunk in chunks for word in chunk.split(": ", 1)[1].split()] == long_turn.split()[1:]
+
+
+def test_paragraphs_without_speakers():
+    assert split_turns("First paragraph\nstill first.\n\nSecond paragraph.") == [
+        "First paragraph\nstill first.", "Second paragraph."]
+    assert split_turns("Agent: Hello.\nmore of the greeting\nCustomer: Hi.") == [
+        "Agent: Hello.\nmore of the greeting", "Customer: Hi."]
+
+
+def test_sample_chunks_fit_the_budget():
+    with open(SAMPLE, "r", encoding="utf-8") as f:
+        transcript = f.read()
+    counter = EstimatedTokenCounter()
+    splitter = TurnSplitter(counter, context_window=2048, share=0.1, overlap_turns=0)
+    chunks = splitter.split_text(transcript)
+    assert len(chunks) > 1
+    assert all(counter.count(chunk) <= splitter.budget for chunk in chunks)
+    assert "\n".join(chunks) == "\n".join(split_turns(transcript))
+
+
+def test_share_must_leave_room_for_the_prompt():
+    with pytest.raises(ValueError):
+        TurnSplitter(WordCounter(), share=0.9)
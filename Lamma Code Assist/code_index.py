@@ -0,0 +1,423 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import numpy as np
+
+# The Ollama client lives in ollama_shared/ at the repository root, shared with Call_Analysis
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ollama_shared.ollama_client import KEEP_ALIVE, get_session, ollama_host
+
+# Model that embeds code and prompts; pull it with "ollama pull nomic-embed-text"
+EMBED_MODEL = os.environ.get("CODE_EMBED_MODEL", "nomic-embed-text")
+INDEX_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "lamma_code_index")
+
+SOURCE_EXTENSIONS = (".py",)  # Split into functions and classes with `ast`
+# Other languages are split into blocks that start at unindented lines, such as top-level functions
+CODE_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".go", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp",
+                   ".cs", ".rb", ".php", ".swift", ".scala", ".sh", ".sql", ".html", ".css")
+DOCUMENT_EXTENSIONS = (".md", ".txt", ".rst")  # Specs and notes, split at headings and blank lines
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", ".venv", "venv", "env", "node_modules", "build", "dist",
+             ".tox", ".mypy_cache", ".pytest_cache", "site-packages", ".idea", ".vscode"}
+MAX_FILE_BYTES = 1024 * 1024  # Larger files are generated or data, not code worth retrieving
+MAX_CHUNK_LINES = 120  # Longer functions are split into parts of this many lines
+
+
+def estimate_tokens(text):
+    """About four characters per token for code, which is close enough to fill a budget."""
+    return len(text) // 4 + 1
+
+
+class Chunk:
+    """One function, method, class outline, module header, block of other code or document section."""
+
+    def __init__(self, path, name, kind, start_line, end_line, text):
+        self.path = path  # Relative to the indexed root, with / separators
+        self.name = name  # e.g. "CodeAssistantGUI.generate_code"
+        self.kind = kind  # "function", "class", "module", "code" or "document"
+        self.start_line = start_line
+        self.end_line = end_line
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.hash = hashlib.sha1(f"{path}\n{name}\n{text}".encode("utf-8")).hexdigest()
+
+    def header(self):
+        return f"# {self.path}:{self.start_line}-{self.end_line} ({self.kind} {self.name})"
+
+    def to_dict(self):
+        return {"path": self.path, "name": self.name, "kind": self.kind, "start_line": self.start_line,
+                "end_line": self.end_line, "text": self.text}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["path"], data["name"], data["kind"], data["start_line"], data["end_line"], data["text"])
+
+
+def _line_parts(path, name, kind, lines, start_line):
+    """Splits a long block of lines into parts of at most MAX_CHUNK_LINES lines."""
+    chunks = []
+    for offset in range(0, len(lines), MAX_CHUNK_LINES):
+        part = lines[offset:offset + MAX_CHUNK_LINES]
+        part_name = name if len(lines) <= MAX_CHUNK_LINES else f"{name} (part {offset // MAX_CHUNK_LINES + 1})"
+        chunks.append(Chunk(path, part_name, kind, start_line + offset, start_line + offset + len(part) - 1,
+                            "\n".join(part)))
+    return chunks
+
+
+def python_chunks(path, source):
+    """
+    Splits a Python file with `ast` into one chunk per function and method, one outline per class (its
+    header, docstring and method signatures) and one module chunk with the imports and top-level code.
+    A file that does not parse is split into plain blocks of lines.
+    """
+    lines = source.splitlines()
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return _line_parts(path, os.path.basename(path), "module", lines, 1)
+
+    chunks = []
+    covered = set()
+
+    def first_line(node):
+        return min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+
+    def header(node):
+        """Decorators and signature; the whole line for a one-line definition such as `def f(): pass`."""
+        return lines[first_line(node) - 1:max(node.body[0].lineno - 1, node.lineno)]
+
+    def add_definition(node, prefix):
+        name = f"{prefix}{node.name}"
+        start, end = first_line(node), node.end_lineno
+        covered.update(range(start, end + 1))
+        if isinstance(node, ast.ClassDef):
+            outline = header(node)
+            docstring = ast.get_docstring(node)
+            if docstring and node.body[0].lineno > node.lineno:
+                outline.append(f'    """{docstring}"""')
+            for child in node.body:
+                if child.lineno == node.lineno or (docstring and child is node.body[0]):
+                    continue  # Already in the outline
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    outline.extend(header(child) + (["        ..."] if child.body[0].lineno > child.lineno else []))
+                elif not isinstance(child, ast.ClassDef) and child.end_lineno - child.lineno < 3:
+                    outline.extend(lines[child.lineno - 1:child.end_lineno])  # Short class attributes
+            chunks.append(Chunk(path, name, "class", start, end, "\n".join(outline)))
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    add_definition(child, f"{name}.")
+        else:
+            chunks.extend(_line_parts(path, name, "function", lines[start - 1:end], start))
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            add_definition(node, "")
+
+    # Imports, constants and top-level statements, so the model sees what the module works with
+    rest = [(number, line) for number, line in enumerate(lines, 1) if number not in covered and line.strip()]
+    if rest:
+        module_lines = [line for _, line in rest][:MAX_CHUNK_LINES]
+        chunks.append(Chunk(path, os.path.splitext(os.path.basename(path))[0], "module", rest[0][0],
+                            rest[min(len(rest), MAX_CHUNK_LINES) - 1][0], "\n".join(module_lines)))
+    return chunks
+
+
+def code_chunks(path, text):
+    """
+    Splits a source file in a language without a parser here into blocks. A block starts at an unindented
+    line after a blank line, which is where top-level functions, classes and statements usually begin.
+    Short blocks are packed together up to MAX_CHUNK_LINES lines.
+    """
+    lines = text.splitlines()
+    starts = [number for number, line in enumerate(lines) if line.strip() and not line[0].isspace()
+              and not line.lstrip().startswith(("}", ")", "]")) and (number == 0 or not lines[number - 1].strip())]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    chunks = []
+    block_start = 0
+    for start, end in zip(starts, starts[1:] + [len(lines)]):
+        if end - block_start > MAX_CHUNK_LINES and start > block_start:
+            chunks.extend(_code_block(path, lines, block_start, start))
+            block_start = start
+    chunks.extend(_code_block(path, lines, block_start, len(lines)))
+    return chunks
+
+
+def _code_block(path, lines, start, end):
+    """One chunk (or parts, if it is long) named after the first line of the block."""
+    block = lines[start:end]
+    while block and not block[-1].strip():
+        block.pop()
+    first = next((line.strip() for line in block if line.strip()), "")
+    if not first:
+        return []
+    return _line_parts(path, first[:60], "code", block, start + 1)
+
+
+def file_chunks(path, text):
+    """Splits a file into chunks in the way its extension calls for."""
+    if path.endswith(SOURCE_EXTENSIONS):
+        return python_chunks(path, text)
+    if path.endswith(CODE_EXTENSIONS):
+        return code_chunks(path, text)
+    return document_chunks(path, text)
+
+
+def document_chunks(path, text, max_tokens=400):
+    """Splits a spec or note into sections at headings, packing paragraphs up to max_tokens."""
+    chunks = []
+    section, section_start, title = [], 1, os.path.basename(path)
+    lines = text.splitlines()
+
+    def flush(end_line):
+        body = "\n".join(section).strip()
+        if body:
+            chunks.append(Chunk(path, title, "document", section_start, end_line, body))
+
+    for number, line in enumerate(lines, 1):
+        heading = re.match(r"^\s*#{1,6}\s+(.+)", line)
+        too_long = not line.strip() and estimate_tokens("\n".join(section)) > max_tokens
+        if heading or too_long:
+            flush(number - 1)
+            section, section_start = [], number
+            if heading:
+                title = heading.group(1).strip()
+        section.append(line)
+    flush(len(lines))
+    return chunks
+
+
+class OllamaEmbedder:
+    """Embeds texts with an Ollama embedding model, in batches over the shared connection pool."""
+
+    def __init__(self, model=EMBED_MODEL, batch_size=32):
+        self.model = model
+        self.batch_size = batch_size
+        # nomic-embed-text is trained with these task prefixes and retrieves noticeably better with them
+        nomic = model.startswith("nomic-embed")
+        self.document_prefix = "search_document: " if nomic else ""
+        self.query_prefix = "search_query: " if nomic else ""
+
+    def _embed(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = get_session().post(ollama_host() + "/api/embed", timeout=600, json={
+                "model": self.model, "input": texts[start:start + self.batch_size], "truncate": True,
+                "keep_alive": KEEP_ALIVE})
+            response.raise_for_status()
+            vectors.extend(response.json()["embeddings"])
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed_documents(self, texts):
+        return self._embed([self.document_prefix + text for text in texts])
+
+    def embed_query(self, text):
+        return self._embed([self.query_prefix + text])[0]
+
+
+class CodeIndex:
+    """
+    A searchable index of one source tree, kept under ~/.cache/lamma_code_index.
+
+    `update()` walks the tree and only re-reads files whose modification time or size changed; within a
+    changed file, only functions whose text changed are embedded again. `retrieve(prompt, budget)` returns
+    the most relevant chunks that fit in `budget` tokens, best first.
+    """
+
+    def __init__(self, root, embedder=None, index_dir=None):
+        self.root = os.path.abspath(root)
+        self.embedder = embedder or OllamaEmbedder()
+        key = hashlib.sha1(f"{self.root}\n{getattr(self.embedder, 'model', '')}".encode("utf-8")).hexdigest()[:16]
+        self.index_dir = index_dir or os.path.join(INDEX_ROOT, key)
+        self.files = {}  # Relative path -> {"mtime_ns": ..., "size": ...}
+        self.chunks = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)  # One normalised row per chunk
+        self._lock = threading.Lock()  # One update at a time
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.index_dir, "index.json"), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            vectors = np.load(os.path.join(self.index_dir, "vectors.npy"))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading the code index, it will be rebuilt: {e}")
+            return
+        chunks = [Chunk.from_dict(chunk) for chunk in data["chunks"]]
+        if data.get("root") != self.root or len(chunks) != len(vectors):
+            return
+        self.files, self.chunks, self.vectors = data["files"], chunks, vectors
+
+    def save(self):
+        """Writes the index next to its final name and then moves it into place, so a crash never leaves half of it."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        vectors_path = os.path.join(self.index_dir, "vectors.npy")
+        with open(vectors_path + ".tmp", "wb") as f:
+            np.save(f, self.vectors)
+        index_path = os.path.join(self.index_dir, "index.json")
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"root": self.root, "files": self.files, "chunks": [chunk.to_dict() for chunk in self.chunks]}, f)
+        os.replace(vectors_path + ".tmp", vectors_path)
+        os.replace(index_path + ".tmp", index_path)
+
+    def _walk(self):
+        """Yields (relative path, absolute path, stat) for every indexable file under the root."""
+        for directory, dirs, files in os.walk(self.root):
+            dirs[:] = sorted(name for name in dirs if name not in SKIP_DIRS and not name.startswith("."))
+            for name in sorted(files):
+                if not name.endswith(SOURCE_EXTENSIONS + CODE_EXTENSIONS + DOCUMENT_EXTENSIONS):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_size <= MAX_FILE_BYTES:
+                    yield os.path.relpath(path, self.root).replace(os.sep, "/"), path, stat
+
+    def update(self, on_progress=None, max_chunks=None, wait=True):
+        """
+        Brings the index up to date with the files on disk and returns a dict with what changed.
+        `on_progress(done, total)` is called while new chunks are embedded.
+
+        With `max_chunks`, files are taken in order until about that many new chunks need embedding. The
+        rest are counted in "pending" and picked up by the next call, so one call never blocks on thousands
+        of embeddings. With wait=False, it returns None at once if another thread is updating the index.
+        """
+        if not self._lock.acquire(blocking=wait):
+            return None
+        try:
+            start_time = time.perf_counter()
+            seen = {}
+            changed = []
+            for relative_path, path, stat in self._walk():
+                seen[relative_path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+                if self.files.get(relative_path) != seen[relative_path]:
+                    changed.append((relative_path, path))
+            removed = [path for path in self.files if path not in seen]
+            if not changed and not removed:
+                return {"files": len(seen), "changed": 0, "removed": 0, "pending": 0, "embedded": 0,
+                        "chunks": len(self.chunks), "seconds": time.perf_counter() - start_time}
+
+            changed_paths = {relative_path for relative_path, _ in changed}
+            old_rows = {chunk.hash: row for row, chunk in enumerate(self.chunks)}
+            files = {path: stat for path, stat in seen.items() if path not in changed_paths}
+            chunks = [chunk for chunk in self.chunks if chunk.path in files]
+            new_chunks = []
+            pending = 0
+            for relative_path, path in changed:
+                try:
+                    with open(path, "r", encoding="utf-8", errors="replace") as f:
+                        text = f.read()
+                except OSError as e:
+                    print(f"Error reading {path}: {e}")
+                    continue
+                path_chunks = file_chunks(relative_path, text)
+                fresh = [chunk for chunk in path_chunks if chunk.hash not in old_rows]
+                if max_chunks is not None and new_chunks and len(new_chunks) + len(fresh) > max_chunks:
+                    # Left for the next update: keep the file's old chunks and old state, if it had any
+                    pending += 1
+                    if relative_path in self.files:
+                        files[relative_path] = self.files[relative_path]
+                        chunks.extend(chunk for chunk in self.chunks if chunk.path == relative_path)
+                    continue
+                files[relative_path] = seen[relative_path]
+                chunks.extend(path_chunks)
+                new_chunks.extend(fresh)
+
+            # Reuse the vectors of chunks whose text did not change; embed the rest
+            new_vectors = []
+            for start in range(0, len(new_chunks), 256):
+                batch = new_chunks[start:start + 256]
+                new_vectors.append(self.embedder.embed_documents([f"{chunk.path} {chunk.name}\n{chunk.text}"
+                                                                  for chunk in batch]))
+                if on_progress is not None:
+                    on_progress(start + len(batch), len(new_chunks))
+            new_rows = {}
+            if new_vectors:
+                embedded = np.vstack(new_vectors)
+                embedded /= np.maximum(np.linalg.norm(embedded, axis=1, keepdims=True), 1e-12)
+                new_rows = {chunk.hash: vector for chunk, vector in zip(new_chunks, embedded)}
+            rows = [self.vectors[old_rows[chunk.hash]] if chunk.hash in old_rows else new_rows[chunk.hash]
+                    for chunk in chunks]
+            vectors = np.vstack(rows).astype(np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+
+            # Swap everything in at once, so a search running on another thread sees the old or the new index
+            self.files, self.chunks, self.vectors = files, chunks, vectors
+            self.save()
+            return {"files": len(files), "changed": len(changed) - pending, "removed": len(removed),
+                    "pending": pending, "embedded": len(new_chunks), "chunks": len(chunks),
+                    "seconds": time.perf_counter() - start_time}
+        finally:
+            self._lock.release()
+
+    def search(self, query, top_k=20):
+        """Returns [(score, chunk)] for the chunks most similar to the query, best first."""
+        chunks, vectors = self.chunks, self.vectors
+        if not chunks:
+            return []
+        query_vector = self.embedder.embed_query(query)
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+        scores = vectors @ query_vector
+        top = np.argsort(-scores)[:top_k]
+        return [(float(scores[row]), chunks[row]) for row in top]
+
+    def retrieve(self, query, budget=1024, top_k=20):
+        """The most relevant chunks whose text fits in `budget` tokens together, best first."""
+        selected = []
+        used = 0
+        for score, chunk in self.search(query, top_k):
+            cost = chunk.tokens + estimate_tokens(chunk.header())
+            if used + cost > budget:
+                continue
+            selected.append((score, chunk))
+            used += cost
+        return selected
+
+
+def build_prompt(prompt, snippets):
+    """Puts the retrieved snippets in front of the user's prompt."""
+    if not snippets:
+        return prompt
+    context = "\n\n".join(f"{chunk.header()}\n{chunk.text}" for _, chunk in snippets)
+    return (f"You are working on the code base the snippets below come from. Use them when they are relevant, "
+            f"and follow the style and names they use.\n\n{context}\n\nTask: {prompt}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds or updates the code index of a source tree and shows what "
+                                                 "a prompt would retrieve from it.")
+    parser.add_argument("root", help="Source tree to index")
+    parser.add_argument("--query", help="Prompt to retrieve snippets for")
+    parser.add_argument("--budget", type=int, default=1024, help="Tokens of context to retrieve")
+    parser.add_argument("--model", default=EMBED_MODEL, help="Ollama embedding model")
+    parser.add_argument("--max-chunks", type=int, default=None,
+                        help="Chunks to embed per update step; the index is saved after each step")
+    args = parser.parse_args()
+
+    index = CodeIndex(args.root, OllamaEmbedder(args.model))
+
+    def on_progress(done, total):
+        print(f"Embedded {done}/{total} chunks", flush=True)
+
+    while True:
+        stats = index.update(on_progress, max_chunks=args.max_chunks)
+        print(f"{stats['files']} files, {stats['chunks']} chunks; {stats['changed']} files changed, "
+              f"{stats['removed']} removed, {stats['embedded']} chunks embedded in {stats['seconds']:.1f}s, "
+              f"{stats['pending']} files pending ({index.index_dir})")
+        if not stats["pending"]:
+            break
+    if args.query:
+        for score, chunk in index.retrieve(args.query, args.budget):
+            print(f"{score:.3f}  {chunk.header()[2:]}  ~{chunk.tokens} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,23 @@
 import tkinter as tk
-from tkinter import scrolledtext, messagebox
+from tkinter import scrolledtext, messagebox, filedialog
 import threading
+import queue
 import ollama
+import os
+import sys
 import time
 import subprocess
-import requests
+
+# The Ollama client and response cache live in ollama_shared/ at the repository root, shared with Call_Analysis
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from code_index import CodeIndex, build_prompt
+from ollama_shared.llm_cache import ResponseCache, cached_generate
+from ollama_shared.ollama_client import KEEP_ALIVE, generate, server_running, warm_up_in_background
+
+FRAME_INTERVAL_MS = 33  # The response pane is redrawn about 30 times a second while tokens arrive
+CONTEXT_BUDGET = 1024  # Tokens of project code put in front of each prompt
+INDEX_BATCH_CHUNKS = 512  # Chunks embedded per step while a project is indexed in the background
+PROMPT_UPDATE_CHUNKS = 64  # Chunks a prompt waits to embed for files saved since the last prompt
 
 class CodeAssistantGUI:
     def __init__(self, master):
@@ -31,6 +44,23 @@ class CodeAssistantGUI:
         self.generate_button = tk.Button(master, text="Submit your Prompt", command=self.generate_code_thread)
         self.generate_button.pack(pady=(0, 5))
 
+        # Cache Checkbox: answers to repeated prompts are replayed from disk instead of generated again
+        self.response_cache = ResponseCache.from_env()
+        self.use_cache = tk.BooleanVar(value=self.response_cache is not None)
+        self.cache_checkbox = tk.Checkbutton(master, text="Reuse cached answers", variable=self.use_cache)
+        self.cache_checkbox.pack(pady=(0, 5))
+        if self.response_cache is None:
+            self.cache_checkbox.config(state=tk.DISABLED)
+
+        # Project Context: snippets of a chosen source tree are retrieved and put in front of each prompt
+        self.code_index = None
+        self.project_button = tk.Button(master, text="Choose project...", command=self.choose_project)
+        self.project_button.pack(pady=(0, 5))
+        self.use_project = tk.BooleanVar(value=False)
+        self.project_checkbox = tk.Checkbutton(master, text="Use project context", variable=self.use_project)
+        self.project_checkbox.pack(pady=(0, 5))
+        self.project_checkbox.config(state=tk.DISABLED)  # Until a project is chosen
+
         # Stop Button
         self.stop_button = tk.Button(master, text="Stop Generation", command=self.stop_generation)
         self.stop_button.pack(pady=(0, 10))
@@ -49,21 +79,28 @@ class CodeAssistantGUI:
         self.status_label = tk.Label(master, text="Ready")
         self.status_label.pack(pady=(5, 10))
 
+        # Stats Label: generation speed and the time the UI spends on each frame
+        self.stats_label = tk.Label(master, text="")
+        self.stats_label.pack(pady=(0, 10))
+
         self.generation_thread = None  # To store the thread object
         self.stop_event = threading.Event()  # To signal the thread to stop
 
+        # The generation thread never touches the widgets: it puts tokens and status messages on this queue,
+        # and drain_ui_queue applies them on the Tk thread once per frame
+        self.ui_queue = queue.Queue()
+        self.reset_stats()
+        self.master.after(FRAME_INTERVAL_MS, self.drain_ui_queue)
+
+        # Load the model while the user types the first prompt, so it does not wait for the model to load
+        warm_up_in_background('codellama')
+
     def check_ollama_server(self):
-        """Checks if the Ollama server is running."""
-        try:
-            response = requests.get("http://localhost:11434/api/tags")
-            if response.status_code == 200:
-                return True
-            else:
-                messagebox.showerror("Ollama Server Error", "Ollama server is not running. Please start it with 'ollama serve' in your terminal.")
-                return False
-        except requests.exceptions.ConnectionError:
-            messagebox.showerror("Ollama Server Error", "Ollama server is not running. Please start it with 'ollama serve' in your terminal.")
-            return False
+        """Checks if the Ollama server is running, over the shared connection pool."""
+        if server_running():
+            return True
+        messagebox.showerror("Ollama Server Error", "Ollama server is not running. Please start it with 'ollama serve' in your terminal.")
+        return False
 
     def check_codellama_model(self):
         """Checks if the codellama model is downloaded."""
@@ -91,6 +128,7 @@ class CodeAssistantGUI:
             else:
                 if messagebox.askyesno("Model Not Found", "The codellama model is not downloaded. Do you want to download it now?"):
                     self.set_status("Downloading codellama model...")
+                    self.master.update_idletasks()  # Show the status before the download blocks the window
                     ollama.pull('codellama')
                     self.set_status("codellama model downloaded.")
                     return True
@@ -103,43 +141,162 @@ class CodeAssistantGUI:
 
 
     def generate_code_thread(self):
-        """Starts the code generation in a separate thread."""
-        self.stop_event.clear()  # Clear the stop event before starting a new generation
-        self.generation_thread = threading.Thread(target=self.generate_code)
-        self.generation_thread.start()
-
-    def generate_code(self):
-        """Generates code based on the user's prompt."""
-        self.set_status("Generating code...")
-        self.disable_input()
-        self.clear_response()
-        self.stop_button.config(state=tk.NORMAL) #enable stop button
-
+        """Reads the prompt and starts the code generation in a separate thread."""
         # Get the prompt from the tk.Text widget
         prompt = self.prompt_entry.get("1.0", tk.END).strip()  # Get all text from start to end, remove leading/trailing whitespace
         if not prompt:
             self.set_status("Prompt cannot be empty.")
-            self.enable_input()
             return
 
+        self.set_status("Generating code...")
+        self.disable_input()
+        self.clear_response()
+        self.reset_stats()
+        self.stop_button.config(state=tk.NORMAL) #enable stop button
+        self.stop_event.clear()  # Clear the stop event before starting a new generation
+        use_cache = self.use_cache.get()
+        code_index = self.code_index if self.use_project.get() else None
+        self.generation_thread = threading.Thread(target=self.generate_code, args=(prompt, use_cache, code_index),
+                                                  daemon=True)
+        self.generation_thread.start()
+
+    def generate_code(self, prompt, use_cache, code_index=None):
+        """Generates code based on the user's prompt. Runs on the generation thread, so it only talks to the queue."""
+        status = "Code generation complete."
         try:
-            response_stream = ollama.generate(model='codellama', prompt=prompt, stream=True)
-            full_response = ""
-            for response_part in response_stream:
-                if self.stop_event.is_set():
-                    self.set_status("Generation stopped by user.")
-                    break  # Exit the loop if the stop event is set
-                if 'response' in response_part:
-                    chunk = response_part['response']
-                    full_response += chunk
-                    self.append_response(chunk)
-            if not self.stop_event.is_set():
-                self.set_status("Code generation complete.")
+            if code_index is not None:
+                # Files saved since the last prompt are indexed again first, so the snippets match the disk.
+                # The update is capped, and skipped while the background indexing is running.
+                self.ui_queue.put(("status", "Updating project index..."))
+                code_index.update(max_chunks=PROMPT_UPDATE_CHUNKS, wait=False)
+                snippets = code_index.retrieve(prompt, CONTEXT_BUDGET)
+                prompt = build_prompt(prompt, snippets)
+                self.ui_queue.put(("status", f"Generating code with {len(snippets)} snippets from the project..."))
+            response_cache = self.response_cache if use_cache else None
+            response_stream = cached_generate(generate, response_cache, 'codellama', prompt, stream=True,
+                                              keep_alive=KEEP_ALIVE)
+            try:
+                for response_part in response_stream:
+                    if self.stop_event.is_set():
+                        status = "Generation stopped by user."
+                        break  # Exit the loop if the stop event is set
+                    if isinstance(response_part, dict) and response_part.get('cached'):
+                        status = "Code generation complete (from cache)."
+                    if 'response' in response_part and response_part['response']:
+                        self.ui_queue.put(("token", response_part['response']))
+            finally:
+                response_stream.close()  # Closes the connection at once, so Ollama stops generating
         except Exception as e:
-            self.set_status(f"Error: {e}")
+            status = f"Error: {e}"
         finally:
+            self.ui_queue.put(("finished", status))
+
+    def drain_ui_queue(self):
+        """
+        Applies everything the generation thread queued since the last frame: all new text in one insert,
+        then the latest status. Reschedules itself every FRAME_INTERVAL_MS.
+        """
+        frame_start = time.perf_counter()
+        texts = []
+        status = None
+        finished = False
+        while True:
+            try:
+                kind, value = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "token":
+                texts.append(value)
+            elif kind == "project":
+                self.set_project(value)
+            elif kind == "indexed":
+                self.project_button.config(state=tk.NORMAL)
+                status = value
+            else:
+                status = value
+                finished = finished or kind == "finished"
+        if texts:
+            if self.first_token_time is None:
+                self.first_token_time = frame_start
+            self.token_count += len(texts)
+            self.last_token_time = frame_start
+            self.append_response("".join(texts))
+        if status is not None:
+            self.set_status(status)
+        if finished:
             self.enable_input()
             self.stop_button.config(state=tk.DISABLED) #disable stop button
+        if texts or finished:
+            frame_time = time.perf_counter() - frame_start
+            self.frame_count += 1
+            self.frame_time_total += frame_time
+            self.frame_time_max = max(self.frame_time_max, frame_time)
+            self.update_stats()
+        self.master.after(FRAME_INTERVAL_MS, self.drain_ui_queue)
+
+    def reset_stats(self):
+        """Clears the token and frame counters for a new generation."""
+        self.token_count = 0
+        self.first_token_time = None
+        self.last_token_time = None
+        self.frame_count = 0
+        self.frame_time_total = 0.0
+        self.frame_time_max = 0.0
+        self.stats_label.config(text="")
+
+    def update_stats(self):
+        """Shows tokens per second since the first token and the average and worst frame time."""
+        elapsed = (self.last_token_time or 0.0) - (self.first_token_time or 0.0)
+        rate = f"{self.token_count / elapsed:.1f} tokens/s" if elapsed > 0 else "- tokens/s"
+        average = self.frame_time_total / self.frame_count * 1000
+        self.stats_label.config(text=f"{self.token_count} tokens, {rate} | UI frame {average:.1f} ms "
+                                     f"(max {self.frame_time_max * 1000:.1f} ms, {self.frame_count} frames)")
+
+    def choose_project(self):
+        """Asks for a source tree and indexes it in the background."""
+        root = filedialog.askdirectory(title="Choose the project to use as context")
+        if not root:
+            return
+        self.use_project.set(False)
+        self.project_checkbox.config(state=tk.DISABLED)
+        self.project_button.config(state=tk.DISABLED)
+        self.set_status(f"Indexing {root}...")
+        threading.Thread(target=self.index_project, args=(root,), daemon=True).start()
+
+    def index_project(self, root):
+        """
+        Builds or updates the index of a project in steps of INDEX_BATCH_CHUNKS chunks. Runs on its own
+        thread, so it only talks to the queue. The project can be used after the first step; prompts then
+        see the files indexed so far.
+        """
+        posted = False
+        try:
+            code_index = CodeIndex(root)
+
+            def on_progress(done, total):
+                self.ui_queue.put(("status", f"Indexing {root}: embedded {done}/{total} code chunks..."))
+
+            start_time = time.perf_counter()
+            while True:
+                stats = code_index.update(on_progress, max_chunks=INDEX_BATCH_CHUNKS)
+                if not posted:
+                    self.ui_queue.put(("project", code_index))
+                    posted = True
+                if not stats["pending"]:
+                    break
+            self.ui_queue.put(("indexed", f"Indexed {stats['files']} files ({stats['chunks']} chunks) in "
+                                          f"{time.perf_counter() - start_time:.1f}s."))
+        except Exception as e:
+            if not posted:
+                self.ui_queue.put(("project", None))
+            self.ui_queue.put(("indexed", f"Error indexing {root}: {e}"))
+
+    def set_project(self, code_index):
+        """Switches to a newly indexed project. Only call it on the Tk thread."""
+        self.code_index = code_index
+        if code_index is not None:
+            self.project_checkbox.config(state=tk.NORMAL)
+            self.use_project.set(True)
 
     def stop_generation(self):
         """Stops the code generation."""
@@ -161,9 +318,8 @@ class CodeAssistantGUI:
         self.response_text.config(state=tk.DISABLED)
 
     def set_status(self, message):
-        """Updates the status label."""
+        """Updates the status label. Only call it on the Tk thread."""
         self.status_label.config(text=message)
-        self.master.update_idletasks()  # Force update
 
     def disable_input(self):
         """Disables the input field and button."""
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import numpy as np
+from code_index import CodeIndex
+
+SOURCE = '''import json
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+class Store:
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, key):
+        return load(self.path).get(key)
+'''
+
+
+class FakeEmbedder:
+    """Stands in for OllamaEmbedder: a hashed bag of words, recording every text it is asked to embed."""
+
+    model = "fake"
+
+    def __init__(self):
+        self.embedded = []
+
+    def _vector(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.lower().replace("(", " ").replace(".", " ").split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % 64] += 1
+        return vector
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return np.array([self._vector(text) for text in texts])
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def write(path, text):
+    """Writes a file and moves its modification time forward, as an edit a little later would."""
+    existed = os.path.exists(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    if existed:
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 10))
+
+
+def make_project(tmp_path):
+    root = tmp_path / "project"
+    root.mkdir()
+    write(root / "storage.py", SOURCE)
+    write(root / "helpers.py", "def add(a, b):\n    return a + b\n\n\ndef sub(a, b):\n    return a - b\n")
+    return root
+
+
+def test_editing_one_function_embeds_only_that_chunk(tmp_path):
+    root = make_project(tmp_path)
+    embedder = FakeEmbedder()
+    index = CodeIndex(str(root), embedder, str(tmp_path / "index"))
+    stats = index.update()
+    assert stats["embedded"] == len(index.chunks) == len(embedder.embedded)
+
+    embedder.embedded.clear()
+    write(root / "storage.py", SOURCE.replace('open(path, "w")', 'open(path, "w", encoding="utf-8")'))
+    stats = index.update()
+    assert (stats["changed"], stats["embedded"]) == (1, 1)
+    assert len(embedder.embedded) == 1
+    assert embedder.embedded[0].startswith("storage.py save\n")
+    assert 'encoding="utf-8"' in embedder.embedded[0]
+    assert [chunk.name for chunk in index.chunks if "encoding" in chunk.text] == ["save"]
+    assert len(index.vectors) == len(index.chunks)
+
+    # A fresh index over the same folder reloads everything and embeds nothing
+    reloaded_embedder = FakeEmbedder()
+    reloaded = CodeIndex(str(root), reloaded_embedder, str(tmp_path / "index"))
+    assert reloaded.update()["embedded"] == 0
+    assert reloaded_embedder.embedded == []
+    assert [chunk.to_dict() for chunk in reloaded.chunks] == [chunk.to_dict() for chunk in index.chunks]
+
+
+def test_deleting_a_file_removes_its_chunks(tmp_path):
+    root = make_project(tmp_path)
+    embedder = FakeEmbedder()
+    index = CodeIndex(str(root), embedder, str(tmp_path / "index"))
+    index.update()
+    assert {chunk.path for chunk in index.chunks} == {"helpers.py", "storage.py"}
+    helper_count = sum(chunk.path == "helpers.py" for chunk in index.chunks)
+
+    embedder.embedded.clear()
+    os.remove(root / "helpers.py")
+    stats = index.update()
+    assert (stats["removed"], stats["embedded"]) == (1, 0)
+    assert embedder.embedded == []
+    assert {chunk.path for chunk in index.chunks} == {"storage.py"}
+    assert len(index.vectors) == len(index.chunks) == stats["chunks"]
+    assert stats["chunks"] > 0 and helper_count > 0
+    assert "helpers.py" not in index.files
+    assert all(chunk.path == "storage.py" for _, chunk in index.search("add a and b"))
+
+
+def test_max_chunks_leaves_the_rest_pending(tmp_path):
+    root = tmp_path / "project"
+    root.mkdir()
+    for number in range(4):
+        write(root / f"module{number}.py", "".join(f"def f{number}_{j}(x):\n    return x + {j}\n\n\n"
+                                                  for j in range(3)))
+    embedder = FakeEmbedder()
+    index = CodeIndex(str(root), embedder, str(tmp_path / "index"))
+    steps = []
+    while True:
+        stats = index.update(max_chunks=6)
+        steps.append((stats["embedded"], stats["pending"]))
+        if not stats["pending"]:
+            break
+    assert steps == [(6, 2), (6, 0)]
+    assert len(embedder.embedded) == len(index.chunks) == 12
+    assert index.update()["embedded"] == 0
@@ -0,0 +1,240 @@
+import bisect
+import math
+import os
+import pickle
+import re
+
+_WORD = re.compile(r"\w+")
+_QUERY = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def tokenize(text):
+    """Lowercases text and splits it into words."""
+    return _WORD.findall(text.lower())
+
+
+def parse_query(query, prefix_last=True):
+    """Splits a query into ("term", word), ("prefix", word) and ("phrase", words) clauses.
+
+    "quoted words" are matched as a phrase and word* matches every word that starts with it. With
+    prefix_last the word still being typed (the last one, if the query doesn't end in a space) is
+    treated as a prefix too.
+    """
+    clauses = []
+    for match in _QUERY.finditer(query):
+        phrase, word = match.groups()
+        tokens = tokenize(phrase if phrase is not None else word)
+        if not tokens:
+            continue
+        if phrase is None and word.endswith("*") and len(tokens) == 1:
+            clauses.append(("prefix", tokens[0]))
+        elif len(tokens) == 1:
+            clauses.append(("term", tokens[0]))
+        else:
+            clauses.append(("phrase", tuple(tokens)))  # e.g. "hash-map" is searched as "hash map"
+    if prefix_last and clauses and clauses[-1][0] == "term" and not query[-1].isspace() and not query.endswith('"'):
+        clauses[-1] = ("prefix", clauses[-1][1])
+    return clauses
+
+
+class InvertedIndex:
+    """A positional inverted index over knowledge item titles and contents, ranked with BM25.
+
+    Every clause of a query has to match (in the title or the content) for an item to be returned.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75, title_boost=2.0, max_expansions=50):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.title_boost = title_boost
+        self.max_expansions = max_expansions  # Most words a prefix is expanded to; the most common ones are kept
+        self.documents = {}  # title -> {"mtime", "size", "length", "title_tokens"}
+        self.postings = {}  # term -> {title: [positions in the content]}
+        self.title_terms = {}  # term -> set of titles containing it
+        self.vocabulary = []  # Sorted terms, for prefix lookups
+        self.total_length = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, title):
+        return title in self.documents
+
+    def is_current(self, title, stat):
+        """True if the item was indexed from a file with this modification time and size."""
+        document = self.documents.get(title)
+        return document is not None and document["mtime"] == stat.st_mtime and document["size"] == stat.st_size
+
+    def _add_term(self, term):
+        if term not in self.postings and term not in self.title_terms:
+            bisect.insort(self.vocabulary, term)
+
+    def _drop_term(self, term):
+        if term not in self.postings and term not in self.title_terms:
+            position = bisect.bisect_left(self.vocabulary, term)
+            if position < len(self.vocabulary) and self.vocabulary[position] == term:
+                del self.vocabulary[position]
+
+    def add(self, title, content, stat=None):
+        """Indexes an item, replacing any earlier version with the same title."""
+        self.remove(title)
+        tokens = tokenize(content)
+        positions = {}
+        for position, term in enumerate(tokens):
+            positions.setdefault(term, []).append(position)
+        title_tokens = tuple(tokenize(title))
+        for term in positions:
+            self._add_term(term)
+            self.postings.setdefault(term, {})[title] = positions[term]
+        for term in set(title_tokens):
+            self._add_term(term)
+            self.title_terms.setdefault(term, set()).add(title)
+        self.documents[title] = {
+            "mtime": stat.st_mtime if stat else None,
+            "size": stat.st_size if stat else None,
+            "length": len(tokens),
+            "title_tokens": title_tokens,
+            "terms": tuple(positions),
+        }
+        self.total_length += len(tokens)
+        self.dirty = True
+
+    def remove(self, title):
+        """Removes an item from the index. Returns False if it wasn't indexed."""
+        document = self.documents.pop(title, None)
+        if document is None:
+            return False
+        for term in document["terms"]:
+            postings = self.postings[term]
+            del postings[title]
+            if not postings:
+                del self.postings[term]
+                self._drop_term(term)
+        for term in set(document["title_tokens"]):
+            titles = self.title_terms[term]
+            titles.discard(title)
+            if not titles:
+                del self.title_terms[term]
+                self._drop_term(term)
+        self.total_length -= document["length"]
+        self.dirty = True
+        return True
+
+    def _document_frequency(self, term):
+        """Number of items with the term in their title or content."""
+        return len(self.postings.get(term, {}).keys() | self.title_terms.get(term, set()))
+
+    def expand(self, prefix):
+        """Returns the indexed words that start with prefix, at most max_expansions of them.
+
+        When more words match, the ones found in the most items are kept.
+        """
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = start
+        while end < len(self.vocabulary) and self.vocabulary[end].startswith(prefix):
+            end += 1
+        terms = self.vocabulary[start:end]
+        if len(terms) > self.max_expansions:
+            terms = sorted(terms, key=lambda term: (-self._document_frequency(term), term))[:self.max_expansions]
+        return terms
+
+    def _idf(self, term):
+        matches = len(self.postings.get(term, ())) or len(self.title_terms.get(term, ()))
+        return math.log(1 + (len(self.documents) - matches + 0.5) / (matches + 0.5))
+
+    def _bm25(self, frequency, length, average_length):
+        length_norm = self.k1 * (1 - self.b + self.b * length / average_length)
+        return frequency * (self.k1 + 1) / (frequency + length_norm)
+
+    def _phrase_frequency(self, title, terms):
+        """Counts how often the terms appear one after another in an item's content."""
+        first, rest = self.postings[terms[0]][title], [set(self.postings[term][title]) for term in terms[1:]]
+        return sum(1 for start in first if all(start + offset in positions for offset, positions in enumerate(rest, 1)))
+
+    def _in_title(self, title, terms):
+        title_tokens = self.documents[title]["title_tokens"]
+        width = len(terms)
+        return any(title_tokens[i:i + width] == terms for i in range(len(title_tokens) - width + 1))
+
+    def _match_terms(self, terms, average_length):
+        """Scores every item that contains all of the terms (one term, or a phrase) in order."""
+        scores = {}
+        idf = sum(self._idf(term) for term in terms)
+        if all(term in self.postings for term in terms):
+            candidates = set.intersection(*(set(self.postings[term]) for term in terms))
+            for title in candidates:
+                frequency = len(self.postings[terms[0]][title]) if len(terms) == 1 else self._phrase_frequency(title, terms)
+                if frequency:
+                    scores[title] = idf * self._bm25(frequency, self.documents[title]["length"], average_length)
+        if all(term in self.title_terms for term in terms):
+            for title in set.intersection(*(self.title_terms[term] for term in terms)):
+                if len(terms) == 1 or self._in_title(title, terms):
+                    scores[title] = scores.get(title, 0.0) + self.title_boost * idf
+        return scores
+
+    def search(self, query, limit=None, prefix_last=True):
+        """Returns (score, title) pairs for the items matching every clause of the query, best first."""
+        clauses = parse_query(query, prefix_last)
+        if not clauses or not self.documents:
+            return []
+        average_length = self.total_length / len(self.documents) or 1.0
+        totals = None
+        for kind, value in clauses:
+            if kind == "prefix":
+                scores = {}
+                for term in self.expand(value):
+                    for title, score in self._match_terms((term,), average_length).items():
+                        scores[title] = max(scores.get(title, 0.0), score)
+            else:
+                scores = self._match_terms((value,) if kind == "term" else value, average_length)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {title: totals[title] + score for title, score in scores.items() if title in totals}
+            if not totals:
+                return []
+        ranked = sorted(((score, title) for title, score in totals.items()), key=lambda pair: (-pair[0], pair[1]))
+        return ranked[:limit] if limit else ranked
+
+    def clear(self):
+        self.documents = {}
+        self.postings = {}
+        self.title_terms = {}
+        self.vocabulary = []
+        self.total_length = 0
+        self.dirty = True
+
+    def load(self):
+        """Loads the saved index. Returns False if there is none or it can't be read."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, ValueError, KeyError) as e:
+            print(f"Error loading search index: {e}")
+            return False
+        self.documents = data["documents"]
+        self.postings = data["postings"]
+        self.title_terms = data["title_terms"]
+        self.vocabulary = sorted(set(self.postings) | set(self.title_terms))
+        self.total_length = sum(document["length"] for document in self.documents.values())
+        self.dirty = False
+        return True
+
+    def save(self):
+        """Writes the index to a temporary file and renames it over the old one."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump({
+                "documents": self.documents,
+                "postings": self.postings,
+                "title_terms": self.title_terms,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+        self.dirty = False
@@ -1,7 +1,15 @@
 class KBItem:
-    def __init__(self, title, content):
+    def __init__(self, title, content=None, path=None):
         self.title = title
-        self.content = content
+        self._content = content
+        self.path = path  # Content is read from here when it is first needed
+
+    @property
+    def content(self):
+        if self._content is None and self.path is not None:
+            with open(self.path, "r", errors="replace") as f:
+                self._content = f.read()
+        return self._content
 
     def __str__(self):
         return f"Title: {self.title}\nContent: {self.content}\n"
@@ -1,44 +1,86 @@
 import os
 from knowledge_base.kb_item import KBItem
+from knowledge_base.inverted_index import InvertedIndex, tokenize
 
 class KBManager:
-    def __init__(self, data_dir="data/knowledge_items"):
+    def __init__(self, data_dir="data/knowledge_items", index_path="data/search_index.pkl", save_every=50):
         self.data_dir = data_dir
-        self.knowledge_items = []
+        self.items = {}  # title -> KBItem
+        self.index = InvertedIndex(index_path)
+        # The index is written after this many additions and on close(). Additions made after the last save
+        # are not lost: their files are newer than the index, so the next start indexes them again.
+        self.save_every = save_every
+        self.unsaved_additions = 0
         self._load_knowledge()
 
+    @property
+    def knowledge_items(self):
+        return list(self.items.values())
+
     def _load_knowledge(self):
-        """Loads knowledge items from text files in the data directory."""
+        """Loads the search index and re-indexes only the text files that changed since it was saved."""
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
-            return
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith(".txt"):
-                filepath = os.path.join(self.data_dir, filename)
-                with open(filepath, "r") as f:
-                    title = filename[:-4]  # Remove .txt extension
-                    content = f.read()
-                    self.knowledge_items.append(KBItem(title, content))
+        self.index.load()
+        files = {}
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    files[entry.name[:-4]] = entry  # Remove .txt extension
+        for title in list(self.index.documents):
+            if title not in files:
+                self.index.remove(title)
+        for title, entry in files.items():
+            stat = entry.stat()
+            if not self.index.is_current(title, stat):
+                with open(entry.path, "r", errors="replace") as f:
+                    self.index.add(title, f.read(), stat)
+            self.items[title] = KBItem(title, path=entry.path)
+        if self.index.dirty:
+            self.index.save()
 
     def add_knowledge(self, title, content):
-        """Adds a new knowledge item to the knowledge base and saves it to a file."""
+        """Adds a new knowledge item (or replaces the one with the same title), saves it to a file and indexes it."""
         new_item = KBItem(title, content)
-        self.knowledge_items.append(new_item)
-        self._save_knowledge(new_item)
+        filepath = self._save_knowledge(new_item)
+        new_item.path = filepath
+        self.items[title] = new_item
+        self.index.add(title, content, os.stat(filepath))
+        self.unsaved_additions += 1
+        if self.unsaved_additions >= self.save_every:
+            self.save_index()
+
+    def save_index(self):
+        """Writes the search index if anything changed since it was last saved."""
+        if self.index.dirty:
+            self.index.save()
+        self.unsaved_additions = 0
+
+    def close(self):
+        """Saves pending index changes. Call it before the application exits."""
+        self.save_index()
 
     def _save_knowledge(self, item):
         """Saves a knowledge item to a text file."""
         filepath = os.path.join(self.data_dir, f"{item.title}.txt")
         with open(filepath, "w") as f:
             f.write(item.content)
+        return filepath
 
-    def search_knowledge(self, keyword):
-        """Searches for knowledge items based on a keyword (case-insensitive)."""
-        results = []
-        for item in self.knowledge_items:
-            if keyword.lower() in item.title.lower() or keyword.lower() in item.content.lower():
-                results.append(item)
-        return results
+    def search_knowledge(self, keyword, limit=None):
+        """Searches for knowledge items matching every word of the query, best matches first.
+
+        Words match whole words (case-insensitive), "quoted words" match a phrase and word* matches a prefix.
+        The last word is matched as a prefix while it is still being typed.
+        """
+        if not keyword.strip():
+            return self.knowledge_items  # An empty keyword used to match everything
+        if not tokenize(keyword):
+            # Queries without any word, like "*" or "#", can't use the index; match them as text like before
+            keyword = keyword.lower()
+            return [item for item in self.knowledge_items
+                    if keyword in item.title.lower() or keyword in item.content.lower()]
+        return [self.items[title] for _, title in self.index.search(keyword, limit)]
     
     def display_knowledge(self):
         """Displays all the knowledge items."""
@@ -11,6 +11,7 @@ class KnowledgeBaseUI:
         master.title("Knowledge Base UI")
 
         self.kb_manager = KBManager()  # Initialize KBManager
+        master.protocol("WM_DELETE_WINDOW", self.close)  # Save the search index when the window is closed
 
         # --- Upload Frame ---
         self.upload_frame = ttk.LabelFrame(master, text="Upload Knowledge")
@@ -109,6 +110,11 @@ class KnowledgeBaseUI:
             self.response_text.insert(tk.END, "No results found.")
         self.response_text.config(state="disabled")
     
+    def close(self):
+        """Saves the search index and closes the window."""
+        self.kb_manager.close()
+        self.master.destroy()
+
     def clear_response(self):
         """Clears the response text area."""
         self.response_text.config(state="normal")
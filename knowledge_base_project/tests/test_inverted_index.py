@@ -0,0 +1,104 @@
+import pytest
+from knowledge_base.inverted_index import InvertedIndex, parse_query, tokenize
+from knowledge_base.kb_manager import KBManager
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = InvertedIndex(str(tmp_path / "search_index.pkl"))
+    index.add("Linked Lists", "A linked list stores each element with a pointer to the next one.")
+    index.add("Python Lists", "Python lists are dynamic arrays. Listing the items is cheap.")
+    index.add("Hash Maps", "A hash-map keeps keys in buckets; the list of buckets grows when it fills.")
+    return index
+
+
+def titles(results):
+    return [title for _, title in results]
+
+
+def test_parse_query():
+    assert tokenize("Hash-Map, 2x!") == ["hash", "map", "2x"]
+    assert parse_query('"linked list" arr* python') == [
+        ("phrase", ("linked", "list")), ("prefix", "arr"), ("prefix", "python")]
+    assert parse_query("python ") == [("term", "python")]
+    assert parse_query("python", prefix_last=False) == [("term", "python")]
+    assert parse_query('"hash-map"') == [("phrase", ("hash", "map"))]
+
+
+def test_words_match_whole_and_rank_titles_first(index):
+    assert titles(index.search("list ")) == ["Linked Lists", "Hash Maps"]
+    assert titles(index.search("lists ")) == ["Python Lists", "Linked Lists"]
+    assert titles(index.search("python arrays ")) == ["Python Lists"]
+    assert index.search("python linked ") == []  # Every word has to match
+
+
+def test_phrase(index):
+    assert titles(index.search('"linked list"')) == ["Linked Lists"]
+    assert titles(index.search('"hash map"')) == ["Hash Maps"]
+    assert index.search('"list linked"') == []
+
+
+def test_prefix(index):
+    assert set(titles(index.search("list*"))) == {"Linked Lists", "Python Lists", "Hash Maps"}
+    assert titles(index.search("listi")) == ["Python Lists"]  # The last word is still being typed
+    assert index.search("listi ") == []
+    assert index.expand("lis") == ["list", "listing", "lists"]
+
+
+def test_prefix_keeps_the_most_common_words(tmp_path):
+    index = InvertedIndex(str(tmp_path / "search_index.pkl"), max_expansions=50)
+    for number in range(60):
+        index.add(f"rare {number}", f"word{number:02d}")
+    for number in range(5):
+        index.add(f"common {number}", "wordzz")
+    expanded = index.expand("word")
+    assert len(expanded) == 50
+    assert expanded[0] == "wordzz"  # Alphabetically last, but in the most items
+    assert "common 0" in titles(index.search("word*"))
+
+
+def test_remove_and_replace(index):
+    index.add("Linked Lists", "Nodes point to the next node.")
+    assert titles(index.search("pointer ")) == []
+    assert titles(index.search("nodes ")) == ["Linked Lists"]
+    assert index.remove("Hash Maps") and not index.remove("Hash Maps")
+    assert "buckets" not in index.vocabulary
+    assert len(index) == 2
+
+
+def test_save_and_load(index):
+    index.save()
+    assert not index.dirty
+    loaded = InvertedIndex(index.path)
+    assert loaded.load()
+    assert loaded.vocabulary == index.vocabulary
+    assert loaded.total_length == index.total_length
+    for query in ("list ", '"linked list"', "list*", "python arr"):
+        assert loaded.search(query) == index.search(query)
+    assert not InvertedIndex(index.path + ".missing").load()
+
+
+def test_queries_without_words(index):
+    for query in ("*", '"', '""', "#", "- -"):
+        assert parse_query(query) == []
+        assert index.search(query) == []
+
+
+def test_kb_manager_indexes_only_changed_files(tmp_path):
+    data_dir = tmp_path / "knowledge_items"
+    index_path = str(tmp_path / "search_index.pkl")
+    kb_manager = KBManager(str(data_dir), index_path, save_every=2)
+    kb_manager.add_knowledge("Stacks", "A stack is last in, first out.")
+    assert kb_manager.unsaved_additions == 1
+    kb_manager.add_knowledge("Queues", "A queue is first in, first out. Use * for wildcards.")
+    assert kb_manager.unsaved_additions == 0  # Saved after save_every additions
+    (data_dir / "Stacks.txt").unlink()
+    (data_dir / "Heaps.txt").write_text("A heap keeps the smallest item on top.")
+
+    reloaded = KBManager(str(data_dir), index_path)
+    assert sorted(reloaded.items) == ["Heaps", "Queues"]
+    assert [item.title for item in reloaded.search_knowledge("first ")] == ["Queues"]
+    assert [item.title for item in reloaded.search_knowledge("smallest")] == ["Heaps"]
+    # Queries without words fall back to matching the text
+    assert [item.title for item in reloaded.search_knowledge("*")] == ["Queues"]
+    assert len(reloaded.search_knowledge("  ")) == 2
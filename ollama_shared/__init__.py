@@ -0,0 +1,3 @@
+# Code shared by Call_Analysis and Lamma Code Assist: the Ollama client and the response cache.
+# Each app puts the repository root on sys.path (Call_Analysis in Backend/__init__.py, Lamma Code Assist at
+# the top of its scripts), so both import these modules from this one folder.
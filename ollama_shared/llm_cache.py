@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from ollama_shared.ollama_client import get_session, ollama_host
+
+# The same file is used by Call_Analysis and Lamma Code Assist, so answers are shared between the apps
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ollama_response_cache.sqlite")
+
+# LLM attributes (PooledOllamaLLM, langchain's OllamaLLM) and generate options that change what the model writes
+SAMPLING_OPTIONS = ("temperature", "top_k", "top_p", "min_p", "typical_p", "seed", "num_predict", "num_ctx",
+                    "repeat_penalty", "repeat_last_n", "presence_penalty", "frequency_penalty", "mirostat",
+                    "mirostat_eta", "mirostat_tau", "tfs_z", "stop", "system", "template", "format", "raw")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_last_used ON responses (last_used);
+"""
+
+
+def is_deterministic(options):
+    """True if the options make the model give the same answer every time (greedy or a fixed seed)."""
+    return options.get("temperature") == 0 or options.get("seed") is not None
+
+
+def fetch_model_digest(model):
+    """Asks the Ollama server for the digest of a model, so a re-pulled model does not reuse old answers."""
+    response = get_session().get(ollama_host() + "/api/tags", timeout=2)
+    response.raise_for_status()
+    models = response.json().get("models", [])
+    name = model if ":" in model else model + ":latest"
+    for entry in models:
+        if name in (entry.get("name"), entry.get("model")):
+            return entry.get("digest")
+    return None
+
+
+def replay(text):
+    """Splits a cached answer into word-sized pieces, so callers that expect a stream get one."""
+    return [piece for piece in re.split(r"(?<=\s)", text) if piece]
+
+
+class ResponseCache:
+    """
+    A persistent cache of model answers, kept in one SQLite file.
+
+    Answers are keyed on the model name, the model digest, the prompt and the sampling options. When the
+    file grows past `max_bytes` the least recently used answers are dropped. With `cache_sampled=False`,
+    answers sampled with a temperature above 0 and no fixed seed are never cached, so every request gets
+    a fresh sample.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=256 * 1024 * 1024, cache_sampled=True, digest_ttl=60.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.cache_sampled = cache_sampled
+        self.digest_ttl = digest_ttl  # Seconds a model digest is trusted before asking the server again
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._digests = {}  # model -> (digest, time fetched)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds the cache from LLM_CACHE_PATH, LLM_CACHE_MAX_MB and LLM_CACHE_SAMPLED (0 to opt out of caching
+        sampled answers). Returns None when LLM_CACHE=0.
+        """
+        if os.environ.get("LLM_CACHE", "1") == "0":
+            return None
+        return cls(path=os.environ.get("LLM_CACHE_PATH", DEFAULT_PATH),
+                   max_bytes=int(float(os.environ.get("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024),
+                   cache_sampled=os.environ.get("LLM_CACHE_SAMPLED", "1") != "0")
+
+    def model_digest(self, model):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._digests.get(model)
+        if cached is not None and now - cached[1] < self.digest_ttl:
+            return cached[0]
+        try:
+            digest = fetch_model_digest(model)
+        except Exception as e:
+            print(f"Error fetching the digest of {model}: {e}")
+            digest = None
+        with self._lock:
+            self._digests[model] = (digest, now)
+        return digest
+
+    def key(self, model, prompt, options):
+        """
+        Returns the cache key for a request, or None if it must not be cached: the sampling is random and
+        sampled answers are not cached, or the model digest is unknown.
+        """
+        if not self.cache_sampled and not is_deterministic(options):
+            return None
+        digest = self.model_digest(model)
+        if digest is None:
+            return None
+        payload = json.dumps({"model": model, "digest": digest, "prompt": prompt, "options": options},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if key is None:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, model, response):
+        if key is None:
+            return
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, size, now, now))
+            self._evict()
+
+    def _evict(self):
+        """Drops least recently used answers until the cache is back under 90% of max_bytes."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses,
+                "bypassed": self.bypassed}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedLLM:
+    """
+    Wraps an LLM such as PooledOllamaLLM (or langchain's OllamaLLM) with a ResponseCache. `invoke` and `stream` work as before;
+    a cached answer comes back at once and `stream` replays it piece by piece. A stream that is closed
+    before the model finishes is not cached.
+    """
+
+    def __init__(self, llm, cache, model=None):
+        self.llm = llm
+        self.cache = cache
+        self.model = model or getattr(llm, "model", None)
+        self.options = {name: getattr(llm, name) for name in SAMPLING_OPTIONS if getattr(llm, name, None) is not None}
+
+    def invoke(self, prompt, **kwargs):
+        key = self.cache.key(self.model, prompt, self.options) if not kwargs else None
+        response = self.cache.get(key)
+        if response is None:
+            response = self.llm.invoke(prompt, **kwargs)
+            self.cache.put(key, self.model, response)
+        return response
+
+    def stream(self, prompt, **kwargs):
+        key = self.cache.key(self.model, prompt, self.options) if not kwargs else None
+        response = self.cache.get(key)
+        if response is not None:
+            yield from replay(response)
+            return
+        parts = []
+        pieces = self.llm.stream(prompt, **kwargs)
+        try:
+            for piece in pieces:
+                parts.append(piece)
+                yield piece
+        finally:
+            close = getattr(pieces, "close", None)
+            if close is not None:
+                close()  # Passes a cancel on to the model
+        self.cache.put(key, self.model, "".join(parts))
+
+
+def cached_generate(generate, cache, model, prompt, options=None, stream=False, **kwargs):
+    """
+    Calls `generate` (ollama_client.generate or ollama.generate) through a ResponseCache. With stream=True it yields the same
+    {"response": ..., "done": ...} parts as ollama.generate, replayed from the cache on a hit.
+    """
+    options = dict(options or {})
+    request_options = dict(options, **{name: value for name, value in kwargs.items() if name in SAMPLING_OPTIONS})
+    key = cache.key(model, prompt, request_options) if cache is not None else None
+    response = cache.get(key) if cache is not None else None
+
+    if not stream:
+        if response is not None:
+            return {"model": model, "response": response, "done": True, "cached": True}
+        result = generate(model=model, prompt=prompt, options=options or None, stream=False, **kwargs)
+        if cache is not None:
+            cache.put(key, model, result["response"])
+        return result
+
+    def parts():
+        if response is not None:
+            for piece in replay(response):
+                yield {"model": model, "response": piece, "done": False, "cached": True}
+            yield {"model": model, "response": "", "done": True, "cached": True}
+            return
+        pieces = []
+        generated = generate(model=model, prompt=prompt, options=options or None, stream=True, **kwargs)
+        try:
+            for part in generated:
+                pieces.append(part["response"] if "response" in part else "")
+                yield part
+                if "done" in part and part["done"] and cache is not None:
+                    cache.put(key, model, "".join(pieces))
+        finally:
+            # Closing this generator early closes the one from `generate` too, and with it the connection
+            close = getattr(generated, "close", None)
+            if close is not None:
+                close()
+
+    return parts()
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HOST = "http://localhost:11434"
+
+# How long Ollama keeps a model in memory after the last request. Ollama's own default is 5 minutes, after
+# which the next prompt waits for the model to load again.
+KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def ollama_host():
+    host = os.environ.get("OLLAMA_HOST") or DEFAULT_HOST
+    if "://" not in host:
+        host = "http://" + host
+    return host.rstrip("/")
+
+
+def get_session(pool_size=16):
+    """
+    The requests session shared by the whole process. Generation, warm-up, token counting and embedding
+    requests all go through it, and its connection pool keeps connections to Ollama open, so a call does
+    not pay for a new TCP connection each time.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def server_running(timeout=2):
+    """Checks if the Ollama server is running."""
+    try:
+        return get_session().get(ollama_host() + "/api/tags", timeout=timeout).status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+
+def loaded_models(timeout=5):
+    """Names of the models Ollama has in memory right now."""
+    response = get_session().get(ollama_host() + "/api/ps", timeout=timeout)
+    response.raise_for_status()
+    return [model["name"] for model in response.json().get("models", [])]
+
+
+def warm_up(model, options=None, keep_alive=KEEP_ALIVE, timeout=600):
+    """
+    Loads a model into memory without generating anything and returns the seconds it took.
+    `options` must match those of the later requests (num_ctx in particular), or Ollama loads the model again.
+    """
+    start_time = time.perf_counter()
+    response = get_session().post(ollama_host() + "/api/generate", timeout=timeout, json={
+        "model": model, "prompt": "", "keep_alive": keep_alive, "options": options or {}})
+    response.raise_for_status()
+    return time.perf_counter() - start_time
+
+
+def warm_up_in_background(model, options=None, keep_alive=KEEP_ALIVE):
+    """Starts warm_up on a daemon thread, so the app can show its window while the model loads."""
+
+    def run():
+        try:
+            print(f"{model} loaded in {warm_up(model, options, keep_alive):.1f}s")
+        except Exception as e:
+            print(f"Error warming up {model}: {e}")
+
+    thread = threading.Thread(target=run, name=f"warm-up-{model}", daemon=True)
+    thread.start()
+    return thread
+
+
+def generate(model, prompt, options=None, stream=False, keep_alive=KEEP_ALIVE, timeout=600, **kwargs):
+    """
+    ollama.generate over the pooled session. Returns the last {"response": ..., "done": True, ...} part with
+    the whole answer, or with stream=True a generator of the parts as they arrive. Closing the generator
+    early closes its connection, which makes Ollama stop generating. Other keyword arguments (system,
+    template, format, raw) are sent as request fields.
+    """
+    body = dict(kwargs, model=model, prompt=prompt, stream=stream, keep_alive=keep_alive, options=options or {})
+    if not stream:
+        response = get_session().post(ollama_host() + "/api/generate", json=body, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def parts():
+        with get_session().post(ollama_host() + "/api/generate", json=body, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                part = json.loads(line)
+                if "error" in part:
+                    raise RuntimeError(f"Ollama error: {part['error']}")
+                yield part
+
+    return parts()
+
+
+class PooledOllamaLLM:
+    """
+    Stands in for langchain's OllamaLLM with the same invoke/stream methods, but sends every prompt through
+    the pooled session instead of a client of its own.
+    """
+
+    def __init__(self, model, num_ctx=None, temperature=None, keep_alive=KEEP_ALIVE):
+        self.model = model
+        self.num_ctx = num_ctx
+        self.temperature = temperature
+        self.keep_alive = keep_alive
+
+    @property
+    def options(self):
+        return {name: value for name, value in (("num_ctx", self.num_ctx), ("temperature", self.temperature))
+                if value is not None}
+
+    def invoke(self, prompt, **kwargs):
+        return generate(self.model, prompt, self.options, keep_alive=self.keep_alive, **kwargs)["response"]
+
+    def stream(self, prompt, **kwargs):
+        parts = generate(self.model, prompt, self.options, stream=True, keep_alive=self.keep_alive, **kwargs)
+        try:
+            for part in parts:
+                if part.get("response"):
+                    yield part["response"]
+        finally:
+            parts.close()  # Drops the connection when the caller stops early
+
+
+def unload(model, timeout=60):
+    """Asks Ollama to drop a model from memory now."""
+    response = get_session().post(ollama_host() + "/api/generate", timeout=timeout,
+                                  json={"model": model, "prompt": "", "keep_alive": 0})
+    response.raise_for_status()
+
+
+def first_token_seconds(model, prompt, options=None, keep_alive=KEEP_ALIVE, session=None):
+    """
+    Streams a short answer and returns the seconds until its first token. The rest of the answer is read,
+    so the connection goes back to the pool.
+    """
+    session = session or get_session()
+    first_token = None
+    start_time = time.perf_counter()
+    with session.post(ollama_host() + "/api/generate", stream=True, timeout=600, json={
+            "model": model, "prompt": prompt, "stream": True, "keep_alive": keep_alive,
+            "options": dict(options or {}, num_predict=8)}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if first_token is None and line and json.loads(line).get("response"):
+                first_token = time.perf_counter() - start_time
+    return first_token if first_token is not None else time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the first-token latency of an Ollama model when it is "
+                                                 "cold (not loaded), warm on a new connection and warm on the "
+                                                 "pooled session.")
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--num-ctx", type=int, default=8192, help="Context window the app runs the model with")
+    parser.add_argument("--runs", type=int, default=5, help="Warm requests to average")
+    parser.add_argument("--prompt", default="Say hello in one word.")
+    args = parser.parse_args()
+
+    options = {"num_ctx": args.num_ctx}
+    unload(args.model)
+    time.sleep(1.0)
+    cold = first_token_seconds(args.model, args.prompt, options, session=requests.Session())
+    new_connection = [first_token_seconds(args.model, args.prompt, options, session=requests.Session())
+                      for _ in range(args.runs)]
+    pooled = [first_token_seconds(args.model, args.prompt, options) for _ in range(args.runs)]
+    print(f"First token of {args.model} (num_ctx {args.num_ctx}):")
+    print(f"  cold, model not loaded:         {cold * 1000:8.0f} ms")
+    print(f"  warm, new connection (avg {args.runs}): {sum(new_connection) / len(new_connection) * 1000:8.0f} ms")
+    print(f"  warm, pooled session (avg {args.runs}): {sum(pooled) / len(pooled) * 1000:8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
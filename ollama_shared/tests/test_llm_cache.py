@@ -0,0 +1,129 @@
+import itertools
+import pytest
+from ollama_shared import llm_cache
+from ollama_shared.llm_cache import CachedLLM, ResponseCache, cached_generate
+
+
+class FakeLLM:
+    """Stands in for PooledOllamaLLM: answers with a numbered reply and counts the prompts it was sent."""
+
+    def __init__(self, model="llama3.2", temperature=None):
+        self.model = model
+        self.temperature = temperature
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        return f"answer {self.calls} to {prompt}"
+
+    def stream(self, prompt, **kwargs):
+        yield from llm_cache.replay(self.invoke(prompt))
+
+
+@pytest.fixture
+def digests(monkeypatch):
+    """Model name -> digest the fake server reports; a missing model makes the lookup fail."""
+    digests = {"llama3.2": "sha256:aaa", "codellama": "sha256:ccc"}
+
+    def fetch_model_digest(model):
+        if model not in digests:
+            raise ConnectionError("server not running")
+        return digests[model]
+
+    monkeypatch.setattr(llm_cache, "fetch_model_digest", fetch_model_digest)
+    # A clock that always moves forward, so the least recently used order never has ties
+    clock = itertools.count(1000)
+    monkeypatch.setattr(llm_cache.time, "time", lambda: float(next(clock)))
+    return digests
+
+
+@pytest.fixture
+def cache(tmp_path, digests):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), digest_ttl=0)
+    yield cache
+    cache.close()
+
+
+def test_key_covers_model_digest_prompt_and_options(cache, digests):
+    key = cache.key("llama3.2", "prompt", {"temperature": 0})
+    assert key == cache.key("llama3.2", "prompt", {"temperature": 0})
+    assert key != cache.key("codellama", "prompt", {"temperature": 0})
+    assert key != cache.key("llama3.2", "another prompt", {"temperature": 0})
+    assert key != cache.key("llama3.2", "prompt", {"temperature": 0, "num_ctx": 8192})
+    digests["llama3.2"] = "sha256:bbb"  # The model was pulled again
+    assert key != cache.key("llama3.2", "prompt", {"temperature": 0})
+
+
+def test_hit_and_miss(cache):
+    llm = FakeLLM()
+    cached = CachedLLM(llm, cache)
+    assert cached.invoke("hello") == "answer 1 to hello"
+    assert cached.invoke("hello") == "answer 1 to hello"
+    assert cached.invoke("bye") == "answer 2 to bye"
+    assert llm.calls == 2
+    assert "".join(cached.stream("hello")) == "answer 1 to hello"  # Replayed from the cache
+    assert llm.calls == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+
+
+def test_stream_closed_early_is_not_cached(cache):
+    llm = FakeLLM()
+    cached = CachedLLM(llm, cache)
+    stream = cached.stream("hello")
+    next(stream)
+    stream.close()
+    assert cache.stats()["entries"] == 0
+    assert "".join(cached.stream("hello")) == "answer 2 to hello"
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_answers_are_evicted_first(cache):
+    cache.max_bytes = 100
+    keys = {name: cache.key("llama3.2", name, {}) for name in "abc"}
+    cache.put(keys["a"], "llama3.2", "a" * 40)
+    cache.put(keys["b"], "llama3.2", "b" * 40)
+    assert cache.get(keys["a"]) == "a" * 40  # "a" is now used more recently than "b"
+    cache.put(keys["c"], "llama3.2", "c" * 40)  # 120 bytes: answers are dropped until at most 90 are left
+    assert cache.get(keys["b"]) is None
+    assert cache.get(keys["a"]) == "a" * 40
+    assert cache.get(keys["c"]) == "c" * 40
+    assert cache.stats()["bytes"] == 80
+
+
+def test_nothing_is_cached_without_a_digest(cache):
+    llm = FakeLLM(model="mistral")  # The fake server has no digest for it
+    cached = CachedLLM(llm, cache)
+    assert cache.key("mistral", "hello", {}) is None
+    cached.invoke("hello")
+    cached.invoke("hello")
+    assert llm.calls == 2
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["bypassed"]) == (0, 0, 2)
+
+
+def test_sampled_answers_can_be_left_out(tmp_path, digests):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), cache_sampled=False)
+    assert cache.key("llama3.2", "hello", {"temperature": 0.7}) is None
+    assert cache.key("llama3.2", "hello", {"temperature": 0.7, "seed": 42}) is not None
+    assert cache.key("llama3.2", "hello", {"temperature": 0}) is not None
+    cache.close()
+
+
+def test_cached_generate(cache):
+    calls = []
+
+    def generate(model, prompt, options=None, stream=False, **kwargs):
+        calls.append((model, prompt, options, stream))
+        if not stream:
+            return {"model": model, "response": "print(1)", "done": True}
+        return iter([{"response": "print", "done": False}, {"response": "(1)", "done": False},
+                     {"response": "", "done": True}])
+
+    parts = list(cached_generate(generate, cache, "codellama", "write code", stream=True, temperature=0))
+    assert "".join(part["response"] for part in parts) == "print(1)"
+    assert calls == [("codellama", "write code", None, True)]
+    assert cached_generate(generate, cache, "codellama", "write code", temperature=0)["cached"]
+    assert len(calls) == 1
+    cached_generate(generate, cache, "codellama", "write code", options={"num_ctx": 4096}, temperature=0)
+    assert len(calls) == 2  # Other options are another answer
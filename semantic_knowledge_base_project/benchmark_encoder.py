@@ -0,0 +1,101 @@
+import argparse
+import os
+import time
+import numpy as np
+from knowledge_base.chunker import chunk_text
+from knowledge_base.encoders import BACKENDS, load_encoder
+
+
+def load_chunks(data_dir, chunk_size, chunk_overlap, limit):
+    """Returns the chunk texts of the knowledge items, the document number of each chunk and the titles."""
+    texts, owners, titles = [], [], []
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith(".txt"):
+            continue
+        with open(os.path.join(data_dir, filename), "r", errors="replace") as f:
+            content = f.read()
+        for chunk_start, chunk_end in chunk_text(content, chunk_size, chunk_overlap):
+            texts.append(content[chunk_start:chunk_end])
+            owners.append(len(titles))
+        titles.append(filename[:-4])
+        if len(texts) >= limit:
+            break
+    return texts[:limit], np.array(owners[:limit]), titles
+
+
+def normalise(vectors):
+    vectors = np.asarray(vectors, dtype="float32")
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def top_k(queries, chunks, k):
+    """Returns the positions of the k chunks most similar to each query."""
+    similarities = queries @ chunks.T
+    k = min(k, chunks.shape[0])
+    best = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(similarities, best, axis=1), axis=1)
+    return np.take_along_axis(best, order, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares encoding throughput and retrieval quality of the "
+                                                 "int8 and ONNX encoder backends against the fp32 model.")
+    parser.add_argument("--data-dir", default="data/knowledge_items", help="Folder with the .txt knowledge items")
+    parser.add_argument("--model", default="all-mpnet-base-v2", help="SentenceTransformer model name")
+    parser.add_argument("--backends", nargs="+", default=[backend for backend in BACKENDS if backend != "torch"],
+                        choices=BACKENDS)
+    parser.add_argument("--cache-dir", default="models", help="Folder where ONNX exports are kept")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--chunks", type=int, default=2000, help="Most chunks to encode")
+    parser.add_argument("--k", type=int, default=10, help="Chunks retrieved per query")
+    args = parser.parse_args()
+
+    texts, owners, titles = load_chunks(args.data_dir, 200, 40, args.chunks)
+    if not texts:
+        print(f"No .txt files found in {args.data_dir}")
+        return
+    # Every document's title is used as a query; a hit is any of its chunks in the top k
+    print(f"{len(texts)} chunks from {len(titles)} documents, {len(titles)} title queries, k={args.k}\n")
+
+    results = {}
+    for backend in ["torch"] + [backend for backend in args.backends if backend != "torch"]:
+        start_time = time.perf_counter()
+        try:
+            encoder = load_encoder(args.model, backend, args.cache_dir)
+        except Exception as e:
+            print(f"{backend:<10} unavailable: {e}")
+            continue
+        load_seconds = time.perf_counter() - start_time
+        encoder.encode(texts[:args.batch_size], batch_size=args.batch_size)  # Warm up
+
+        start_time = time.perf_counter()
+        chunk_vectors = normalise(encoder.encode(texts, batch_size=args.batch_size, convert_to_numpy=True))
+        encode_seconds = time.perf_counter() - start_time
+        query_vectors = normalise(encoder.encode(titles, batch_size=args.batch_size, convert_to_numpy=True))
+        found = top_k(query_vectors, chunk_vectors, args.k)
+        results[backend] = {
+            "load_seconds": load_seconds,
+            "chunks_per_sec": len(texts) / encode_seconds,
+            "chunk_vectors": chunk_vectors,
+            "found": found,
+            "hit_rate": float(np.mean([document in owners[row] for document, row in enumerate(found)])),
+        }
+
+    reference = results.get("torch")
+    if reference is None:
+        return
+    print(f"{'backend':<10} {'load s':>7} {'chunks/s':>9} {'speedup':>8} {'mean cos':>9} {'min cos':>8} "
+          f"{'hit@k':>6} {'overlap@k':>10}")
+    for backend, result in results.items():
+        cosines = np.sum(result["chunk_vectors"] * reference["chunk_vectors"], axis=1)
+        overlap = np.mean([len(set(found) & set(expected)) / len(expected)
+                           for found, expected in zip(result["found"], reference["found"])])
+        print(f"{backend:<10} {result['load_seconds']:>7.1f} {result['chunks_per_sec']:>9.1f} "
+              f"{result['chunks_per_sec'] / reference['chunks_per_sec']:>7.2f}x {cosines.mean():>9.4f} "
+              f"{cosines.min():>8.4f} {result['hit_rate']:>6.3f} {overlap:>10.3f}")
+    print("\nhit@k: share of title queries with a chunk of their own document in the top k. "
+          "overlap@k: share of the fp32 top k that the backend also returned.")
+
+
+if __name__ == "__main__":
+    main()
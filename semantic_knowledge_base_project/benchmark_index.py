@@ -0,0 +1,162 @@
+import argparse
+import os
+import tempfile
+import time
+import faiss
+import numpy as np
+from knowledge_base.manifest import Manifest
+from knowledge_base.vector_store import VectorStore
+from knowledge_base.vector_index import VectorIndex, INDEX_TYPES, METRICS
+
+
+def recall_at_k(found_ids, true_ids, k):
+    """Average share of the exact top-k neighbours that the approximate search also returned."""
+    hits = 0
+    for found, true in zip(found_ids, true_ids):
+        hits += len(set(found[:k]) & set(true[:k]))
+    return hits / (len(true_ids) * k)
+
+
+def time_queries(vector_index, queries, k, vector_store=None, rerank=0):
+    """Searches one query at a time and returns the ids and per-query latencies in milliseconds.
+
+    With `rerank`, k * rerank candidates are fetched and re-scored with the exact rows of `vector_store`.
+    """
+    latencies = []
+    found = []
+    for query in queries:
+        start_time = time.perf_counter()
+        if rerank:
+            _, candidates = vector_index.search(query.reshape(1, -1), k * rerank)
+            _, ids = vector_index.rerank(query.reshape(1, -1), candidates, vector_store, k)
+        else:
+            _, ids = vector_index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        found.append(ids[0])
+    return np.array(found), np.array(latencies)
+
+
+def index_bytes(vector_index):
+    """Size of the index in memory (and in index.faiss), per vector."""
+    return len(faiss.serialize_index(vector_index.index)) / max(vector_index.ntotal, 1)
+
+
+def copy_store(vector_store, vector_ids, path, dtype, dimension):
+    """Writes the given rows to a new store with another dtype and/or only the leading dimensions."""
+    copy = VectorStore(path, dtype=dtype)
+    for block_ids, rows in vector_store.iter_rows(vector_ids):
+        copy.write(block_ids, rows[:, :dimension])
+    copy.flush()
+    return copy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares recall@k, query latency and size of the index types "
+                                                 "and storage settings against the exact flat index, using the "
+                                                 "stored embeddings.")
+    parser.add_argument("--embeddings-dir", default="embeddings", help="Folder with manifest.json and vectors.f32")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--metric", default="l2", choices=METRICS)
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors held out and used as queries")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64], help="IVF nprobe values to try")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256], help="HNSW efSearch values to try")
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[16, 48, 96], help="PQ bytes per vector to try")
+    parser.add_argument("--pca-dim", type=int, nargs="+", default=[0], help="PCA dimensions to try (0 = no PCA)")
+    parser.add_argument("--truncate-dim", type=int, nargs="+", default=[],
+                        help="Leading dimensions to keep in the store (Matryoshka truncation) to try")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 4],
+                        help="Candidate multiples re-scored with the stored vectors (0 = no re-ranking)")
+    parser.add_argument("--min-recall", type=float, default=0.95, help="Recall bound a setting has to meet")
+    args = parser.parse_args()
+
+    manifest = Manifest(os.path.join(args.embeddings_dir, "manifest.json"))
+    store_name = "vectors.f16" if os.path.exists(os.path.join(args.embeddings_dir, "vectors.f16")) else "vectors.f32"
+    vector_store = VectorStore(os.path.join(args.embeddings_dir, store_name),
+                               dtype="float16" if store_name == "vectors.f16" else "float32")
+    if not (manifest.load() and vector_store.open()):
+        print("No embeddings found. Start the application or run build_index.py first.")
+        return
+
+    vector_ids = np.array(manifest.all_vector_ids(), dtype="int64")
+    rng = np.random.default_rng(0)
+    query_count = min(args.queries, len(vector_ids) // 2)
+    query_ids = rng.choice(vector_ids, query_count, replace=False)
+    corpus_ids = np.setdiff1d(vector_ids, query_ids)
+    queries = vector_store.rows(query_ids).astype("float32")
+    dimension = vector_store.dimension
+    baseline_bytes = dimension * 4  # A float32 vector
+    print(f"{len(corpus_ids)} vectors of {dimension} dimensions, {query_count} held-out queries, "
+          f"recall@{args.k} against exact search")
+    print("Size columns are bytes per vector; 'smaller' compares memory with a float32 flat index\n")
+    print(f"{'index':<10} {'setting':<34} {'build s':>8} {'mem B':>7} {'disk B':>7} {'smaller':>8} {'recall':>7} "
+          f"{'p50 ms':>8} {'p99 ms':>8}  ok")
+
+    def report(index_type, setting, build_seconds, memory, disk, found_ids, latencies):
+        recall = recall_at_k(found_ids, true_ids, args.k)
+        build = f"{build_seconds:.2f}" if build_seconds is not None else "-"
+        print(f"{index_type:<10} {setting:<34} {build:>8} {memory:>7.0f} {disk:>7.0f} "
+              f"{baseline_bytes / memory:>7.1f}x {recall:>7.3f} {np.percentile(latencies, 50):>8.3f} "
+              f"{np.percentile(latencies, 99):>8.3f}  {'yes' if recall >= args.min_recall else 'no'}")
+
+    # Indexes are built in a scratch folder so the application's own index files are left alone
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        exact = VectorIndex(scratch_dir, "flat", args.metric)
+        exact.build(vector_store, corpus_ids)
+        true_ids, baseline = time_queries(exact, queries, args.k)
+        store_bytes = dimension * vector_store.dtype.itemsize
+        report("flat", store_name, None, index_bytes(exact), store_bytes, true_ids, baseline)
+
+        # Smaller stores: float16 rows and/or only the leading dimensions, searched exactly
+        store_variants = [("float16", dimension)] if vector_store.dtype.name == "float32" else []
+        store_variants += [(vector_store.dtype.name, size) for size in args.truncate_dim if size < dimension]
+        store_variants += [("float16", size) for size in args.truncate_dim if size < dimension]
+        for number, (dtype, size) in enumerate(store_variants):
+            small_store = copy_store(vector_store, corpus_ids, os.path.join(scratch_dir, f"variant{number}"), dtype, size)
+            small_index = VectorIndex(scratch_dir, "flat", args.metric)
+            small_index.build(small_store, corpus_ids)
+            found_ids, latencies = time_queries(small_index, np.ascontiguousarray(queries[:, :size]), args.k)
+            report("flat", f"{dtype}, {size} dims", None, index_bytes(small_index),
+                   size * np.dtype(dtype).itemsize, found_ids, latencies)
+
+        for index_type in args.types:
+            if index_type == "flat":
+                continue
+            builds = [{}]
+            if index_type in ("pq", "ivf_pq"):
+                builds = [{"pq_m": pq_m} for pq_m in args.pq_m]
+            if index_type not in ("hnsw",):
+                builds = [dict(build, pca_dim=pca_dim) for build in builds for pca_dim in args.pca_dim]
+            for build in builds:
+                # Force training even on small corpora so every type is measured
+                vector_index = VectorIndex(scratch_dir, index_type, args.metric, ivf_min_size=0,
+                                           compressed_min_size=0, **build)
+                start_time = time.perf_counter()
+                vector_index.build(vector_store, corpus_ids)
+                build_seconds = time.perf_counter() - start_time
+                if vector_index.built_type != index_type:
+                    print(f"{index_type:<10} not enough vectors to train")
+                    continue
+                memory = index_bytes(vector_index)
+                label = ", ".join(f"{name}={value}" for name, value in build.items() if value)
+
+                if index_type == "hnsw":
+                    settings = [("efSearch", "ef_search", value) for value in args.ef_search]
+                elif index_type in ("ivf_flat", "ivf_pq"):
+                    settings = [("nprobe", "nprobe", value) for value in args.nprobe]
+                else:
+                    settings = [(None, None, None)]
+                for search_label, name, value in settings:
+                    if name is not None:
+                        vector_index.set_search_params(**{name: value})
+                    for rerank in args.rerank:
+                        setting = ", ".join(part for part in (
+                            label, f"{search_label}={value}" if search_label else "",
+                            f"rerank x{rerank}" if rerank else "") if part)
+                        found_ids, latencies = time_queries(vector_index, queries, args.k, vector_store, rerank)
+                        report(index_type, setting or "-", build_seconds, memory, store_bytes + memory,
+                               found_ids, latencies)
+
+
+if __name__ == "__main__":
+    main()
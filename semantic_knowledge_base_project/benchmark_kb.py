@@ -0,0 +1,406 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Metrics where a larger value is better; for every other metric smaller is better
+HIGHER_IS_BETTER = ("qps", "recall_at_k")
+
+TOPICS = ("vpn", "outlook", "printer", "password", "windows update", "disk", "teams", "wifi", "browser", "backup",
+          "license", "database", "firewall", "laptop", "sharepoint", "onedrive")
+COMMON_WORDS = ("the", "user", "reports", "that", "after", "when", "error", "issue", "again", "fails", "slow",
+                "restart", "machine", "client", "server", "please", "check", "ticket", "since", "today", "logs",
+                "agent", "tried", "still", "works", "not", "connect", "update", "install", "screen")
+
+
+def parse_scale(text):
+    """Parses a corpus size such as 1000, 10k or 1M."""
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype="float64")
+    if not len(values):
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99)), "mean": float(values.mean())}
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB on Linux
+
+
+class HashingEncoder:
+    """A fast, deterministic stand-in for the SentenceTransformer model.
+
+    Each word gets a fixed random vector derived from its hash and a text is the normalised sum of its
+    words, so texts that share words are similar. It lets the benchmark reach a million documents in
+    minutes and measures everything but the model; benchmark_encoder.py measures the model itself.
+    """
+
+    def __init__(self, dimension=768, max_cached_words=50000):
+        self.dimension = dimension
+        self.max_cached_words = max_cached_words  # Rare words such as ticket numbers are recomputed instead
+        self._word_vectors = {}
+
+    def _word_vector(self, word):
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype("float32")
+            if len(self._word_vectors) < self.max_cached_words:
+                self._word_vectors[word] = vector
+        return vector
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        embeddings = np.zeros((1 if single else len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate([texts] if single else texts):
+            for word in text.lower().split():
+                embeddings[row] += self._word_vector(word)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+def synthetic_document(rng, number, words=120):
+    """Returns the title, text and metadata of a synthetic support ticket about one topic."""
+    topic = TOPICS[number % len(TOPICS)]
+    topic_words = topic.split() + [f"{topic.split()[0]}{rng.integers(50)}" for _ in range(3)]
+    vocabulary = topic_words * 4 + list(COMMON_WORDS)
+    text = " ".join(vocabulary[i] for i in rng.integers(len(vocabulary), size=words))
+    text += f" ticket{number} host-{number % 997}.corp.local"
+    return f"bench_{number:07d}", text, {"team": f"team{number % 10}", "topic": topic}
+
+
+def synthetic_queries(count, seed=1):
+    """Returns short queries that mix a topic with a few of its specific terms."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(count):
+        topic = TOPICS[rng.integers(len(TOPICS))]
+        terms = [f"{topic.split()[0]}{rng.integers(50)}" for _ in range(2)]
+        queries.append(" ".join([topic] + terms + [COMMON_WORDS[rng.integers(len(COMMON_WORDS))]]))
+    return queries
+
+
+def prepare_corpus(data_dir, documents, source=None, seed=0):
+    """Fills data_dir with a corpus of the given size, unless the same corpus is already there.
+
+    The corpus is generated (or, with `source`, copied from a folder of .txt files) once and reused by
+    later runs, so runs on different commits index exactly the same files.
+    """
+    marker_path = os.path.join(data_dir, "corpus.json")
+    marker = {"documents": documents, "source": source and os.path.abspath(source), "seed": seed}
+    if os.path.exists(marker_path):
+        with open(marker_path, "r") as f:
+            if json.load(f) == marker:
+                return
+    if os.path.exists(data_dir):
+        shutil.rmtree(data_dir)
+    os.makedirs(data_dir)
+    attributes = {}
+    if source:
+        filenames = sorted(name for name in os.listdir(source) if name.endswith(".txt"))
+        if len(filenames) < documents:
+            raise ValueError(f"{source} has only {len(filenames)} .txt files, {documents} needed")
+        for filename in filenames[:documents]:
+            shutil.copyfile(os.path.join(source, filename), os.path.join(data_dir, filename))
+    else:
+        rng = np.random.default_rng(seed)
+        for number in range(documents):
+            title, text, metadata = synthetic_document(rng, number)
+            with open(os.path.join(data_dir, f"{title}.txt"), "w") as f:
+                f.write(text)
+            attributes[f"{title}.txt"] = metadata
+    with open(os.path.join(data_dir, "attributes.json"), "w") as f:
+        json.dump({"documents": attributes}, f)
+    with open(marker_path, "w") as f:
+        json.dump(marker, f)
+
+
+def exact_search(kb_manager, query_embeddings, k, block_size=65536):
+    """Exact top-k vector IDs for each query, scanning the vector store in blocks to bound memory."""
+    vector_index = kb_manager.vector_index
+    vector_ids = np.asarray(kb_manager.manifest.all_vector_ids(), dtype="int64")
+    best_scores = np.full((len(query_embeddings), 0), 0.0, dtype="float32")
+    best_ids = np.full((len(query_embeddings), 0), -1, dtype="int64")
+    for start in range(0, len(vector_ids), block_size):
+        scores, ids = vector_index.search_subset(query_embeddings, vector_ids[start:start + block_size],
+                                                 kb_manager.vector_store, k)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, ids], axis=1)
+        order = np.argsort(-vector_index.to_similarity(scores), axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, order, axis=1)
+        best_ids = np.take_along_axis(ids, order, axis=1)
+    return best_ids
+
+
+def measure_recall(kb_manager, queries, k):
+    """Share of the exact top-k chunks that the configured index (and re-ranking) also returns."""
+    query_embeddings = kb_manager._query_embeddings([kb_manager._normalize_query(query) for query in queries])
+    if kb_manager.rerank:
+        _, candidates = kb_manager.vector_index.search(query_embeddings, k * kb_manager.rerank)
+        _, found = kb_manager.vector_index.rerank(query_embeddings, candidates, kb_manager.vector_store, k)
+    else:
+        _, found = kb_manager.vector_index.search(query_embeddings, k)
+    expected = exact_search(kb_manager, query_embeddings, k)
+    hits = sum(len(set(row_found.tolist()) & set(row_expected.tolist()) - {-1})
+               for row_found, row_expected in zip(found, expected))
+    return hits / max(sum(len(set(row.tolist()) - {-1}) for row in expected), 1)
+
+
+def measure_qps(kb_manager, queries, threads, top_k):
+    """Queries per second with `threads` clients searching at the same time."""
+    def client(client_queries):
+        for query in client_queries:
+            kb_manager.search_knowledge(query, top_k)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(client, [queries[i::threads] for i in range(threads)]))
+    return len(queries) / (time.perf_counter() - start_time)
+
+
+def run_scale(documents, options):
+    """Benchmarks one corpus size and returns its metrics. Runs in its own process so peak RSS is per scale."""
+    from knowledge_base.kb_manager import KBManager
+    from knowledge_base.partitions import SharedEncoder
+
+    data_dir = os.path.join(options["work_dir"], f"corpus-{documents}")
+    embeddings_dir = os.path.join(options["work_dir"], f"embeddings-{documents}")
+    prepare_corpus(data_dir, documents, options["corpus"])
+    if os.path.exists(embeddings_dir):
+        shutil.rmtree(embeddings_dir)
+    if options["encoder"] == "hashing":
+        encoder = HashingEncoder(options["dimension"])
+    else:
+        encoder = SharedEncoder(options["model"], options["encoder_backend"])
+    kb_options = dict(data_dir=data_dir, embeddings_dir=embeddings_dir, encoder=encoder, **options["kb_options"])
+    output = sys.stdout if options["verbose"] else io.StringIO()
+    result = {"documents": documents}
+
+    # Cold build: everything is chunked, embedded, indexed and saved
+    with contextlib.redirect_stdout(output):
+        start_time = time.perf_counter()
+        kb_manager = KBManager(**kb_options)
+        result["cold_build_s"] = time.perf_counter() - start_time
+    result["chunks"] = kb_manager.vector_index.ntotal
+    result["build_rss_mb"] = peak_rss_mb()
+    del kb_manager
+
+    # Warm load: the index files are in sync, nothing is embedded
+    with contextlib.redirect_stdout(output):
+        start_time = time.perf_counter()
+        kb_manager = KBManager(**kb_options)
+        result["warm_load_s"] = time.perf_counter() - start_time
+
+    queries = synthetic_queries(options["queries"])
+    kb_manager.search_many(queries[:8], options["top_k"])  # Warm up
+    kb_manager.query_cache.clear()
+    latencies = []
+    for query in queries:
+        start_time = time.perf_counter()
+        kb_manager.search_knowledge(query, options["top_k"])
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    result["query_ms"] = percentiles(latencies)
+
+    filter_latencies = []
+    for number, query in enumerate(queries[:max(1, len(queries) // 4)]):
+        start_time = time.perf_counter()
+        kb_manager.search_knowledge(query, options["top_k"], filters={"team": f"team{number % 10}"})
+        filter_latencies.append((time.perf_counter() - start_time) * 1000)
+    result["filtered_query_ms"] = percentiles(filter_latencies)
+
+    result["qps"] = {}
+    for threads in options["concurrency"]:
+        kb_manager.query_cache.clear()  # Every level encodes its queries, like the first level did
+        result["qps"][str(threads)] = measure_qps(kb_manager, queries, threads, options["top_k"])
+
+    result["recall_at_k"] = measure_recall(kb_manager, queries[:options["recall_queries"]], options["k"])
+
+    # Single additions, each appended to the write-ahead log (snapshots follow flush_every / flush_interval)
+    rng = np.random.default_rng(documents)
+    add_latencies = []
+    added = []
+    with contextlib.redirect_stdout(output):
+        for number in range(options["adds"]):
+            title, text, metadata = synthetic_document(rng, documents + number)
+            title = f"added_{title}"
+            start_time = time.perf_counter()
+            kb_manager.add_knowledge(title, text, metadata)
+            add_latencies.append((time.perf_counter() - start_time) * 1000)
+            added.append(title)
+        kb_manager.flush()
+    result["add_ms"] = percentiles(add_latencies)
+    result["peak_rss_mb"] = peak_rss_mb()
+
+    # Leave the corpus as it was generated for the next run
+    for title in added:
+        os.remove(os.path.join(data_dir, f"{title}.txt"))
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def flatten(result):
+    """Turns one scale's metrics into {"query_ms.p95": value, ...}."""
+    metrics = {}
+    for name, value in result.items():
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                metrics[f"{name}.{key}"] = inner
+        elif name not in ("documents", "chunks") and value is not None:
+            metrics[name] = value
+    return metrics
+
+
+def compare(baseline, report, tolerance):
+    """Prints every metric next to the baseline and returns the metrics that got worse by more than `tolerance`."""
+    if baseline.get("settings") != report.get("settings"):
+        print("Warning: the reports were made with different settings; the comparison may not be meaningful.")
+    regressions = []
+    old_results = {result["documents"]: result for result in baseline["results"]}
+    print(f"{'documents':>9} {'metric':<24} {'baseline':>12} {'current':>12} {'change':>8}")
+    for result in report["results"]:
+        old_result = old_results.get(result["documents"])
+        if old_result is None:
+            continue
+        old_metrics = flatten(old_result)
+        for name, value in flatten(result).items():
+            old_value = old_metrics.get(name)
+            if old_value is None:
+                continue
+            change = (value - old_value) / old_value if old_value else 0.0
+            worse = -change if name.split(".")[0] in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressions.append((result["documents"], name, old_value, value))
+            print(f"{result['documents']:>9} {name:<24} {old_value:>12.3f} {value:>12.3f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def print_summary(report):
+    print(f"{'documents':>9} {'chunks':>8} {'cold s':>8} {'warm s':>7} {'add p50':>8} {'q p50':>7} {'q p95':>7} "
+          f"{'q p99':>7} {'max qps':>8} {'recall':>7} {'rss MB':>8}")
+    for result in report["results"]:
+        rss = result["peak_rss_mb"]
+        print(f"{result['documents']:>9} {result['chunks']:>8} {result['cold_build_s']:>8.1f} "
+              f"{result['warm_load_s']:>7.2f} {result['add_ms']['p50']:>8.2f} {result['query_ms']['p50']:>7.2f} "
+              f"{result['query_ms']['p95']:>7.2f} {result['query_ms']['p99']:>7.2f} {max(result['qps'].values()):>8.1f} "
+              f"{result['recall_at_k']:>7.3f} {rss if rss is None else round(rss):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks KBManager end to end on synthetic corpora: cold build, "
+                                                 "warm load, add latency, query latency, QPS under concurrency, "
+                                                 "peak memory and recall@k against exact search.")
+    parser.add_argument("--scales", nargs="+", default=["1k", "10k"], help="Corpus sizes, e.g. 1k 10k 100k 1M")
+    parser.add_argument("--work-dir", default="benchmark_data", help="Folder for the generated corpora and indexes")
+    parser.add_argument("--corpus", default=None, help="Folder of .txt files to use instead of generated documents")
+    parser.add_argument("--encoder", default="hashing", choices=("hashing", "model"),
+                        help="Fast deterministic hashing encoder, or the real SentenceTransformer model")
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding size of the hashing encoder")
+    parser.add_argument("--model", default="all-mpnet-base-v2", help="SentenceTransformer model name")
+    parser.add_argument("--encoder-backend", default="torch", choices=("torch", "int8", "onnx", "onnx_int8"))
+    parser.add_argument("--index-type", default="flat", choices=("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "pq"))
+    parser.add_argument("--metric", default="l2", choices=("l2", "cosine"))
+    parser.add_argument("--retrieval", default="hybrid", choices=("dense", "lexical", "hybrid"))
+    parser.add_argument("--rerank", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=500, help="Distinct queries for latency and QPS")
+    parser.add_argument("--recall-queries", type=int, default=100)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="Client threads for QPS")
+    parser.add_argument("--adds", type=int, default=100, help="Single additions timed after the queries")
+    parser.add_argument("--top-k", type=int, default=5, help="Documents per search")
+    parser.add_argument("--k", type=int, default=10, help="Chunks compared for recall@k")
+    parser.add_argument("--output", default="benchmark_report.json", help="Where the JSON report is written")
+    parser.add_argument("--baseline", default=None, help="Report to compare this run with")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "REPORT"), default=None,
+                        help="Only compare two existing reports")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative change that counts as a regression when comparing (default 10%%)")
+    parser.add_argument("--verbose", action="store_true", help="Show the knowledge base's own output")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], "r") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], "r") as f:
+            report = json.load(f)
+        sys.exit(1 if compare(baseline, report, args.tolerance) else 0)
+
+    settings = {
+        "encoder": args.encoder if args.encoder == "hashing" else f"{args.model}:{args.encoder_backend}",
+        "dimension": args.dimension if args.encoder == "hashing" else None,
+        "corpus": args.corpus,
+        "queries": args.queries,
+        "concurrency": args.concurrency,
+        "adds": args.adds,
+        "top_k": args.top_k,
+        "k": args.k,
+        "kb_options": {"index_type": args.index_type, "metric": args.metric, "retrieval": args.retrieval,
+                       "rerank": args.rerank},
+    }
+    options = dict(settings, work_dir=args.work_dir, encoder=args.encoder, model=args.model,
+                   encoder_backend=args.encoder_backend, recall_queries=args.recall_queries, verbose=args.verbose)
+    report = {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count()},
+        "settings": settings,
+        "results": [],
+    }
+
+    context = multiprocessing.get_context("spawn")
+    for scale in args.scales:
+        documents = parse_scale(scale)
+        print(f"Benchmarking {documents} documents...", flush=True)
+        with context.Pool(1) as pool:
+            report["results"].append(pool.apply(run_scale, (documents, options)))
+
+    temp_path = args.output + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(temp_path, args.output)
+    print()
+    print_summary(report)
+    print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        print()
+        if compare(baseline, report, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import argparse
+import os
+import time
+from knowledge_base.kb_manager import KBManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds the FAISS index for every knowledge item in bulk.")
+    parser.add_argument("--data-dir", default="data/knowledge_items", help="Folder with the .txt knowledge items")
+    parser.add_argument("--embeddings-dir", default="embeddings", help="Folder where the manifest and vector store are written")
+    parser.add_argument("--model", default="all-mpnet-base-v2", help="SentenceTransformer model name")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks per forward pass")
+    parser.add_argument("--workers", type=int, default=0, help="CPU worker processes (0 = encode in this process)")
+    parser.add_argument("--encoder-backend", default="torch", choices=("torch", "int8", "onnx", "onnx_int8"),
+                        help="fp32 PyTorch, int8-quantised PyTorch, ONNX Runtime or int8 ONNX Runtime")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the existing index and embed everything again")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        for name in ("manifest.json", "vectors.f32", "vectors.f32.json", "vectors.f16", "vectors.f16.json"):
+            path = os.path.join(args.embeddings_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    start_time = time.perf_counter()
+    kb_manager = KBManager(data_dir=args.data_dir, embeddings_dir=args.embeddings_dir, model_name=args.model,
+                           batch_size=args.batch_size, num_workers=args.workers,
+                           encoder_backend=args.encoder_backend)
+    elapsed = time.perf_counter() - start_time
+    print(f"Knowledge base ready with {len(kb_manager.knowledge_items)} items in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
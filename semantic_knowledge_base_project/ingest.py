@@ -0,0 +1,48 @@
+import argparse
+import time
+from knowledge_base.kb_manager import KBManager
+from knowledge_base.ingest import IngestPipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adds every .txt, .pdf and .docx file in a folder or archive "
+                                                 "to the knowledge base. Interrupted runs resume where they stopped.")
+    parser.add_argument("source", help="Folder, .zip or .tar(.gz) archive with the documents")
+    parser.add_argument("--data-dir", default="data/knowledge_items", help="Folder where the extracted text is saved")
+    parser.add_argument("--embeddings-dir", default="embeddings", help="Folder with the manifest and vector store")
+    parser.add_argument("--model", default="all-mpnet-base-v2", help="SentenceTransformer model name")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks per forward pass")
+    parser.add_argument("--encoder-backend", default="torch", choices=("torch", "int8", "onnx", "onnx_int8"),
+                        help="fp32 PyTorch, int8-quantised PyTorch, ONNX Runtime or int8 ONNX Runtime")
+    parser.add_argument("--workers", type=int, default=0, help="Parser processes (0 = one per CPU core but one)")
+    parser.add_argument("--batch-documents", type=int, default=64, help="Documents embedded and saved together")
+    parser.add_argument("--max-pending", type=int, default=0,
+                        help="Most documents parsed ahead of the embedder (0 = 4 per worker)")
+    parser.add_argument("--progress", default=None, help="Progress file (default: <embeddings-dir>/ingest_progress.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the progress file and ingest everything again")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    kb_manager = KBManager(data_dir=args.data_dir, embeddings_dir=args.embeddings_dir, model_name=args.model,
+                           batch_size=args.batch_size, encoder_backend=args.encoder_backend)
+    print(f"Knowledge base loaded with {len(kb_manager.items)} items in {time.perf_counter() - start_time:.1f}s")
+
+    pipeline = IngestPipeline(kb_manager, workers=args.workers or None, batch_documents=args.batch_documents,
+                              max_pending=args.max_pending or None, progress_path=args.progress)
+
+    def on_progress(stats):
+        print(f"{stats['ingested']} documents ingested ({stats['docs_per_sec']:.1f} docs/sec), "
+              f"{stats['failed']} failed", flush=True)
+
+    try:
+        pipeline.run(args.source, on_progress=on_progress, restart=args.restart)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.")
+        return
+    finally:
+        kb_manager.flush()
+    print(pipeline.report())
+
+
+if __name__ == "__main__":
+    main()
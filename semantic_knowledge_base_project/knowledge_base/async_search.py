@@ -0,0 +1,77 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SearchBatcher:
+    """Coalesces concurrent single searches from asyncio code into micro-batches for KBManager.search_many.
+
+    Queries that arrive within `window_ms` of each other (or until `max_batch_size` are waiting) are sent
+    as one batch (one per distinct top_k and filter, because with hybrid fusion a larger top_k can reorder
+    the results, so a smaller request is not a prefix of a larger one). Batches run one at a time on a
+    worker thread so the event loop is never blocked.
+    """
+
+    def __init__(self, kb_manager, window_ms=5, max_batch_size=64, executor=None):
+        self.kb_manager = kb_manager
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-search")
+        self.batches = 0
+        self.queries = 0
+        self._pending = []  # (query, top_k, filters, future)
+        self._timer = None
+
+    async def search(self, query, top_k=5, filters=None):
+        """Returns the same results as kb_manager.search_knowledge(query, top_k, filters)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, top_k, filters, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        """Sends every waiting query to the worker thread as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        groups = {}  # Queries with the same top_k and filters can share a search
+        for request in pending:
+            key = (request[1], json.dumps(request[2], sort_keys=True, default=sorted))
+            groups.setdefault(key, []).append(request)
+        loop = asyncio.get_running_loop()
+        for batch in groups.values():
+            self.batches += 1
+            self.queries += len(batch)
+            top_k = batch[0][1]
+            queries = [query for query, _, _, _ in batch]
+            task = loop.run_in_executor(self.executor, self.kb_manager.search_many, queries, top_k, batch[0][2])
+            task.add_done_callback(lambda done, batch=batch: self._deliver(batch, done))
+
+    @staticmethod
+    def _deliver(batch, done):
+        """Hands each caller its own results, or the batch's exception."""
+        error = done.exception()
+        for position, (_, _, _, future) in enumerate(batch):
+            if future.done():
+                continue  # The caller was cancelled while waiting
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[position])
+
+    def stats(self):
+        """Returns how many batches were sent and their average size."""
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "average_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
+
+    def close(self):
+        """Stops the worker thread once the running batch has finished."""
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,140 @@
+import json
+import operator
+import os
+
+# Range conditions a filter may use, e.g. {"date": {"gte": "2024-01-01", "lt": "2025-01-01"}}
+RANGE_OPERATORS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+_SCALARS = (str, int, float, bool)
+
+
+def validate_metadata(metadata):
+    """Returns a copy of a metadata dict, checking that every value is a string, number, bool or a list of them."""
+    if metadata is None:
+        return {}
+    if not isinstance(metadata, dict):
+        raise ValueError("Metadata must be a dict of attribute names to values")
+    cleaned = {}
+    for name, value in metadata.items():
+        if not isinstance(name, str):
+            raise ValueError(f"Metadata attribute names must be strings, got {name!r}")
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+            if not all(isinstance(element, _SCALARS) for element in value):
+                raise ValueError(f"Metadata attribute '{name}' must hold strings, numbers or bools")
+        elif not isinstance(value, _SCALARS):
+            raise ValueError(f"Metadata attribute '{name}' must be a string, number, bool or a list of them")
+        cleaned[name] = value
+    return cleaned
+
+
+def _values(value):
+    return value if isinstance(value, list) else [value]
+
+
+class AttributeStore:
+    """Structured metadata of every document, indexed by value so that filters resolve without a scan.
+
+    A filter maps attribute names to conditions, all of which must hold:
+        {"team": "network"}                equal to a value
+        {"product": ["vpn", "outlook"]}    equal to any of the values
+        {"date": {"gte": "2024-01-01"}}    a range; ISO dates compare correctly as strings
+    A document whose attribute holds a list matches if any element does.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.metadata = {}  # filename -> {attribute: value}
+        self.postings = {}  # attribute -> {value: set of filenames}
+        self.dirty = False  # True when the in-memory attributes differ from the file
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def get(self, filename):
+        """Returns the metadata of a document ({} if it has none)."""
+        return self.metadata.get(filename, {})
+
+    def set(self, filename, metadata):
+        """Replaces the metadata of a document. An empty dict removes it."""
+        metadata = validate_metadata(metadata)
+        if self.metadata.get(filename, {}) == metadata:
+            return
+        self._unindex(filename)
+        if metadata:
+            self.metadata[filename] = metadata
+            for name, value in metadata.items():
+                values = self.postings.setdefault(name, {})
+                for element in _values(value):
+                    values.setdefault(element, set()).add(filename)
+        self.dirty = True
+
+    def remove(self, filename):
+        """Forgets the metadata of a document."""
+        if filename in self.metadata:
+            self._unindex(filename)
+            self.dirty = True
+
+    def _unindex(self, filename):
+        for name, value in self.metadata.pop(filename, {}).items():
+            values = self.postings.get(name, {})
+            for element in _values(value):
+                filenames = values.get(element)
+                if filenames is not None:
+                    filenames.discard(filename)
+                    if not filenames:
+                        del values[element]
+            if not values:
+                self.postings.pop(name, None)
+
+    def match(self, filters):
+        """Returns the set of filenames whose metadata satisfies every condition in `filters`."""
+        matched = None
+        for name, condition in filters.items():
+            values = self.postings.get(name, {})
+            if isinstance(condition, dict):
+                unknown = set(condition) - set(RANGE_OPERATORS)
+                if unknown:
+                    raise ValueError(f"Unknown filter operator(s) {', '.join(sorted(unknown))} for '{name}', "
+                                     f"expected {', '.join(RANGE_OPERATORS)}")
+                filenames = set()
+                for value, value_filenames in values.items():
+                    try:
+                        if all(RANGE_OPERATORS[op](value, bound) for op, bound in condition.items()):
+                            filenames |= value_filenames
+                    except TypeError:
+                        continue  # E.g. a number compared with a string never matches
+            elif isinstance(condition, (list, tuple, set)):
+                filenames = set()
+                for value in condition:
+                    filenames |= values.get(value, set())
+            else:
+                filenames = set(values.get(condition, set()))
+            matched = filenames if matched is None else matched & filenames
+            if not matched:
+                return set()
+        return set(self.metadata) if matched is None else matched
+
+    def load(self):
+        """Loads the attributes from disk. Returns False if there is no usable file."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r") as f:
+                documents = json.load(f)["documents"]
+        except (ValueError, KeyError) as e:
+            print(f"Error loading attributes: {e}")
+            return False
+        self.metadata = {}
+        self.postings = {}
+        for filename, metadata in documents.items():
+            self.set(filename, metadata)
+        self.dirty = False
+        return True
+
+    def save(self):
+        """Writes the attributes to a temporary file and renames it over the old one."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"documents": self.metadata}, f)
+        os.replace(temp_path, self.path)
+        self.dirty = False
@@ -0,0 +1,119 @@
+import heapq
+import math
+import os
+import pickle
+import re
+from collections import Counter
+
+# Keeps error codes, KB numbers and hostnames (0x80070005, KB5034441, srv-01.corp.local) as single tokens
+_TOKEN = re.compile(r"[a-z0-9](?:[a-z0-9._:\-]*[a-z0-9])?")
+_PART = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercases text and returns its tokens; compound tokens are also split into their parts."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        parts = _PART.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """An inverted index over chunks that ranks them with BM25 and can be updated one chunk at a time."""
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {vector ID: term frequency}
+        self.doc_lengths = {}  # vector ID -> number of tokens
+        self.doc_terms = {}  # vector ID -> distinct terms, needed to remove the chunk again
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, vector_id, text):
+        """Indexes one chunk under its vector ID."""
+        if vector_id in self.doc_lengths:
+            self.remove([vector_id])
+        counts = Counter(tokenize(text))
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[vector_id] = count
+        length = sum(counts.values())
+        self.doc_lengths[vector_id] = length
+        self.doc_terms[vector_id] = tuple(counts)
+        self.total_length += length
+
+    def remove(self, vector_ids):
+        """Removes chunks by vector ID."""
+        for vector_id in vector_ids:
+            terms = self.doc_terms.pop(vector_id, None)
+            if terms is None:
+                continue
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(vector_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(vector_id)
+
+    def search(self, query, top_k, allowed=None):
+        """Returns up to top_k (score, vector ID) pairs, best first. `allowed` limits the search to a set of IDs."""
+        if not self.doc_lengths:
+            return []
+        corpus_size = len(self.doc_lengths)
+        average_length = self.total_length / corpus_size or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (corpus_size - len(postings) + 0.5) / (len(postings) + 0.5))
+            for vector_id, frequency in postings.items():
+                if allowed is not None and vector_id not in allowed:
+                    continue
+                length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[vector_id] / average_length)
+                scores[vector_id] = scores.get(vector_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+        return heapq.nlargest(top_k, ((score, vector_id) for vector_id, score in scores.items()))
+
+    def clear(self):
+        self.postings = {}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.total_length = 0
+
+    def load(self, synced_next_id):
+        """Loads the saved index. Returns False if it is missing or out of sync with the manifest."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, ValueError) as e:
+            print(f"Error loading keyword index: {e}")
+            return False
+        if data.get("synced_next_id") != synced_next_id:
+            return False
+        self.postings = data["postings"]
+        self.doc_lengths = data["doc_lengths"]
+        self.doc_terms = data["doc_terms"]
+        self.total_length = data["total_length"]
+        return True
+
+    def save(self, synced_next_id):
+        """Writes the index to a temporary file and renames it over the old one."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump({
+                "synced_next_id": synced_next_id,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+                "doc_terms": self.doc_terms,
+                "total_length": self.total_length,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A bounded, thread-safe least-recently-used cache with an optional time-to-live and hit/miss counters."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # Seconds an entry stays valid, or None to keep it until it is evicted
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, time stored)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the cached value and marks it as recently used, or `default` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Stores a value, evicting the least recently used entry when the cache is full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry but keeps the counters."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
@@ -0,0 +1,25 @@
+import re
+
+_WORD = re.compile(r"\S+")
+
+
+def chunk_text(text, chunk_size=200, overlap=40):
+    """Splits text into overlapping windows of `chunk_size` words.
+
+    Returns a list of (start, end) character offsets into `text`, so chunk text can be sliced out of
+    the document later instead of being kept in memory. Text without any words gives no chunks.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if not 0 <= overlap < chunk_size:
+        raise ValueError("overlap must be at least 0 and smaller than chunk_size")
+
+    words = [match.span() for match in _WORD.finditer(text)]
+    chunks = []
+    step = chunk_size - overlap
+    for first in range(0, len(words), step):
+        last = min(first + chunk_size, len(words)) - 1
+        chunks.append((words[first][0], words[last][1]))
+        if last == len(words) - 1:
+            break
+    return chunks
@@ -0,0 +1,107 @@
+import json
+import os
+import numpy as np
+
+# "torch": the fp32 PyTorch model. "int8": the same model with its Linear layers dynamically quantised to int8.
+# "onnx": an ONNX Runtime export. "onnx_int8": the ONNX export with dynamically quantised int8 weights.
+BACKENDS = ("torch", "int8", "onnx", "onnx_int8")
+
+# Sentences every backend is checked on before it is used
+CHECK_SENTENCES = (
+    "My computer is very slow after the latest Windows update.",
+    "The VPN client disconnects every few minutes.",
+    "Error 0x80070005: access is denied when installing updates.",
+    "How do I reset my password?",
+    "Outlook keeps asking for credentials.",
+    "The printer on the third floor shows as offline.",
+    "Disk usage is at 100% in Task Manager.",
+    "Teams calls drop when screen sharing starts.",
+)
+
+
+def _model_dir(cache_dir, model_name, backend):
+    return os.path.join(cache_dir, f"{model_name.replace('/', '_')}-{backend}")
+
+
+def _quantize_int8(model):
+    """Quantises the Linear layers of a PyTorch SentenceTransformer to int8; activations stay float."""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx(model_name, backend, cache_dir):
+    """Loads the ONNX export of a model, exporting (and for onnx_int8 quantising) it on first use."""
+    from sentence_transformers import SentenceTransformer
+    model_dir = _model_dir(cache_dir, model_name, "onnx")
+    if not os.path.exists(os.path.join(model_dir, "onnx", "model.onnx")):
+        print(f"Exporting {model_name} to ONNX...")
+        SentenceTransformer(model_name, backend="onnx").save(model_dir)
+    if backend == "onnx":
+        return SentenceTransformer(model_dir, backend="onnx")
+    file_name = os.path.join("onnx", "model_qint8_avx2.onnx")
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        print(f"Quantising the ONNX export of {model_name} to int8...")
+        export_dynamic_quantized_onnx_model(SentenceTransformer(model_dir, backend="onnx"), "avx2", model_dir)
+    return SentenceTransformer(model_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def load_encoder(model_name, backend="torch", cache_dir="models", device=None):
+    """Returns a SentenceTransformer for the given backend. Exports are kept in `cache_dir`."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name, device=device)
+    if backend == "int8":
+        return _quantize_int8(SentenceTransformer(model_name, device="cpu"))
+    return _load_onnx(model_name, backend, cache_dir)
+
+
+def agreement(reference, candidate, texts=CHECK_SENTENCES):
+    """Returns the mean and minimum cosine similarity between two models' embeddings of the same texts."""
+    expected = np.asarray(reference.encode(list(texts), convert_to_numpy=True), dtype="float32")
+    actual = np.asarray(candidate.encode(list(texts), convert_to_numpy=True), dtype="float32")
+    if expected.shape != actual.shape:
+        return {"mean_cosine": 0.0, "min_cosine": 0.0}
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    actual /= np.linalg.norm(actual, axis=1, keepdims=True)
+    cosines = np.sum(expected * actual, axis=1)
+    return {"mean_cosine": float(cosines.mean()), "min_cosine": float(cosines.min())}
+
+
+def load_checked_encoder(model_name, backend="torch", cache_dir="models", tolerance=0.99):
+    """Loads an encoder and makes sure it matches the fp32 model before it is used.
+
+    The first time a backend is used its embeddings of CHECK_SENTENCES are compared with the fp32
+    model's. If any cosine similarity is below `tolerance` a ValueError is raised, since its vectors
+    would not be comparable with the ones already in the index. Passing checks are remembered in
+    `cache_dir/checks.json`, so later starts load only the fast model.
+    """
+    encoder = load_encoder(model_name, backend, cache_dir)
+    if backend == "torch":
+        return encoder
+    checks_path = os.path.join(cache_dir, "checks.json")
+    checks = {}
+    if os.path.exists(checks_path):
+        try:
+            with open(checks_path, "r") as f:
+                checks = json.load(f)
+        except ValueError:
+            checks = {}
+    key = f"{model_name}:{backend}"
+    if key in checks and checks[key]["min_cosine"] >= tolerance:
+        return encoder
+
+    print(f"Checking the {backend} encoder against the fp32 model...")
+    result = agreement(load_encoder(model_name, "torch"), encoder)
+    if result["min_cosine"] < tolerance:
+        raise ValueError(f"The {backend} encoder differs from the fp32 model (minimum cosine "
+                         f"{result['min_cosine']:.4f}, tolerance {tolerance})")
+    checks[key] = dict(result, tolerance=tolerance)
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = checks_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checks, f, indent=2)
+    os.replace(temp_path, checks_path)
+    return encoder
@@ -0,0 +1,214 @@
+import json
+import multiprocessing
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from knowledge_base.parsers import clean_text, extract_text, is_supported
+
+
+def _parse_document(name, filepath, data):
+    """Parses and cleans one document inside a pool worker. Returns (text, error)."""
+    try:
+        text = clean_text(extract_text(filepath or name, data))
+    except Exception as e:
+        return None, str(e)
+    if not text:
+        return None, "No text found"
+    return text, None
+
+
+def iter_sources(source):
+    """Yields (key, name, fingerprint, filepath, read_bytes) for every supported file in a directory, .zip or .tar.
+
+    `key` identifies the file across runs, `name` is its path relative to the source and `fingerprint`
+    changes when the file does. Files inside archives have no filepath; `read_bytes()` returns their content.
+    """
+    source = os.path.abspath(source)
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if not is_supported(filename):
+                    continue
+                filepath = os.path.join(root, filename)
+                stat = os.stat(filepath)
+                name = os.path.relpath(filepath, source)
+                yield filepath, name, [stat.st_size, stat.st_mtime], filepath, None
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_supported(info.filename):
+                    continue
+                yield (f"{source}::{info.filename}", info.filename, [info.file_size, list(info.date_time)], None,
+                       lambda info=info: archive.read(info))
+    elif tarfile.is_tarfile(source):
+        # Read in order, so compressed tarballs are decompressed only once
+        with tarfile.open(source, "r:*") as archive:
+            for member in archive:
+                if not member.isfile() or not is_supported(member.name):
+                    continue
+                yield (f"{source}::{member.name}", member.name, [member.size, member.mtime], None,
+                       lambda member=member: archive.extractfile(member).read())
+    else:
+        raise ValueError(f"{source} is not a directory, .zip or .tar archive")
+
+
+def title_for(name):
+    """Turns a relative path such as 'manuals/vpn/setup.pdf' into the title 'manuals_vpn_setup'."""
+    return os.path.splitext(name)[0].replace("\\", "/").strip("/").replace("/", "_")
+
+
+class IngestProgress:
+    """Remembers which source files have been ingested so an interrupted run can resume where it stopped."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}  # key -> fingerprint of the file when it was ingested
+        self.failed = {}  # key -> error message from the last attempt
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.done = data["done"]
+            self.failed = data.get("failed", {})
+        except (ValueError, KeyError) as e:
+            print(f"Error loading ingest progress: {e}")
+            return False
+        return True
+
+    def save(self):
+        """Writes the progress to a temporary file and renames it over the old one."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"done": self.done, "failed": self.failed}, f)
+        os.replace(temp_path, self.path)
+
+    def reset(self):
+        self.done = {}
+        self.failed = {}
+
+    def is_done(self, key, fingerprint):
+        return self.done.get(key) == fingerprint
+
+
+class IngestPipeline:
+    """Streams a directory or archive of documents through parse -> clean -> chunk -> embed.
+
+    Parsing and cleaning run in a pool of worker processes. Parsed documents are handed to the calling
+    thread, which chunks and embeds them `batch_documents` at a time with KBManager.add_knowledge_batch.
+    At most `max_pending` documents are parsed ahead of the embedder, so memory stays bounded however
+    large the source is. Progress is saved after every batch; running again skips finished files.
+    """
+
+    def __init__(self, kb_manager, workers=None, batch_documents=64, max_pending=None, progress_path=None):
+        self.kb_manager = kb_manager
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.batch_documents = max(1, batch_documents)
+        self.max_pending = max_pending or max(self.batch_documents, self.workers * 4)
+        self.progress = IngestProgress(progress_path or os.path.join(kb_manager.embeddings_dir, "ingest_progress.json"))
+        self.stats = {}
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stops reading new files. Documents that were already parsed are still embedded; the run can be resumed later."""
+        self._stop.set()
+
+    def run(self, source, on_progress=None, restart=False):
+        """Ingests every supported file under `source`. `on_progress(stats)` is called after each batch."""
+        self._stop.clear()
+        if restart:
+            self.progress.reset()
+        else:
+            self.progress.load()
+        self.stats = {"ingested": 0, "skipped": 0, "failed": 0, "batches": 0, "seconds": 0.0, "docs_per_sec": 0.0}
+        start_time = time.perf_counter()
+
+        parsed = queue.Queue()  # Finished parse futures, or the number of submitted files once all are submitted
+        slots = threading.BoundedSemaphore(self.max_pending)  # Backpressure: parsed but not yet embedded
+        producer_error = []
+        context = multiprocessing.get_context("spawn")  # Same as the embedder: no forked torch thread pools
+
+        with ProcessPoolExecutor(self.workers, mp_context=context) as executor:
+            def produce():
+                submitted = 0
+                try:
+                    for key, name, fingerprint, filepath, read_bytes in iter_sources(source):
+                        if self.progress.is_done(key, fingerprint):
+                            self.stats["skipped"] += 1
+                            continue
+                        slots.acquire()
+                        if self._stop.is_set():
+                            slots.release()
+                            break
+                        data = read_bytes() if read_bytes is not None else None
+                        future = executor.submit(_parse_document, name, filepath, data)
+                        future.source = (key, name, fingerprint)
+                        future.add_done_callback(parsed.put)
+                        submitted += 1
+                except Exception as e:
+                    producer_error.append(e)
+                parsed.put(submitted)
+
+            producer = threading.Thread(target=produce, name="kb-ingest-reader", daemon=True)
+            producer.start()
+
+            batch = []  # (key, fingerprint, title, text)
+            received = 0
+            submitted = None
+            while submitted is None or received < submitted:
+                message = parsed.get()
+                if isinstance(message, int):
+                    submitted = message
+                    continue
+                received += 1
+                slots.release()
+                key, name, fingerprint = message.source
+                try:
+                    text, error = message.result()
+                except Exception as e:  # The worker died, e.g. on a malformed file
+                    text, error = None, str(e)
+                if error is not None:
+                    self.stats["failed"] += 1
+                    self.progress.failed[key] = error
+                    print(f"Error ingesting {name}: {error}")
+                    continue
+                batch.append((key, fingerprint, title_for(name), text))
+                if len(batch) >= self.batch_documents:
+                    self._commit(batch, start_time, on_progress)
+                    batch = []
+            if batch:
+                self._commit(batch, start_time, on_progress)
+            producer.join()
+        self.progress.save()
+        if producer_error:
+            raise producer_error[0]
+        return self.stats
+
+    def _commit(self, batch, start_time, on_progress):
+        """Embeds and indexes one batch of parsed documents, then records them as done."""
+        self.kb_manager.add_knowledge_batch([(title, text) for _, _, title, text in batch])
+        for key, fingerprint, _, _ in batch:
+            self.progress.done[key] = fingerprint
+            self.progress.failed.pop(key, None)
+        self.progress.save()
+
+        elapsed = time.perf_counter() - start_time
+        self.stats["ingested"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["seconds"] = elapsed
+        self.stats["docs_per_sec"] = self.stats["ingested"] / elapsed if elapsed > 0 else 0.0
+        if on_progress is not None:
+            on_progress(dict(self.stats))
+
+    def report(self):
+        """Returns a one-line summary of the last run."""
+        stats = self.stats
+        return (f"Ingested {stats['ingested']} documents in {stats['seconds']:.1f}s "
+                f"({stats['docs_per_sec']:.1f} docs/sec), {stats['skipped']} already done, {stats['failed']} failed")
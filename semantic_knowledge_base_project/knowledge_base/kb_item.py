@@ -1,7 +1,38 @@
 class KBItem:
-    def __init__(self, title, content):
+    def __init__(self, title, content=None, path=None, metadata=None):
         self.title = title
-        self.content = content
+        self._content = content
+        self.path = path  # File the content is read from when it was not given up front
+        self.metadata = metadata if metadata is not None else {}  # e.g. {"team": "network", "product": "vpn"}
+
+    @property
+    def content(self):
+        """Returns the item's text. Items backed by a file read it from disk each time instead of keeping it."""
+        if self._content is None and self.path is not None:
+            with open(self.path, "r") as f:
+                return f.read()
+        return self._content
+
+    def passages(self, spans):
+        """Returns the text of each (start, end) character span, reading the document only once."""
+        content = self.content or ""
+        return [content[start:end] for start, end in spans]
 
     def __str__(self):
         return f"Title: {self.title}\nContent: {self.content}\n\n"
+
+
+class SearchResult:
+    """A knowledge item returned by a search, with its best-matching passages."""
+
+    def __init__(self, item, score, passages):
+        self.item = item
+        self.title = item.title
+        self.metadata = item.metadata
+        self.partition = None  # Set when results come from several partitions of a PartitionedKB
+        self.score = score  # Similarity of the best passage; higher is better
+        self.passages = passages  # Passage texts, best first
+
+    def __str__(self):
+        passages = "\n...\n".join(passage.strip() for passage in self.passages)
+        return f"Title: {self.title} (score {self.score:.3f})\n{passages}\n\n"
@@ -1,117 +1,531 @@
+import json
 import os
-import pickle
-import faiss
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from knowledge_base.kb_item import KBItem
+from knowledge_base.attributes import AttributeStore, validate_metadata
+from knowledge_base.kb_item import KBItem, SearchResult
+from knowledge_base.embedder import BatchEmbedder
+from knowledge_base.encoders import load_checked_encoder
+from knowledge_base.manifest import Manifest
+from knowledge_base.vector_store import VectorStore
+from knowledge_base.vector_index import VectorIndex
+from knowledge_base.cache import LRUCache
+from knowledge_base.chunker import chunk_text
+from knowledge_base.bm25 import BM25Index
+from knowledge_base.wal import WriteAheadLog
 
 class KBManager:
-    def __init__(self, data_dir="data/knowledge_items", embeddings_dir="embeddings", model_name="all-mpnet-base-v2"):
+    def __init__(self, data_dir="data/knowledge_items", embeddings_dir="embeddings", model_name="all-mpnet-base-v2",
+                 batch_size=32, num_workers=0, index_type="flat", metric="l2", nprobe=None, ef_search=None,
+                 index_params=None, query_cache_size=1024, query_cache_ttl=None, result_cache_size=0,
+                 chunk_size=200, chunk_overlap=40, max_passages=3, retrieval="dense", fusion="rrf",
+                 lexical_weight=0.3, flush_every=256, flush_interval=60.0, wal_sync=True, encoder_backend="torch",
+                 encoder_cache_dir="models", encoder_tolerance=0.99, store_dtype="float32", truncate_dim=None,
+                 rerank=0, exact_filter_limit=5000, encoder=None, query_cache=None):
         self.data_dir = data_dir
         self.embeddings_dir = embeddings_dir
         self.model_name = model_name
-        self.model = SentenceTransformer(self.model_name)
-        self.knowledge_items = []
-        self.embeddings = []
-        self.faiss_index = None
+        # "torch" (fp32), "int8", "onnx" or "onnx_int8"; other backends must match fp32 within encoder_tolerance
+        self.encoder_backend = encoder_backend
+        self.encoder_cache_dir = encoder_cache_dir
+        self.encoder_tolerance = encoder_tolerance
+        self.batch_size = batch_size  # Chunks per forward pass when embedding many documents
+        self.num_workers = num_workers  # Worker processes used for bulk embedding (0 = encode in this process)
+        self.chunk_size = chunk_size  # Words per chunk
+        self.chunk_overlap = chunk_overlap  # Words shared by neighbouring chunks
+        self.max_passages = max_passages  # Passages returned per document
+        # Keep only the first truncate_dim dimensions of every embedding (for Matryoshka-trained models)
+        self.truncate_dim = truncate_dim
+        # Fetch rerank times more candidates from the index and re-score them with the stored vectors (0 = off)
+        self.rerank = rerank
+        # Filters that leave at most this many vectors are answered by scoring them exactly instead of by the index
+        self.exact_filter_limit = exact_filter_limit
+        if retrieval not in ("dense", "lexical", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode '{retrieval}', expected 'dense', 'lexical' or 'hybrid'")
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion '{fusion}', expected 'rrf' or 'weighted'")
+        self.retrieval = retrieval
+        self.fusion = fusion  # How hybrid results are combined: reciprocal-rank fusion or a weighted score
+        self.lexical_weight = lexical_weight  # Share of the BM25 score when fusion is "weighted"
+        self._model = encoder  # Loaded on first use unless one is given, e.g. shared with other KBManagers
+        self._model_lock = threading.Lock()
+        self.items = {}  # Filename -> KBItem
+        self.chunks_by_id = {}  # Vector ID -> (filename, start, end)
+        self.manifest = Manifest(os.path.join(self.embeddings_dir, "manifest.json"))
+        # Row n of the store holds the embedding with vector ID n; store_dtype is "float32" or "float16"
+        if store_dtype not in ("float32", "float16"):
+            raise ValueError(f"Unknown store dtype '{store_dtype}', expected 'float32' or 'float16'")
+        self.vector_store = VectorStore(os.path.join(self.embeddings_dir, "vectors.f16" if store_dtype == "float16"
+                                                     else "vectors.f32"), dtype=store_dtype)
+        # index_type is one of "flat", "ivf_flat", "ivf_pq" or "hnsw"; metric is "l2" or "cosine"
+        self.vector_index = VectorIndex(self.embeddings_dir, index_type, metric, nprobe=nprobe, ef_search=ef_search,
+                                        **(index_params or {}))
+        # BM25 keyword index over the same chunks, for exact error codes, KB numbers and hostnames
+        self.keyword_index = BM25Index(os.path.join(self.embeddings_dir, "bm25.pkl"))
+        # Metadata of every document, used to filter searches. It is source data rather than derived from the
+        # texts, so it is kept next to them and survives a rebuild of the embeddings folder.
+        self.attributes = AttributeStore(os.path.join(self.data_dir, "attributes.json"))
+        self._lexical_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-bm25")
+        # Normalised query text -> embedding, and (query, top_k, filters) -> results; result_cache_size=0 disables
+        # the latter. A query cache may be shared by KBManagers that use the same encoder.
+        self.query_cache = query_cache if query_cache is not None else LRUCache(query_cache_size, query_cache_ttl)
+        self.result_cache = LRUCache(result_cache_size, query_cache_ttl)
+        self.filter_cache = LRUCache(256)  # Filter -> (sorted vector IDs, set of the same IDs) that pass it
+        # Additions are appended to the log and written to the snapshots above every `flush_every`
+        # additions or `flush_interval` seconds, whichever comes first
+        self.wal = WriteAheadLog(os.path.join(self.embeddings_dir, "wal.log"), sync=wal_sync)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
         self._load_knowledge()
 
+    @property
+    def knowledge_items(self):
+        return list(self.items.values())
+
+    @property
+    def model(self):
+        """The SentenceTransformer model, loaded the first time something needs to be encoded.
+
+        Starting with an index that is already in sync therefore does not pay for loading the model.
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = load_checked_encoder(self.model_name, self.encoder_backend,
+                                                       self.encoder_cache_dir, self.encoder_tolerance)
+        return self._model
+
+    def load_model(self):
+        """Loads the model now instead of on the first query."""
+        return self.model
+
     def _generate_embedding(self, text):
         """Generates a vector embedding for the given text using the SentenceTransformer model."""
         return self.model.encode(text)
 
+    @staticmethod
+    def _normalize_query(query):
+        """Collapses whitespace and case so that trivially different spellings share a cache entry."""
+        return " ".join(query.split()).casefold()
+
+    def cache_stats(self):
+        """Returns hit/miss counters for the query-embedding and result caches."""
+        return {"query_embeddings": self.query_cache.stats(), "results": self.result_cache.stats()}
+
+    def _generate_embeddings(self, texts, report=True):
+        """Generates embeddings for many texts at once using batched (and optionally multi-process) encoding."""
+        embedder = BatchEmbedder(self.model_name, model=self.model, batch_size=self.batch_size,
+                                 num_workers=self.num_workers, backend=self.encoder_backend,
+                                 cache_dir=self.encoder_cache_dir)
+        embeddings = embedder.encode(texts)
+        if report:
+            print(embedder.report())
+        return self._truncate(embeddings)
+
+    def _truncate(self, embeddings):
+        """Keeps the leading truncate_dim dimensions of each embedding, if truncation is enabled."""
+        if self.truncate_dim:
+            return np.ascontiguousarray(embeddings[:, :self.truncate_dim])
+        return embeddings
+
+    def _embedding_settings(self):
+        settings = {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+        if self.truncate_dim:
+            settings["truncate_dim"] = self.truncate_dim
+        return settings
+
     def _load_knowledge(self):
-        """Loads knowledge items from text files and their embeddings."""
+        """Loads the saved vectors and brings them in sync with the text files in the data directory.
+
+        Only files that were added or edited since the last run are embedded again, and vectors of
+        deleted files are removed by ID, so startup cost follows the size of the change.
+        """
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
         if not os.path.exists(self.embeddings_dir):
             os.makedirs(self.embeddings_dir)
+        self._report_legacy_files()
+        self.attributes.load()
 
-        index_path = os.path.join(self.embeddings_dir, "index.bin")
-        embeddings_path = os.path.join(self.embeddings_dir, "embeddings.pkl")
-
-        if os.path.exists(index_path) and os.path.exists(embeddings_path):
-            try:
-                # Load existing index and embeddings
-                self.faiss_index = faiss.read_index(index_path)
-                with open(embeddings_path, "rb") as f:
-                    self.embeddings = pickle.load(f)
-                #load knowledge items
-                for filename in os.listdir(self.data_dir):
-                    if filename.endswith(".txt"):
-                        filepath = os.path.join(self.data_dir, filename)
-                        with open(filepath, "r") as f:
-                            title = filename[:-4]  # Remove .txt extension
-                            content = f.read()
-                            self.knowledge_items.append(KBItem(title, content))
-            except RuntimeError as e:
-                print(f"Error loading index or embeddings: {e}")
-                print("Deleting existing index and embeddings files...")
-                os.remove(index_path)
-                os.remove(embeddings_path)
-                self.faiss_index = None
-                self.embeddings = []
-                self.knowledge_items = []
-                
+        if (self.manifest.load() and self.manifest.settings == self._embedding_settings()
+                and self.vector_store.open()):
+            vector_ids = self.manifest.all_vector_ids()
+            # Trained indexes are read from index.faiss; flat ones are rebuilt from the memory-mapped vectors
+            if not self.vector_index.load(self.manifest.next_id, len(vector_ids)):
+                self.vector_index.build(self.vector_store, vector_ids)
+            keyword_index_loaded = self.keyword_index.load(self.manifest.next_id)
+            # Additions made after the snapshot was written
+            replayed = self._replay_log()
         else:
-            # Create new index and embeddings
-            for filename in os.listdir(self.data_dir):
-                if filename.endswith(".txt"):
-                    filepath = os.path.join(self.data_dir, filename)
-                    with open(filepath, "r") as f:
-                        title = filename[:-4]  # Remove .txt extension
-                        content = f.read()
-                        self.knowledge_items.append(KBItem(title, content))
-                        embedding = self._generate_embedding(content)
-                        self.embeddings.append(embedding)
-
-            # Build FAISS index
-            if self.embeddings:
-                dimension = len(self.embeddings[0])
-                self.faiss_index = faiss.IndexFlatL2(dimension)
-                self.faiss_index.add(np.array(self.embeddings))
-                # Save index and embeddings
-                faiss.write_index(self.faiss_index, index_path)
-                with open(embeddings_path, "wb") as f:
-                    pickle.dump(self.embeddings, f)
-
-    def add_knowledge(self, title, content):
-        """Adds a new knowledge item, generates its embedding, and adds it to the index."""
-        new_item = KBItem(title, content)
-        self.knowledge_items.append(new_item)
-        self._save_knowledge(new_item)
-        embedding = self._generate_embedding(content)
-        self.embeddings.append(embedding)
-        if self.faiss_index is None:
-            dimension = len(embedding)
-            self.faiss_index = faiss.IndexFlatL2(dimension)
-            self.faiss_index.add(np.array([embedding]))
+            # Without matching files (or with a different chunk size) everything is embedded again
+            self.manifest.reset()
+            self.manifest.settings = self._embedding_settings()
+            self.vector_store.reset()
+            self.vector_index.reset()
+            keyword_index_loaded = True  # Every document is re-added below
+            # Additions logged before the first snapshot; the scan below embeds everything else
+            replayed = self._replay_log()
+
+        changed, deleted = self.manifest.scan(self.data_dir)
+
+        # Drop vectors of deleted files and the old vectors of edited files
+        stale_ids = []
+        for filename in deleted:
+            stale_ids.extend(Manifest.vector_ids(self.manifest.forget(filename)))
+            self.attributes.remove(filename)
+        for filename in changed:
+            entry = self.manifest.forget(filename)
+            if entry is not None:
+                stale_ids.extend(Manifest.vector_ids(entry))
+        self._remove_vectors(stale_ids)
+
+        # Embed new and edited files, a group of documents at a time to bound memory use
+        group_size = 1000
+        for start in range(0, len(changed), group_size):
+            documents = []
+            for filename in changed[start:start + group_size]:
+                with open(os.path.join(self.data_dir, filename), "r") as f:
+                    documents.append((filename, f.read()))
+            self._embed_documents(documents, report=True)
+
+        for filename in list(self.attributes.metadata):
+            if filename not in self.manifest.documents:
+                self.attributes.remove(filename)  # The file was deleted while its metadata was only in the log
+        for filename, entry in self.manifest.documents.items():
+            self.items[filename] = KBItem(entry["title"], path=os.path.join(self.data_dir, filename),
+                                          metadata=self.attributes.get(filename))
+            for vector_id, chunk_start, chunk_end in entry["chunks"]:
+                self.chunks_by_id[vector_id] = (filename, chunk_start, chunk_end)
+
+        if not keyword_index_loaded:
+            self._rebuild_keyword_index(skip=set(changed))
+
+        retrain = self.vector_index.needs_retrain()
+        if retrain:
+            self._rebuild_index()
+        if changed or stale_ids or retrain or not keyword_index_loaded or replayed:
+            print(f"Index sync: {len(changed)} documents embedded, {len(stale_ids)} vectors removed, "
+                  f"{replayed} replayed from the log, {len(self.items)} items in total")
+            self._save_index()
         else:
-            self.faiss_index.add(np.array([embedding]))
-        # Save index and embeddings
-        index_path = os.path.join(self.embeddings_dir, "index.bin")
-        embeddings_path = os.path.join(self.embeddings_dir, "embeddings.pkl")
-        faiss.write_index(self.faiss_index, index_path)
-        with open(embeddings_path, "wb") as f:
-            pickle.dump(self.embeddings, f)
+            if self.manifest.dirty:
+                self.manifest.save()
+            if self.attributes.dirty:
+                self.attributes.save()
+            self.wal.reset()  # Whatever is left is already part of the snapshot
+
+    def _embed_documents(self, documents, report=False):
+        """Chunks and embeds (filename, content) pairs, then stores and indexes the chunk vectors.
+
+        Returns the new vector IDs and their embeddings.
+        """
+        chunk_texts = []
+        chunk_records = []  # (filename, start, end) per chunk
+        for filename, content in documents:
+            for chunk_start, chunk_end in chunk_text(content, self.chunk_size, self.chunk_overlap):
+                chunk_texts.append(content[chunk_start:chunk_end])
+                chunk_records.append((filename, chunk_start, chunk_end))
+
+        chunks_by_file = {filename: [] for filename, _ in documents}
+        vector_ids = []
+        for filename, chunk_start, chunk_end in chunk_records:
+            vector_id = self.manifest.allocate_id()
+            chunks_by_file[filename].append((vector_id, chunk_start, chunk_end))
+            self.chunks_by_id[vector_id] = (filename, chunk_start, chunk_end)
+            vector_ids.append(vector_id)
+        for filename, chunks in chunks_by_file.items():
+            self.manifest.record(filename, os.path.join(self.data_dir, filename), chunks)
+
+        for vector_id, text in zip(vector_ids, chunk_texts):
+            self.keyword_index.add(vector_id, text)
+        embeddings = None
+        if chunk_texts:
+            embeddings = self._generate_embeddings(chunk_texts, report=report)
+            self.vector_store.write(vector_ids, embeddings)
+            self._add_vectors(embeddings, vector_ids)
+        return vector_ids, embeddings
+
+    def _report_legacy_files(self):
+        """Points out the pickled embeddings and index written by older versions. They are no longer read, but left for the user to delete."""
+        for name in ("embeddings.pkl", "index.bin"):
+            path = os.path.join(self.embeddings_dir, name)
+            if os.path.exists(path):
+                print(f"{path} was written by an older version and is no longer used; the knowledge base is "
+                      f"embedded from the documents instead. You can delete the file.")
+
+    def _rebuild_index(self):
+        """Trains (if needed) and fills a fresh index from every vector in the manifest."""
+        vector_ids = self.manifest.all_vector_ids()
+        print(f"Building {self.vector_index.index_type} index for {len(vector_ids)} vectors...")
+        self.vector_index.build(self.vector_store, vector_ids)
+        self._clear_caches()
+
+    def _rebuild_keyword_index(self, skip=()):
+        """Re-indexes the chunks of every document (except those in `skip`) for keyword search."""
+        print("Building keyword index...")
+        for filename, entry in self.manifest.documents.items():
+            if filename in skip:
+                continue
+            content = self.items[filename].content
+            for vector_id, chunk_start, chunk_end in entry["chunks"]:
+                self.keyword_index.add(vector_id, content[chunk_start:chunk_end])
+
+    def _add_vectors(self, embeddings, vector_ids):
+        """Adds embeddings to the FAISS index under the given vector IDs."""
+        self.vector_index.add(embeddings, vector_ids)
+        self._clear_caches()
+
+    def _remove_vectors(self, vector_ids):
+        """Removes vectors from the FAISS index by ID. Their rows in the vector store are simply no longer used."""
+        for vector_id in vector_ids:
+            self.chunks_by_id.pop(vector_id, None)
+        self.vector_index.remove(vector_ids)
+        self.keyword_index.remove(vector_ids)
+        self._clear_caches()
+
+    def _clear_caches(self):
+        """Drops cached results and filter matches after the documents or their metadata changed."""
+        self.result_cache.clear()
+        self.filter_cache.clear()
+
+    def _save_index(self):
+        """Writes a snapshot and empties the log. Flat indexes are not written to disk.
+
+        Every file is written to a temporary name and renamed over the old one. The manifest goes last:
+        until it is replaced, the previous snapshot plus the log still describe every addition.
+        """
+        self.vector_store.flush()
+        self.vector_index.save(self.manifest.next_id)
+        self.keyword_index.save(self.manifest.next_id)
+        self.attributes.save()
+        self.manifest.save()
+        self.wal.reset()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Writes the additions that are so far only in the log to the index snapshots."""
+        if self.wal.records or self.manifest.dirty or self.attributes.dirty:
+            self._save_index()
+
+    def _replay_log(self):
+        """Re-applies the additions that were logged after the snapshot was written. Returns how many documents."""
+        replayed = 0
+        for header, vectors in self.wal.read():
+            if header["next_id"] <= self.manifest.next_id or header["settings"] != self._embedding_settings():
+                continue  # Already part of the snapshot, or chunked differently from what is needed now
+            stale_ids = []
+            for filename in header["documents"]:
+                old_entry = self.manifest.forget(filename)
+                if old_entry is not None:
+                    stale_ids.extend(Manifest.vector_ids(old_entry))
+            self._remove_vectors(stale_ids)
+
+            for filename, entry in header["documents"].items():
+                self.manifest.documents[filename] = entry
+                self.attributes.set(filename, header.get("metadata", {}).get(filename))
+                filepath = os.path.join(self.data_dir, filename)
+                if os.path.exists(filepath):
+                    content = KBItem(entry["title"], path=filepath).content
+                    for vector_id, chunk_start, chunk_end in entry["chunks"]:
+                        self.keyword_index.add(vector_id, content[chunk_start:chunk_end])
+            self.manifest.next_id = header["next_id"]
+            self.manifest.dirty = True
+            if header["vector_ids"]:
+                self.vector_store.write(header["vector_ids"], vectors)
+                self._add_vectors(vectors, header["vector_ids"])
+            replayed += len(header["documents"])
+        return replayed
+
+    def add_knowledge(self, title, content, metadata=None):
+        """Adds a new knowledge item, embeds its chunks, and adds them to the index.
+
+        `metadata` is a dict such as {"team": "network", "product": "vpn", "date": "2024-05-01"} that
+        searches can filter on. Replacing an item without giving metadata keeps its old metadata.
+        """
+        self.add_knowledge_batch([(title, content, metadata)])
+
+    def add_knowledge_batch(self, items):
+        """Adds many (title, content) or (title, content, metadata) items at once with one embedding pass
+        and one log record.
+
+        The snapshots on disk are only rewritten every `flush_every` additions or `flush_interval`
+        seconds, so adding documents one by one costs an append to the log, not a rewrite of the index.
+        """
+        # Metadata is checked before anything is written; None keeps what a replaced item had
+        items = [(item[0], item[1], validate_metadata(item[2]) if len(item) > 2 and item[2] is not None else None)
+                 for item in items]
+        stale_ids = []
+        documents = []
+        for title, content, metadata in items:
+            filename = f"{title}.txt"
+            if metadata is not None:
+                self.attributes.set(filename, metadata)
+            filepath = self._save_knowledge(KBItem(title, content))
+
+            # Saving under an existing title replaces that document
+            old_entry = self.manifest.forget(filename)
+            if old_entry is not None:
+                stale_ids.extend(Manifest.vector_ids(old_entry))
+
+            # The text now lives on disk; keep only a reference to the file. Chunk offsets are taken from the
+            # text as it reads back from disk, which may differ from `content` in its line endings.
+            item = KBItem(title, path=filepath, metadata=self.attributes.get(filename))
+            self.items[filename] = item
+            documents.append((filename, item.content))
+        if stale_ids:
+            self._remove_vectors(stale_ids)
+
+        documents = dict(documents)  # A title given twice keeps its last content
+        vector_ids, embeddings = self._embed_documents(list(documents.items()))
+        self.wal.append({
+            "documents": {filename: self.manifest.documents[filename] for filename in documents},
+            "vector_ids": vector_ids,
+            "next_id": self.manifest.next_id,
+            "settings": self._embedding_settings(),
+            "metadata": {filename: self.attributes.get(filename) for filename in documents},
+        }, embeddings)
+
+        if self.vector_index.needs_retrain():
+            self._rebuild_index()
+            self._save_index()  # Replaying onto the old index would only trigger the rebuild again
+        elif self.wal.records >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._save_index()
 
     def _save_knowledge(self, item):
         """Saves a knowledge item to a text file."""
         filepath = os.path.join(self.data_dir, f"{item.title}.txt")
         with open(filepath, "w") as f:
             f.write(item.content)
+        return filepath
+
+    def search_knowledge(self, query, top_k=5, filters=None):
+        """Searches for the passages most similar to the query and returns the best documents.
+
+        Chunks are ranked by similarity and grouped per document; each document is scored by its best
+        chunk and returned as a SearchResult with up to `max_passages` passages. `filters` restricts the
+        search to documents whose metadata matches, see AttributeStore.
+        """
+        return self.search_many([query], top_k, filters)[0]
+
+    def _allowed_ids(self, filters):
+        """Returns (sorted vector IDs, set of the same IDs) of the chunks of documents that match the filters."""
+        key = json.dumps(filters, sort_keys=True, default=sorted)
+        allowed = self.filter_cache.get(key)
+        if allowed is None:
+            vector_ids = [chunk[0] for filename in self.attributes.match(filters)
+                          for chunk in self.manifest.documents.get(filename, {}).get("chunks", ())]
+            allowed = (np.array(sorted(vector_ids), dtype="int64"), set(vector_ids))
+            self.filter_cache.put(key, allowed)
+        return allowed
+
+    def search_many(self, queries, top_k=5, filters=None):
+        """Searches for many queries at once and returns one result list per query, in the same order.
+
+        Queries missing from the caches are encoded together in batches and all of them are looked up
+        with a single index search, which is much faster than calling search_knowledge in a loop. In
+        hybrid mode the BM25 keyword search runs on a second thread at the same time and both rankings
+        are fused.
+
+        Filters are applied inside the searches rather than to their results: the index and BM25 only
+        consider chunks of matching documents, and when few chunks match they are scored exactly.
+        """
+        queries = [self._normalize_query(query) for query in queries]
+        filter_key = json.dumps(filters, sort_keys=True, default=sorted) if filters else None
+        results = [self.result_cache.get((query, top_k, filter_key)) for query in queries]
+        pending = [position for position, result in enumerate(results) if result is None]
+        if not pending:
+            return [list(result) for result in results]
+        allowed_ids, allowed_set = self._allowed_ids(filters) if filters else (None, None)
+        if (self.vector_index.ntotal == 0 and not len(self.keyword_index)) or (filters and not allowed_set):
+            return [list(result) if result is not None else [] for result in results]
+
+        # Fetch more chunks than documents requested, since several chunks can come from one document
+        fetch = top_k * max(self.max_passages, 4)
+        pending_queries = [queries[position] for position in pending]
+        lexical = None
+        if self.retrieval != "dense":
+            lexical = self._lexical_executor.submit(
+                lambda: [self.keyword_index.search(query, fetch, allowed_set) for query in pending_queries])
+        if self.retrieval != "lexical":
+            query_embeddings = self._query_embeddings(pending_queries)
+            if allowed_ids is not None and (len(allowed_ids) <= self.exact_filter_limit
+                                            or not self.vector_index.filterable):
+                scores, ids = self.vector_index.search_subset(query_embeddings, allowed_ids, self.vector_store, fetch)
+            elif self.rerank:
+                _, candidates = self.vector_index.search(query_embeddings, fetch * self.rerank, allowed_ids)
+                scores, ids = self.vector_index.rerank(query_embeddings, candidates, self.vector_store, fetch)
+            else:
+                scores, ids = self.vector_index.search(query_embeddings, fetch, allowed_ids)
+            similarities = self.vector_index.to_similarity(scores)
+        lexical_hits = lexical.result() if lexical is not None else None
+
+        for row, position in enumerate(pending):
+            if self.retrieval == "dense":
+                ranked_scores, ranked_ids = similarities[row], ids[row]
+            elif self.retrieval == "lexical":
+                ranked_scores = [score for score, _ in lexical_hits[row]]
+                ranked_ids = [vector_id for _, vector_id in lexical_hits[row]]
+            else:
+                ranked_scores, ranked_ids = self._fuse(similarities[row], ids[row], lexical_hits[row])
+            results[position] = self._group_by_document(ranked_scores, ranked_ids, top_k)
+            self.result_cache.put((queries[position], top_k, filter_key), results[position])
+        return [list(result) for result in results]
+
+    def _fuse(self, similarities, vector_ids, lexical_hits):
+        """Combines a dense ranking and a BM25 ranking into one list of (scores, ids), best first."""
+        dense = [(float(similarity), int(vector_id)) for similarity, vector_id in zip(similarities, vector_ids)
+                 if vector_id >= 0]
+        fused = {}
+        if self.fusion == "rrf":
+            # Reciprocal-rank fusion only looks at positions, so the two score scales never need to agree
+            for ranking in (dense, lexical_hits):
+                for rank, (_, vector_id) in enumerate(ranking):
+                    fused[vector_id] = fused.get(vector_id, 0.0) + 1.0 / (60 + rank + 1)
+        else:
+            for ranking, weight in ((dense, 1 - self.lexical_weight), (lexical_hits, self.lexical_weight)):
+                if not ranking:
+                    continue
+                high = max(score for score, _ in ranking)
+                low = min(score for score, _ in ranking)
+                for score, vector_id in ranking:
+                    normalised = (score - low) / (high - low) if high > low else 1.0
+                    fused[vector_id] = fused.get(vector_id, 0.0) + weight * normalised
+        ranked = sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
+        return [score for _, score in ranked], [vector_id for vector_id, _ in ranked]
+
+    def _query_embeddings(self, queries):
+        """Returns a float32 matrix of query embeddings, encoding the cache misses in one batch."""
+        embeddings = [self.query_cache.get(query) for query in queries]
+        missing = list({queries[position] for position, embedding in enumerate(embeddings) if embedding is None})
+        if missing:
+            encoded = dict(zip(missing, self.model.encode(missing, batch_size=self.batch_size)))
+            for query, embedding in encoded.items():
+                self.query_cache.put(query, embedding)
+            embeddings = [encoded[query] if embedding is None else embedding
+                          for query, embedding in zip(queries, embeddings)]
+        return self._truncate(np.array(embeddings, dtype="float32"))
+
+    def _group_by_document(self, similarities, vector_ids, top_k):
+        """Aggregates ranked chunk hits into at most top_k SearchResults, best document first."""
+        hits_by_file = {}  # Insertion order follows the ranking, so the first hit of a file is its best
+        for similarity, vector_id in zip(similarities, vector_ids):
+            # FAISS pads with -1 when the index holds fewer vectors than requested
+            chunk = self.chunks_by_id.get(int(vector_id))
+            if chunk is None:
+                continue
+            filename, chunk_start, chunk_end = chunk
+            hits = hits_by_file.setdefault(filename, [])
+            if len(hits) < self.max_passages:
+                hits.append((float(similarity), chunk_start, chunk_end))
 
-    def search_knowledge(self, query, top_k=5):
-        """Searches for knowledge items based on semantic similarity to the query."""
-        query_embedding = self._generate_embedding(query)
-        if self.faiss_index is None:
-            return []
-        
-        # Ensure query_embedding is a 2D array
-        query_embedding = np.array([query_embedding])
-        
-        distances, indices = self.faiss_index.search(query_embedding, top_k)
-        results = [self.knowledge_items[i] for i in indices[0]]
+        results = []
+        for filename, hits in list(hits_by_file.items())[:top_k]:
+            item = self.items[filename]
+            passages = item.passages([(chunk_start, chunk_end) for _, chunk_start, chunk_end in hits])
+            results.append(SearchResult(item, hits[0][0], passages))
         return results
 
     def display_knowledge(self):
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+
+
+class Manifest:
+    """Maps every embedded document to its content hash, mtime and the stable vector IDs of its chunks."""
+
+    def __init__(self, path):
+        self.path = path
+        self.documents = {}  # filename -> {"title", "sha1", "mtime", "size", "chunks": [[id, start, end], ...]}
+        self.next_id = 0
+        self.settings = {}  # Settings the vectors were built with, e.g. the chunk size
+        self.dirty = False  # True when the in-memory manifest differs from the file
+
+    def load(self):
+        """Loads the manifest from disk. Returns False if there is no usable manifest."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.documents = data["documents"]
+            self.next_id = data["next_id"]
+            self.settings = data.get("settings", {})
+        except (ValueError, KeyError) as e:
+            print(f"Error loading manifest: {e}")
+            self.reset()
+            return False
+        return True
+
+    def save(self):
+        """Writes the manifest to a temporary file and renames it over the old one."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"next_id": self.next_id, "settings": self.settings, "documents": self.documents}, f)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+    def reset(self):
+        """Forgets every document so the next scan treats them all as new."""
+        self.documents = {}
+        self.next_id = 0
+        self.dirty = True
+
+    def allocate_id(self):
+        """Returns a vector ID that has never been used before."""
+        vector_id = self.next_id
+        self.next_id += 1
+        return vector_id
+
+    @staticmethod
+    def file_hash(filepath):
+        """Returns the SHA-1 of a file's bytes."""
+        sha1 = hashlib.sha1()
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def vector_ids(entry):
+        """Returns the vector IDs of a document's chunks."""
+        return [chunk[0] for chunk in entry["chunks"]]
+
+    def all_vector_ids(self):
+        """Returns the vector IDs of every chunk in the manifest, in ascending order."""
+        return sorted(chunk[0] for entry in self.documents.values() for chunk in entry["chunks"])
+
+    def record(self, filename, filepath, chunks):
+        """Stores the current fingerprint of a file together with its chunks as [vector ID, start, end]."""
+        stat = os.stat(filepath)
+        self.documents[filename] = {
+            "title": filename[:-4],  # Remove .txt extension
+            "sha1": self.file_hash(filepath),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "chunks": [list(chunk) for chunk in chunks],
+        }
+        self.dirty = True
+
+    def forget(self, filename):
+        """Removes a file from the manifest and returns its old entry (or None)."""
+        entry = self.documents.pop(filename, None)
+        if entry is not None:
+            self.dirty = True
+        return entry
+
+    def scan(self, data_dir):
+        """Compares the data directory with the manifest.
+
+        Returns (changed, deleted): the .txt filenames that are new or whose content changed, and the
+        manifest entries of files that no longer exist. Files whose mtime and size are unchanged are not read.
+        """
+        changed = []
+        seen = set()
+        with os.scandir(data_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".txt") or not entry.is_file():
+                    continue
+                seen.add(entry.name)
+                known = self.documents.get(entry.name)
+                if known is None:
+                    changed.append(entry.name)
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime == known["mtime"] and stat.st_size == known["size"]:
+                    continue
+                # Touched but possibly not edited: only re-embed if the content really differs
+                if self.file_hash(entry.path) == known["sha1"]:
+                    known["mtime"] = stat.st_mtime
+                    known["size"] = stat.st_size
+                    self.dirty = True
+                else:
+                    changed.append(entry.name)
+
+        deleted = {name: entry for name, entry in self.documents.items() if name not in seen}
+        return sorted(changed), deleted
@@ -0,0 +1,87 @@
+import io
+import os
+import re
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".docx", ".doc")
+
+_HYPHENATED_BREAK = re.compile(r"(\w)-\n(\w)")
+_SPACES = re.compile(r"[^\S\n]+")  # Whitespace other than line breaks
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def is_supported(filename):
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def _open_source(filepath, data):
+    """Returns something the parsers can open: the path itself, or the bytes wrapped in a file object."""
+    return filepath if data is None else io.BytesIO(data)
+
+
+def iter_pdf_pages(filepath, data=None):
+    """Yields the text of each page of a PDF file using PyMuPDF."""
+    import fitz
+    try:
+        if data is None:
+            doc = fitz.open(filepath)
+        else:
+            doc = fitz.open(stream=data, filetype="pdf")
+        with doc:
+            for page in doc:
+                yield page.get_text()
+    except Exception as e:
+        raise ValueError(f"Error reading PDF: {e}")
+
+
+def iter_word_paragraphs(filepath, data=None):
+    """Yields the text of each paragraph of a Word file using python-docx."""
+    import docx
+    try:
+        doc = docx.Document(_open_source(filepath, data))
+    except Exception as e:
+        raise ValueError(f"Error reading Word file: {e}")
+    for paragraph in doc.paragraphs:
+        yield paragraph.text
+
+
+def extract_text_from_pdf(filepath, data=None):
+    """Extracts text from a PDF file. Pages are collected in a list and joined once."""
+    return "".join(iter_pdf_pages(filepath, data))
+
+
+def extract_text_from_word(filepath, data=None):
+    """Extracts text from a Word file, one line per paragraph."""
+    return "".join(f"{paragraph}\n" for paragraph in iter_word_paragraphs(filepath, data))
+
+
+def extract_text_from_txt(filepath, data=None):
+    """Reads a text file."""
+    if data is not None:
+        return data.decode("utf-8", errors="replace")
+    with open(filepath, "r", errors="replace") as f:
+        return f.read()
+
+
+def extract_text(filepath, data=None):
+    """Extracts the text of a .txt, .pdf, .docx or .doc file.
+
+    `filepath` selects the parser by its extension. If `data` is given the file is parsed from those
+    bytes instead of being read from disk (used for files inside archives).
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == ".txt":
+        return extract_text_from_txt(filepath, data)
+    if extension == ".pdf":
+        return extract_text_from_pdf(filepath, data)
+    if extension in (".docx", ".doc"):
+        return extract_text_from_word(filepath, data)
+    raise ValueError("Unsupported file type")
+
+
+def clean_text(text):
+    """Normalises extracted text: joins words hyphenated across lines and collapses runs of whitespace."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+    text = _HYPHENATED_BREAK.sub(r"\1\2", text)
+    text = _SPACES.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
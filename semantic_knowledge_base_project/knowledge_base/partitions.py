@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+from knowledge_base.cache import LRUCache
+from knowledge_base.encoders import load_checked_encoder
+from knowledge_base.kb_manager import KBManager
+
+_PARTITION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+class SharedEncoder:
+    """Loads an encoder on first use and lets several KBManagers use the same instance."""
+
+    def __init__(self, model_name="all-mpnet-base-v2", backend="torch", cache_dir="models", tolerance=0.99):
+        self.model_name = model_name
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.tolerance = tolerance
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = load_checked_encoder(self.model_name, self.backend, self.cache_dir, self.tolerance)
+        return self._model
+
+    def encode(self, *args, **kwargs):
+        return self.model.encode(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Anything else (e.g. the embedding dimension) comes from the loaded model
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+class PartitionedKB:
+    """Named knowledge bases (for example one per team) served from one process.
+
+    Every partition is a KBManager with its own data folder, manifest, vector index, keyword index and
+    attributes under `data_root/<name>` and `embeddings_root/<name>`, so searches never cross partitions
+    and each can be rebuilt on its own. All partitions share one encoder and one query-embedding cache:
+    the model is loaded once, and a query sent to several partitions is encoded once.
+    """
+
+    def __init__(self, data_root="data/partitions", embeddings_root="embeddings/partitions", **kb_options):
+        self.data_root = data_root
+        self.embeddings_root = embeddings_root
+        if kb_options.get("retrieval") == "hybrid" and kb_options.get("fusion") == "weighted":
+            # Weighted fusion normalises scores within each partition, so they could not be merged across partitions
+            raise ValueError("Partitions support hybrid retrieval with fusion='rrf' only")
+        self.kb_options = kb_options  # Passed to every partition's KBManager
+        self.encoder = SharedEncoder(kb_options.get("model_name", "all-mpnet-base-v2"),
+                                     kb_options.get("encoder_backend", "torch"),
+                                     kb_options.get("encoder_cache_dir", "models"),
+                                     kb_options.get("encoder_tolerance", 0.99))
+        self.query_cache = LRUCache(kb_options.get("query_cache_size", 1024), kb_options.get("query_cache_ttl"))
+        self.partitions = {}  # Name -> KBManager
+        self._lock = threading.Lock()
+        if not os.path.exists(self.data_root):
+            os.makedirs(self.data_root)
+        for name in sorted(os.listdir(self.data_root)):
+            if _PARTITION_NAME.match(name) and os.path.isdir(os.path.join(self.data_root, name)):
+                self.partition(name)
+
+    @property
+    def names(self):
+        return sorted(self.partitions)
+
+    def partition(self, name, create=False):
+        """Returns the KBManager of a partition, loading it if needed. Unknown names raise KeyError unless `create`."""
+        kb_manager = self.partitions.get(name)
+        if kb_manager is not None:
+            return kb_manager
+        if not _PARTITION_NAME.match(name or ""):
+            raise ValueError(f"Invalid partition name '{name}': use letters, digits, '_', '-' and '.'")
+        with self._lock:
+            if name not in self.partitions:
+                data_dir = os.path.join(self.data_root, name)
+                if not create and not os.path.isdir(data_dir):
+                    raise KeyError(f"Unknown partition '{name}'")
+                self.partitions[name] = KBManager(data_dir=data_dir,
+                                                  embeddings_dir=os.path.join(self.embeddings_root, name),
+                                                  encoder=self.encoder, query_cache=self.query_cache,
+                                                  **self.kb_options)
+            return self.partitions[name]
+
+    def add_knowledge(self, partition, title, content, metadata=None):
+        """Adds a knowledge item to a partition, creating the partition if it does not exist yet."""
+        self.partition(partition, create=True).add_knowledge(title, content, metadata)
+
+    def search_knowledge(self, query, top_k=5, filters=None, partitions=None):
+        return self.search_many([query], top_k, filters, partitions)[0]
+
+    def search_many(self, queries, top_k=5, filters=None, partitions=None):
+        """Searches the named partitions (all of them by default) and merges their results by score.
+
+        Each result's `partition` says where it came from. Scores of different partitions are comparable:
+        dense scores come from the same encoder and metric, and hybrid scores are reciprocal-rank sums
+        (weighted fusion, which normalises scores per partition, is rejected in __init__).
+        """
+        names = self.names if partitions is None else list(partitions)
+        merged = [[] for _ in queries]
+        for name in names:
+            for query_results, results in zip(merged, self.partition(name).search_many(queries, top_k, filters)):
+                for result in results:
+                    result.partition = name
+                query_results.extend(results)
+        return [sorted(results, key=lambda result: result.score, reverse=True)[:top_k] for results in merged]
+
+    def stats(self):
+        """Returns item and vector counts per partition."""
+        return {name: {"items": len(kb_manager.items), "vectors": kb_manager.vector_index.ntotal}
+                for name, kb_manager in sorted(self.partitions.items())}
+
+    def flush(self):
+        """Writes every partition's logged additions to its snapshots."""
+        for kb_manager in list(self.partitions.values()):
+            kb_manager.flush()
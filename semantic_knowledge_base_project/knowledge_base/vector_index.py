@@ -0,0 +1,355 @@
+import json
+import math
+import os
+import faiss
+import numpy as np
+
+# "sq8" and "pq" scan every vector like "flat", but keep 8-bit scalar-quantised or product-quantised codes
+# instead of float32 vectors (4x and dimension * 4 / pq_m times smaller)
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "pq")
+TRAINED_TYPES = ("ivf_flat", "ivf_pq", "sq8", "pq")
+IVF_TYPES = ("ivf_flat", "ivf_pq")
+METRICS = ("l2", "cosine")  # "cosine" is inner product over L2-normalised vectors
+
+DEFAULT_PARAMS = {
+    "nlist": 0,  # IVF cells; 0 picks about 4 * sqrt(corpus size)
+    "nprobe": 16,  # IVF cells visited per query
+    "pq_m": 16,  # PQ sub-quantisers, i.e. bytes per vector at 8 bits (rounded down to a divisor of the dimension)
+    "pq_nbits": 8,  # Bits per PQ sub-quantiser code
+    "pca_dim": 0,  # Trained index types project vectors to this many PCA dimensions first; 0 keeps them all
+    "hnsw_m": 32,  # HNSW neighbours per node
+    "ef_construction": 200,  # HNSW candidate list size while building
+    "ef_search": 64,  # HNSW candidate list size while searching
+    "ivf_min_size": 10000,  # Below this many vectors IVF indexes fall back to a flat scan
+    "compressed_min_size": 1000,  # Below this many vectors sq8 and pq indexes fall back to a flat scan
+    "train_sample": 50000,  # Vectors sampled from the corpus to train IVF indexes
+    "retrain_factor": 2.0,  # Retrain once the corpus grows to this multiple of the training size
+}
+
+# Parameters that change the structure of a built index; the others only affect searching
+BUILD_PARAMS = ("nlist", "pq_m", "pq_nbits", "pca_dim", "hnsw_m", "ef_construction")
+
+
+class VectorIndex:
+    """A FAISS index of the configured type whose parameters are kept in index_config.json.
+
+    Vectors are always added under their vector IDs. IVF indexes are trained on a sample of the corpus
+    and retrained when the corpus grows; until there are enough vectors to train on, a flat index is used.
+    """
+
+    def __init__(self, directory, index_type="flat", metric="l2", **params):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}")
+        self.config_path = os.path.join(directory, "index_config.json")
+        self.index_path = os.path.join(directory, "index.faiss")
+        self.index_type = index_type
+        self.metric = metric
+        self.explicit_params = {name: value for name, value in params.items() if value is not None}
+        self.params = dict(DEFAULT_PARAMS, **self.explicit_params)
+        self.index = None
+        self.dimension = None
+        self.built_type = None  # The type actually built; "flat" until an IVF index can be trained
+        self.trained_size = 0
+        self.needs_rebuild = False
+
+    @property
+    def ntotal(self):
+        return 0 if self.index is None else self.index.ntotal
+
+    def _faiss_metric(self):
+        return faiss.METRIC_INNER_PRODUCT if self.metric == "cosine" else faiss.METRIC_L2
+
+    def _prepare(self, vectors):
+        """Converts vectors to float32 and normalises them for the cosine metric."""
+        vectors = np.array(vectors, dtype="float32", copy=True)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if self.metric == "cosine":
+            faiss.normalize_L2(vectors)
+        return vectors
+
+    def _min_train_size(self, corpus_size):
+        """Number of vectors needed before the configured index type can be trained."""
+        if self.index_type not in TRAINED_TYPES:
+            return 0
+        if self.index_type in IVF_TYPES:
+            size = max(self.params["ivf_min_size"], 39 * self._nlist(corpus_size))
+        else:
+            size = self.params["compressed_min_size"]
+        if self.index_type in ("ivf_pq", "pq"):
+            size = max(size, 39 * 2 ** self.params["pq_nbits"])
+        return max(size, self.params["pca_dim"])
+
+    def _nlist(self, corpus_size):
+        if self.params["nlist"]:
+            return self.params["nlist"]
+        return max(1, min(int(4 * math.sqrt(max(corpus_size, 1))), max(1, corpus_size // 39)))
+
+    def _pq_m(self, dimension):
+        """Largest number of sub-quantisers up to pq_m that divides the dimension."""
+        pq_m = min(self.params["pq_m"], dimension)
+        while dimension % pq_m:
+            pq_m -= 1
+        return pq_m
+
+    def _create(self, index_type, corpus_size):
+        metric = self._faiss_metric()
+        if index_type == "flat":
+            flat = faiss.IndexFlatIP(self.dimension) if self.metric == "cosine" else faiss.IndexFlatL2(self.dimension)
+            return faiss.IndexIDMap2(flat)
+        if index_type == "hnsw":
+            hnsw = faiss.IndexHNSWFlat(self.dimension, self.params["hnsw_m"], metric)
+            hnsw.hnsw.efConstruction = self.params["ef_construction"]
+            return faiss.IndexIDMap2(hnsw)
+
+        dimension = min(self.params["pca_dim"] or self.dimension, self.dimension)
+        if index_type == "sq8":
+            index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, metric)
+        elif index_type == "pq":
+            index = faiss.IndexPQ(dimension, self._pq_m(dimension), self.params["pq_nbits"], metric)
+        else:
+            quantizer = faiss.IndexFlatIP(dimension) if self.metric == "cosine" else faiss.IndexFlatL2(dimension)
+            nlist = self._nlist(corpus_size)
+            if index_type == "ivf_flat":
+                index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+            else:
+                index = faiss.IndexIVFPQ(quantizer, dimension, nlist, self._pq_m(dimension), self.params["pq_nbits"],
+                                         metric)
+        if dimension < self.dimension:
+            # PCA is trained together with the index; queries are projected the same way
+            index = faiss.IndexPreTransform(faiss.PCAMatrix(self.dimension, dimension), index)
+        return index if index_type in IVF_TYPES else faiss.IndexIDMap2(index)
+
+    def _apply_search_params(self):
+        parameter_space = faiss.ParameterSpace()
+        if self.built_type in IVF_TYPES:
+            parameter_space.set_index_parameter(self.index, "nprobe", self.params["nprobe"])
+        elif self.built_type == "hnsw":
+            parameter_space.set_index_parameter(self.index, "efSearch", self.params["ef_search"])
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """Changes how many IVF cells or HNSW candidates a query visits, without rebuilding."""
+        if nprobe is not None:
+            self.params["nprobe"] = nprobe
+            self.explicit_params["nprobe"] = nprobe
+        if ef_search is not None:
+            self.params["ef_search"] = ef_search
+            self.explicit_params["ef_search"] = ef_search
+        if self.index is not None:
+            self._apply_search_params()
+
+    def reset(self):
+        """Forgets the index and deletes its files."""
+        self.index = None
+        self.built_type = None
+        self.trained_size = 0
+        self.needs_rebuild = False
+        for path in (self.config_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def build(self, vector_store, vector_ids):
+        """Builds a fresh index from the given rows of the vector store, training it first if needed."""
+        self.dimension = vector_store.dimension
+        self.needs_rebuild = False
+        vector_ids = np.asarray(vector_ids, dtype="int64")
+        if self.dimension is None or len(vector_ids) == 0:
+            self.index = None
+            self.built_type = None
+            self.trained_size = 0
+            return
+
+        corpus_size = len(vector_ids)
+        index_type = self.index_type
+        if corpus_size < self._min_train_size(corpus_size):
+            index_type = "flat"
+        self.index = self._create(index_type, corpus_size)
+        self.built_type = index_type
+        self.trained_size = corpus_size
+
+        if index_type in TRAINED_TYPES:
+            sample_size = min(corpus_size, self.params["train_sample"])
+            sample_ids = np.sort(np.random.default_rng(0).choice(vector_ids, sample_size, replace=False))
+            self.index.train(self._prepare(vector_store.rows(sample_ids)))
+
+        for block_ids, rows in vector_store.iter_rows(vector_ids):
+            self.index.add_with_ids(self._prepare(rows), block_ids)
+        self._apply_search_params()
+
+    def add(self, vectors, vector_ids):
+        """Adds vectors under their IDs, starting a flat index if none exists yet."""
+        vectors = self._prepare(vectors)
+        if self.index is None:
+            self.dimension = vectors.shape[1]
+            self.index = self._create("flat", 0)
+            self.built_type = "flat"
+            self.trained_size = 0
+        self.index.add_with_ids(vectors, np.asarray(vector_ids, dtype="int64"))
+
+    def remove(self, vector_ids):
+        """Removes vectors by ID. HNSW graphs cannot remove entries, so they are marked for a rebuild instead."""
+        if self.index is None or not len(vector_ids):
+            return
+        if self.built_type == "hnsw":
+            self.needs_rebuild = True
+            return
+        self.index.remove_ids(np.asarray(vector_ids, dtype="int64"))
+
+    def needs_retrain(self):
+        """True when the index should be rebuilt: the corpus outgrew its training or a removal is pending."""
+        if self.needs_rebuild:
+            return True
+        if self.index is None or self.index_type == "flat":
+            return False
+        if self.built_type != self.index_type:
+            return self.ntotal >= self._min_train_size(self.ntotal)
+        if self.index_type == "hnsw":
+            return False
+        return self.ntotal >= self.params["retrain_factor"] * max(self.trained_size, 1)
+
+    @property
+    def filterable(self):
+        """True when the built index can skip vectors outside an allowed set while it searches.
+
+        FAISS's IndexPQ does not take search parameters, so filtered "pq" searches must score the
+        allowed vectors exactly with search_subset instead.
+        """
+        return self.built_type != "pq"
+
+    def _search_parameters(self, selector):
+        """Search parameters restricting a search to a selector, keeping the index's nprobe or efSearch."""
+        if self.built_type in IVF_TYPES:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.params["nprobe"])
+        if self.built_type == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.params["ef_search"])
+        return faiss.SearchParameters(sel=selector)
+
+    def search(self, queries, top_k, allowed_ids=None):
+        """Returns (scores, ids) for a matrix of queries. Scores are distances for l2 and similarities for cosine.
+
+        With `allowed_ids` only those vectors are considered: FAISS skips every other ID while it scans
+        the lists or walks the graph, so a filter never empties a top_k that was fetched first.
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return (np.empty((len(queries), 0), dtype="float32"), np.empty((len(queries), 0), dtype="int64"))
+        if allowed_ids is None:
+            return self.index.search(self._prepare(queries), top_k)
+        selector = faiss.IDSelectorBatch(np.asarray(allowed_ids, dtype="int64"))
+        return self.index.search(self._prepare(queries), top_k, params=self._search_parameters(selector))
+
+    def search_subset(self, queries, vector_ids, vector_store, top_k):
+        """Scores the queries exactly against only the given stored vectors and returns (scores, ids) like search.
+
+        When a filter leaves few vectors, this brute-force scan is both faster and more accurate than an
+        approximate search that has to skip past everything else.
+        """
+        queries = self._prepare(queries)
+        vector_ids = np.asarray(vector_ids, dtype="int64")
+        top_k = min(top_k, len(vector_ids))
+        if not top_k:
+            return (np.empty((len(queries), 0), dtype="float32"), np.empty((len(queries), 0), dtype="int64"))
+        vectors = self._prepare(vector_store.rows(vector_ids))
+        if self.metric == "cosine":
+            scores = queries @ vectors.T
+            similarities = scores
+        else:
+            scores = (np.sum(queries ** 2, axis=1, keepdims=True) - 2 * queries @ vectors.T
+                      + np.sum(vectors ** 2, axis=1))
+            similarities = -scores
+        best = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+        order = np.argsort(-np.take_along_axis(similarities, best, axis=1), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        return np.take_along_axis(scores, best, axis=1).astype("float32"), vector_ids[best]
+
+    def rerank(self, queries, candidate_ids, vector_store, top_k):
+        """Re-scores candidate IDs with the exact stored vectors and returns the best top_k as (scores, ids).
+
+        Compressed indexes (sq8, pq, ivf_pq or PCA) only approximate distances; fetching a few times more
+        candidates than needed and re-ranking them restores most of the lost recall.
+        """
+        queries = self._prepare(queries)
+        scores = np.full((len(queries), top_k), -np.inf if self.metric == "cosine" else np.inf, dtype="float32")
+        ids = np.full((len(queries), top_k), -1, dtype="int64")
+        for row, (query, candidates) in enumerate(zip(queries, candidate_ids)):
+            candidates = np.unique(candidates[candidates >= 0])
+            if not len(candidates):
+                continue
+            vectors = self._prepare(vector_store.rows(candidates))
+            if self.metric == "cosine":
+                exact = vectors @ query
+                order = np.argsort(-exact)[:top_k]
+            else:
+                exact = np.sum((vectors - query) ** 2, axis=1)
+                order = np.argsort(exact)[:top_k]
+            scores[row, :len(order)] = exact[order]
+            ids[row, :len(order)] = candidates[order]
+        return scores, ids
+
+    def to_similarity(self, scores):
+        """Turns search scores into similarities where higher is better, whatever the metric."""
+        return scores if self.metric == "cosine" else -scores
+
+    def _saved_config(self):
+        if not os.path.exists(self.config_path):
+            return None
+        try:
+            with open(self.config_path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+    def load(self, synced_next_id, expected_count):
+        """Loads a saved index if it was built with the same settings and matches the manifest.
+
+        Flat indexes are never saved (they are rebuilt from the vector store), so this returns False for them.
+        """
+        config = self._saved_config()
+        if config is not None:
+            # Search parameters that were not given explicitly keep their saved values
+            for name in ("nprobe", "ef_search"):
+                if name not in self.explicit_params and name in config.get("params", {}):
+                    self.params[name] = config["params"][name]
+        if (config is None or config.get("index_type") != self.index_type or config.get("metric") != self.metric
+                or config.get("built_type") in (None, "flat") or not os.path.exists(self.index_path)):
+            return False
+        saved_params = config.get("params", {})
+        if any(saved_params.get(name) != self.params[name] for name in BUILD_PARAMS):
+            return False
+        if config.get("synced_next_id") != synced_next_id:
+            return False
+        try:
+            index = faiss.read_index(self.index_path)
+        except RuntimeError as e:
+            print(f"Error loading index: {e}")
+            return False
+        if index.ntotal != expected_count:
+            return False
+        self.index = index
+        self.dimension = index.d
+        self.built_type = config["built_type"]
+        self.trained_size = config.get("trained_size", 0)
+        self._apply_search_params()
+        return True
+
+    def save(self, synced_next_id):
+        """Writes the parameters and, for trained or graph indexes, the index itself."""
+        if self.built_type not in (None, "flat") and self.index is not None:
+            temp_path = self.index_path + ".tmp"
+            faiss.write_index(self.index, temp_path)
+            os.replace(temp_path, self.index_path)
+        elif os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        config = {
+            "index_type": self.index_type,
+            "metric": self.metric,
+            "built_type": self.built_type,
+            "trained_size": self.trained_size,
+            "synced_next_id": synced_next_id,
+            "params": self.params,
+        }
+        temp_path = self.config_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(config, f, indent=2)
+        os.replace(temp_path, self.config_path)
@@ -0,0 +1,109 @@
+import json
+import os
+import numpy as np
+
+
+class VectorStore:
+    """A growable float32 matrix kept in a raw file on disk and opened with np.memmap.
+
+    Row n holds the vector with ID n. Rows are preallocated in chunks that double in size, so an
+    append only writes the new rows, and opening the store maps the file instead of reading it.
+    """
+
+    def __init__(self, path, dtype="float32", initial_capacity=1024):
+        self.path = path
+        self.meta_path = path + ".json"
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = initial_capacity
+        self.dimension = None
+        self.count = 0  # Highest written row + 1
+        self.capacity = 0
+        self.matrix = None
+
+    def open(self):
+        """Maps an existing store. Returns False if there is nothing usable on disk."""
+        if not (os.path.exists(self.path) and os.path.exists(self.meta_path)):
+            return False
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            if np.dtype(meta["dtype"]) != self.dtype:
+                raise ValueError(f"store holds {meta['dtype']} vectors, expected {self.dtype}")
+            self.dimension = meta["dimension"]
+            self.count = meta["count"]
+            self.capacity = os.path.getsize(self.path) // (self.dimension * self.dtype.itemsize)
+            if self.capacity < self.count:
+                raise ValueError("vector file is shorter than its metadata says")
+        except (ValueError, KeyError) as e:
+            print(f"Error loading vector store: {e}")
+            self.dimension = None
+            self.count = 0
+            self.capacity = 0
+            return False
+        self._map()
+        return True
+
+    def reset(self):
+        """Deletes the store so it can be rebuilt from scratch."""
+        self.matrix = None
+        for path in (self.path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dimension = None
+        self.count = 0
+        self.capacity = 0
+
+    def _map(self):
+        if self.capacity == 0:
+            self.matrix = None
+            return
+        self.matrix = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(self.capacity, self.dimension))
+
+    def _reserve(self, rows):
+        """Grows the file so that at least `rows` rows fit, doubling the capacity each time."""
+        if rows <= self.capacity:
+            return
+        capacity = max(self.capacity, self.initial_capacity)
+        while capacity < rows:
+            capacity *= 2
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        with open(self.path, "ab") as f:
+            f.truncate(capacity * self.dimension * self.dtype.itemsize)
+        self.capacity = capacity
+        self._map()
+
+    def write(self, vector_ids, vectors):
+        """Writes vectors to the rows given by their IDs."""
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        if len(vectors) == 0:
+            return
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+        vector_ids = np.asarray(vector_ids, dtype="int64")
+        self._reserve(int(vector_ids.max()) + 1)
+        self.matrix[vector_ids] = vectors
+        self.count = max(self.count, int(vector_ids.max()) + 1)
+
+    def rows(self, vector_ids):
+        """Returns a copy of the rows with the given IDs."""
+        return np.asarray(self.matrix[np.asarray(vector_ids, dtype="int64")])
+
+    def iter_rows(self, vector_ids, block_size=65536):
+        """Yields (ids, rows) in blocks so large stores never need a second full copy in memory."""
+        vector_ids = np.asarray(vector_ids, dtype="int64")
+        for start in range(0, len(vector_ids), block_size):
+            block = vector_ids[start:start + block_size]
+            yield block, self.rows(block)
+
+    def flush(self):
+        """Flushes written rows to disk and records the row count."""
+        if self.matrix is not None:
+            self.matrix.flush()
+        if self.dimension is None:
+            return
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"dtype": self.dtype.name, "dimension": self.dimension, "count": self.count}, f)
+        os.replace(temp_path, self.meta_path)
@@ -0,0 +1,81 @@
+import json
+import os
+import struct
+import zlib
+import numpy as np
+
+# Record layout: header length, payload length, CRC-32 of both, JSON header, raw float32 vectors
+_RECORD = struct.Struct("<III")
+
+
+class WriteAheadLog:
+    """An append-only file of additions that have not been written to the index snapshots yet.
+
+    Each record holds a JSON header and the embeddings that go with it, so replaying the log on
+    startup needs neither the model nor a re-read of the index. A record that was only partly written
+    when the process died fails its checksum and is ignored, along with anything after it.
+    """
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync  # fsync after every append, so an acknowledged addition survives a power loss
+        self.records = 0  # Records appended since the last reset
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def append(self, header, vectors=None):
+        """Appends one record and makes it durable."""
+        payload = b"" if vectors is None else np.ascontiguousarray(vectors, dtype="float32").tobytes()
+        if vectors is not None:
+            header = dict(header, dimension=int(np.shape(vectors)[1]) if len(vectors) else 0)
+        header_bytes = json.dumps(header).encode("utf-8")
+        checksum = zlib.crc32(payload, zlib.crc32(header_bytes))
+        f = self._open()
+        f.write(_RECORD.pack(len(header_bytes), len(payload), checksum) + header_bytes + payload)
+        f.flush()
+        if self.sync:
+            os.fsync(f.fileno())
+        self.records += 1
+
+    def read(self):
+        """Yields (header, vectors) for every complete record, oldest first."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            while True:
+                prefix = f.read(_RECORD.size)
+                if len(prefix) < _RECORD.size:
+                    return
+                header_length, payload_length, checksum = _RECORD.unpack(prefix)
+                header_bytes = f.read(header_length)
+                payload = f.read(payload_length)
+                if (len(header_bytes) < header_length or len(payload) < payload_length
+                        or zlib.crc32(payload, zlib.crc32(header_bytes)) != checksum):
+                    print(f"Ignoring an incomplete record at the end of {self.path}")
+                    return
+                header = json.loads(header_bytes)
+                vectors = None
+                if payload_length:
+                    vectors = np.frombuffer(payload, dtype="float32").reshape(-1, header["dimension"])
+                yield header, vectors
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def reset(self):
+        """Empties the log once its records are part of a snapshot."""
+        self.close()
+        if os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                if self.sync:
+                    os.fsync(f.fileno())
+        self.records = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,20 +1,25 @@
+import time
+_START_TIME = time.perf_counter()  # Used to report time-to-interactive and time-to-first-query
+
 import tkinter as tk
 from tkinter import ttk
 from tkinter import scrolledtext
 from tkinter import filedialog
 import os
-#from knowledge_base.kb_manager import KBManager
-import PyPDF2
-import docx
-import fitz
-from knowledge_base.kb_manager import KBManager  # Assuming kb_manager.py is in knowledge_base package
+import queue
+import threading
+# Heavy modules (KBManager with faiss and sentence_transformers, and the PDF/Word parsers) are imported
+# only when they are needed, so the window appears immediately.
 
 class KnowledgeBaseUI:
     def __init__(self, master):
         self.master = master
         master.title("Knowledge Base UI")
 
-        self.kb_manager = KBManager()  # Initialize KBManager
+        self.kb_manager = None  # Loaded on a background thread, see _load_kb_manager
+        self.first_query_reported = False
+        self._load_updates = queue.Queue()  # Messages from the loading thread to the Tk thread
+        self._task_updates = queue.Queue()  # Messages from upload and add threads to the Tk thread
 
         # --- Upload Frame ---
         self.upload_frame = ttk.LabelFrame(master, text="Upload Knowledge")
@@ -23,8 +28,11 @@ class KnowledgeBaseUI:
         self.upload_button = ttk.Button(self.upload_frame, text="Upload File", command=self.upload_file)
         self.upload_button.grid(row=0, column=0, padx=5, pady=5)
 
+        self.upload_folder_button = ttk.Button(self.upload_frame, text="Upload Folder", command=self.upload_folder)
+        self.upload_folder_button.grid(row=0, column=1, padx=5, pady=5)
+
         self.upload_status_label = ttk.Label(self.upload_frame, text="No file uploaded")
-        self.upload_status_label.grid(row=1, column=0, padx=5, pady=5)
+        self.upload_status_label.grid(row=1, column=0, columnspan=2, padx=5, pady=5)
 
         # --- Add Knowledge Frame ---
         self.add_frame = ttk.LabelFrame(master, text="Add Knowledge")
@@ -64,6 +72,15 @@ class KnowledgeBaseUI:
         self.response_text.grid(row=1, column=1, columnspan=3, padx=5, pady=5)
         self.response_text.config(state="disabled")
 
+        # --- Loading Frame ---
+        self.loading_frame = ttk.Frame(master)
+        self.loading_frame.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.loading_label = ttk.Label(self.loading_frame, text="Loading knowledge base...")
+        self.loading_label.grid(row=0, column=0, padx=5, sticky="w")
+        self.loading_bar = ttk.Progressbar(self.loading_frame, mode="indeterminate", length=200)
+        self.loading_bar.grid(row=0, column=1, padx=5, sticky="e")
+        self.loading_frame.grid_columnconfigure(0, weight=1)
+
         # --- Configure Grid Weights ---
         master.grid_rowconfigure(2, weight=1)
         master.grid_columnconfigure(0, weight=1)
@@ -72,6 +89,52 @@ class KnowledgeBaseUI:
         self.prompt_frame.grid_rowconfigure(1, weight=1)
         self.prompt_frame.grid_columnconfigure(1, weight=1)
 
+        # Everything that needs the knowledge base waits until it has loaded
+        self.kb_buttons = (self.upload_button, self.upload_folder_button, self.add_button, self.search_button)
+        for button in self.kb_buttons:
+            button.config(state="disabled")
+        self.loading_bar.start(10)
+        threading.Thread(target=self._load_kb_manager, daemon=True).start()
+        master.after(100, self._check_loading)
+        print(f"UI interactive after {time.perf_counter() - _START_TIME:.2f}s")
+
+    def _load_kb_manager(self):
+        """Imports and loads KBManager and the embedding model. Runs on a background thread."""
+        try:
+            self._load_updates.put(("status", "Loading index..."))
+            from knowledge_base.kb_manager import KBManager  # Assuming kb_manager.py is in knowledge_base package
+            kb_manager = KBManager()  # Initialize KBManager
+            self._load_updates.put(("status", "Loading embedding model..."))
+            kb_manager.load_model()
+            self._load_updates.put(("done", kb_manager))
+        except Exception as e:
+            self._load_updates.put(("error", e))
+
+    def _check_loading(self):
+        """Applies messages from the loading thread; Tk widgets may only be touched from this thread."""
+        try:
+            while True:
+                kind, value = self._load_updates.get_nowait()
+                if kind == "status":
+                    self.loading_label.config(text=value)
+                elif kind == "done":
+                    self.kb_manager = value
+                    self.loading_bar.stop()
+                    elapsed = time.perf_counter() - _START_TIME
+                    self.loading_label.config(text=f"Knowledge base ready ({len(value.items)} items, "
+                                                   f"loaded in {elapsed:.1f}s)")
+                    print(f"Knowledge base loaded after {elapsed:.2f}s")
+                    for button in self.kb_buttons:
+                        button.config(state="normal")
+                    return
+                elif kind == "error":
+                    self.loading_bar.stop()
+                    self.loading_label.config(text=f"Error loading knowledge base: {value}")
+                    return
+        except queue.Empty:
+            pass
+        self.master.after(100, self._check_loading)
+
     '''def upload_file(self):
         """Opens a file dialog to select a text file and adds its content to the knowledge base."""
         filepath = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
@@ -88,6 +151,41 @@ class KnowledgeBaseUI:
         else:
             self.upload_status_label.config(text="No file selected")'''
     
+    def _run_in_background(self, work, on_done, status):
+        """Runs work() on a worker thread so the window stays responsive, then calls on_done(result, error) here.
+
+        The knowledge base buttons are disabled meanwhile, so only one change is made to the index at a time.
+        work() may report progress with self._task_updates.put(("status", text, None)).
+        """
+        for button in self.kb_buttons:
+            button.config(state="disabled")
+        self.upload_status_label.config(text=status)
+
+        def target():
+            try:
+                self._task_updates.put(("done", work(), None))
+            except Exception as e:
+                self._task_updates.put(("done", None, e))
+
+        threading.Thread(target=target, daemon=True).start()
+        self.master.after(100, self._check_task, on_done)
+
+    def _check_task(self, on_done):
+        """Applies messages from the background task; Tk widgets may only be touched from this thread."""
+        try:
+            while True:
+                kind, value, error = self._task_updates.get_nowait()
+                if kind == "status":
+                    self.upload_status_label.config(text=value)
+                else:
+                    for button in self.kb_buttons:
+                        button.config(state="normal")
+                    on_done(value, error)
+                    return
+        except queue.Empty:
+            pass
+        self.master.after(100, self._check_task, on_done)
+
     def upload_file(self):
         """Opens a file dialog to select a file and adds its content to the knowledge base."""
         filepath = filedialog.askopenfilename(
@@ -99,50 +197,45 @@ class KnowledgeBaseUI:
             ]
         )
         if filepath:
-            try:
-                filename = os.path.basename(filepath)
-                title = filename.rsplit(".", 1)[0]  # Remove extension
-                content = ""
-
-                if filepath.endswith(".txt"):
-                    with open(filepath, "r") as f:
-                        content = f.read()
-                elif filepath.endswith(".pdf"):
-                    content = self.extract_text_from_pdf(filepath)
-                elif filepath.endswith((".docx", ".doc")):
-                    content = self.extract_text_from_word(filepath)
-                else:
-                    raise ValueError("Unsupported file type")
+            filename = os.path.basename(filepath)
+            title = filename.rsplit(".", 1)[0]  # Remove extension
 
-                self.kb_manager.add_knowledge(title, content)
-                self.upload_status_label.config(text=f"Uploaded: {filename}")
+            def work():
+                from knowledge_base.parsers import clean_text, extract_text
+                self.kb_manager.add_knowledge(title, clean_text(extract_text(filepath)))
 
-            except Exception as e:
-                self.upload_status_label.config(text=f"Error: {e}")
+            def on_done(_, error):
+                if error is not None:
+                    self.upload_status_label.config(text=f"Error: {error}")
+                else:
+                    self.upload_status_label.config(text=f"Uploaded: {filename}")
+
+            self._run_in_background(work, on_done, f"Uploading {filename}...")
         else:
             self.upload_status_label.config(text="No file selected")
 
-    def extract_text_from_pdf(self, filepath):
-        """Extracts text from a PDF file using PyMuPDF."""
-        text = ""
-        try:
-            with fitz.open(filepath) as doc:
-                for page in doc:
-                    text += page.get_text()
-        except Exception as e:
-            raise ValueError(f"Error reading PDF: {e}")
-        return text
+    def upload_folder(self):
+        """Adds every .txt, .pdf and .docx file in a folder, parsing them in worker processes.
+
+        Very large folders are better ingested overnight with ingest.py; both resume where they stopped.
+        """
+        directory = filedialog.askdirectory()
+        if not directory:
+            self.upload_status_label.config(text="No folder selected")
+            return
+
+        def work():
+            from knowledge_base.ingest import IngestPipeline
+            pipeline = IngestPipeline(self.kb_manager)
+            pipeline.run(directory, on_progress=lambda stats: self._task_updates.put(
+                ("status", f"Uploading: {stats['ingested']} files added, {stats['failed']} failed", None)))
+            return pipeline.report()
+
+        def on_done(report, error):
+            self.upload_status_label.config(text=f"Error: {error}" if error is not None else report)
+
+        self._run_in_background(work, on_done, f"Uploading {os.path.basename(directory)}...")
 
-    def extract_text_from_word(self, filepath):
-        """Extracts text from a Word file using python-docx."""
-        text = ""
-        try:
-            doc = docx.Document(filepath)
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-        except Exception as e:
-            raise ValueError(f"Error reading Word file: {e}")
-        return text
     # ... (rest of the class remains the same)
     
 
@@ -151,10 +244,16 @@ class KnowledgeBaseUI:
         title = self.title_entry.get()
         content = self.content_text.get("1.0", tk.END)
         if title and content:
-            self.kb_manager.add_knowledge(title, content)
-            self.title_entry.delete(0, tk.END)
-            self.content_text.delete("1.0", tk.END)
-            self.upload_status_label.config(text="Knowledge added successfully")
+            def on_done(_, error):
+                if error is not None:
+                    self.upload_status_label.config(text=f"Error: {error}")
+                else:
+                    self.title_entry.delete(0, tk.END)
+                    self.content_text.delete("1.0", tk.END)
+                    self.upload_status_label.config(text="Knowledge added successfully")
+
+            self._run_in_background(lambda: self.kb_manager.add_knowledge(title, content), on_done,
+                                    "Adding knowledge...")
         else:
             self.upload_status_label.config(text="Title and content are required")
 
@@ -162,6 +261,9 @@ class KnowledgeBaseUI:
         """Searches the knowledge base based on semantic similarity to the prompt."""
         query = self.prompt_entry.get()
         results = self.kb_manager.search_knowledge(query)
+        if not self.first_query_reported:
+            self.first_query_reported = True
+            print(f"First query answered after {time.perf_counter() - _START_TIME:.2f}s")
         self.response_text.config(state="normal")
         self.response_text.delete("1.0", tk.END)
         if results:
@@ -180,8 +282,10 @@ class KnowledgeBaseUI:
 
 def main():
     root = tk.Tk()
-    KnowledgeBaseUI(root)
+    ui = KnowledgeBaseUI(root)
     root.mainloop()
+    if ui.kb_manager is not None:
+        ui.kb_manager.flush()  # Additions are otherwise replayed from the log on the next start
 
 if __name__ == "__main__":
     main()
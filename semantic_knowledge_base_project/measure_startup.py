@@ -0,0 +1,39 @@
+import argparse
+import importlib
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures UI import time and time-to-first-query without opening a window.")
+    parser.add_argument("--query", default="system is slow", help="Query used for the first search")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    importlib.import_module("main")  # Should stay cheap: heavy modules are imported lazily
+    ui_import = time.perf_counter() - start_time
+
+    from knowledge_base.kb_manager import KBManager
+    kb_import = time.perf_counter() - start_time - ui_import
+
+    load_start = time.perf_counter()
+    kb_manager = KBManager()
+    index_load = time.perf_counter() - load_start
+
+    model_start = time.perf_counter()
+    kb_manager.load_model()
+    model_load = time.perf_counter() - model_start
+
+    query_start = time.perf_counter()
+    kb_manager.search_knowledge(args.query)
+    first_query = time.perf_counter() - query_start
+
+    print(f"import main.py:          {ui_import * 1000:8.1f} ms")
+    print(f"import KBManager:        {kb_import * 1000:8.1f} ms")
+    print(f"load index:              {index_load * 1000:8.1f} ms")
+    print(f"load embedding model:    {model_load * 1000:8.1f} ms")
+    print(f"first query:             {first_query * 1000:8.1f} ms")
+    print(f"time to first query:     {(time.perf_counter() - start_time) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
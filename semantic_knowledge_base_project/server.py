@@ -0,0 +1,322 @@
+import argparse
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from knowledge_base.kb_manager import KBManager
+from knowledge_base.partitions import PartitionedKB
+
+
+class ReadWriteLock:
+    """Lets any number of readers in at once, or a single writer. Waiting writers block new readers."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if self._readers == 0:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+
+class LatencyHistogram:
+    """Counts request latencies in fixed millisecond buckets."""
+
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)  # The last bucket holds everything slower
+        self.total = 0
+        self.total_ms = 0.0
+
+    def record(self, milliseconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BUCKETS_MS, milliseconds)] += 1
+            self.total += 1
+            self.total_ms += milliseconds
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket that contains the given fraction of requests."""
+        target = fraction * self.total
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return self.BUCKETS_MS[bucket] if bucket < len(self.BUCKETS_MS) else float("inf")
+        return 0
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+            return {
+                "count": self.total,
+                "mean_ms": self.total_ms / self.total if self.total else 0.0,
+                "p50_ms": self.percentile(0.50),
+                "p95_ms": self.percentile(0.95),
+                "p99_ms": self.percentile(0.99),
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+class SearchService:
+    """Holds one warm KBManager (or PartitionedKB) and serialises writers against concurrent readers."""
+
+    def __init__(self, kb_manager):
+        self.kb_manager = kb_manager
+        self.partitioned = isinstance(kb_manager, PartitionedKB)
+        self.lock = ReadWriteLock()
+        self.histograms = {}
+        self._histograms_lock = threading.Lock()
+
+    def histogram(self, endpoint):
+        with self._histograms_lock:
+            return self.histograms.setdefault(endpoint, LatencyHistogram())
+
+    @staticmethod
+    def _result_to_dict(result):
+        result_dict = {"title": result.title, "score": result.score, "passages": result.passages,
+                       "metadata": result.metadata}
+        if result.partition is not None:
+            result_dict["partition"] = result.partition
+        return result_dict
+
+    def _check_partitions(self, partitions):
+        if partitions and not self.partitioned:
+            raise ValueError("this server was not started with --partitions")
+
+    def search(self, queries, top_k, filters=None, partitions=None):
+        self._check_partitions(partitions)
+        self.lock.acquire_read()
+        try:
+            if self.partitioned:
+                results = self.kb_manager.search_many(queries, top_k, filters, partitions or None)
+            else:
+                results = self.kb_manager.search_many(queries, top_k, filters)
+        finally:
+            self.lock.release_read()
+        return [[self._result_to_dict(result) for result in query_results] for query_results in results]
+
+    @staticmethod
+    def _check_title(title, data_dir):
+        """Titles become file names, so a title must not reach outside the data folder."""
+        if not isinstance(title, str) or any(part in title for part in ("\0", "/", "\\", os.sep, "..")):
+            raise ValueError("title must not contain '/', '\\', '..' or NUL characters")
+        data_dir = os.path.realpath(data_dir)
+        path = os.path.realpath(os.path.join(data_dir, f"{title}.txt"))
+        if os.path.dirname(path) != data_dir:
+            raise ValueError("title must name a file inside the data folder")
+
+    def add(self, title, content, metadata=None, partition=None):
+        if self.partitioned and not partition:
+            raise ValueError("partition is required")
+        self._check_partitions(partition)
+        if self.partitioned:
+            self._check_title(title, os.path.join(self.kb_manager.data_root, partition))
+        else:
+            self._check_title(title, self.kb_manager.data_dir)
+        self.lock.acquire_write()
+        try:
+            if self.partitioned:
+                self.kb_manager.add_knowledge(partition, title, content, metadata)
+            else:
+                self.kb_manager.add_knowledge(title, content, metadata)
+        finally:
+            self.lock.release_write()
+
+    def stats(self):
+        self.lock.acquire_read()
+        try:
+            if self.partitioned:
+                partitions = self.kb_manager.stats()
+                counts = {
+                    "items": sum(partition["items"] for partition in partitions.values()),
+                    "vectors": sum(partition["vectors"] for partition in partitions.values()),
+                    "query_embedding_cache": self.kb_manager.query_cache.stats(),
+                    "partitions": partitions,
+                }
+            else:
+                counts = {
+                    "items": len(self.kb_manager.items),
+                    "vectors": self.kb_manager.vector_index.ntotal,
+                    "caches": self.kb_manager.cache_stats(),
+                }
+        finally:
+            self.lock.release_read()
+        with self._histograms_lock:
+            histograms = dict(self.histograms)
+        counts["latency"] = {endpoint: histogram.snapshot() for endpoint, histogram in histograms.items()}
+        return counts
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """Routes the JSON endpoints:
+
+    GET  /search?q=...&top_k=5          results for one query
+    POST /search  {"queries": [...], "top_k": 5}   results for many queries
+    POST /add     {"title": ..., "content": ...}   adds a knowledge item
+    GET  /stats                          item counts, cache counters and latency histograms
+
+    Searches take optional filters on document metadata: `filters` in the POST body (see AttributeStore)
+    or `filter.<attribute>=<value>` query parameters, repeated for "any of". Items are added with an
+    optional "metadata" dict. With --partitions, searches take `partition` (repeatable, default: all)
+    or "partitions": [...], and /add requires "partition".
+    """
+
+    service = None  # Set by make_server
+    protocol_version = "HTTP/1.1"  # Keep connections alive between requests
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _timed(self, endpoint, handler):
+        start_time = time.perf_counter()
+        try:
+            status, payload = handler()
+        except (ValueError, KeyError, TypeError) as e:
+            status, payload = 400, {"error": f"Bad request: {e}"}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self.service.histogram(endpoint).record(elapsed_ms)
+        if isinstance(payload, dict):
+            payload.setdefault("took_ms", round(elapsed_ms, 3))
+        self._send_json(status, payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/search":
+            def handler():
+                query = params["q"][0]
+                top_k = int(params.get("top_k", ["5"])[0])
+                filters = {name[len("filter."):]: values[0] if len(values) == 1 else values
+                           for name, values in params.items() if name.startswith("filter.")}
+                return 200, {"results": self.service.search([query], top_k, filters or None,
+                                                            params.get("partition"))[0]}
+            self._timed("search", handler)
+        elif url.path == "/stats":
+            self._send_json(200, self.service.stats())
+        elif url.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/search":
+            def handler():
+                request = self._read_json()
+                return 200, {"results": self.service.search(list(request["queries"]), int(request.get("top_k", 5)),
+                                                            request.get("filters"), request.get("partitions"))}
+            self._timed("search_many", handler)
+        elif url.path == "/add":
+            def handler():
+                request = self._read_json()
+                title, content = request["title"], request["content"]
+                if not title or not content:
+                    raise ValueError("title and content are required")
+                self.service.add(title, content, request.get("metadata"), request.get("partition"))
+                return 201, {"added": title}
+            self._timed("add", handler)
+        else:
+            self._send_json(404, {"error": f"Unknown path {url.path}"})
+
+    def log_message(self, format, *args):
+        pass  # Latency is tracked in /stats instead of one log line per request
+
+
+def make_server(kb_manager, host="127.0.0.1", port=8765):
+    """Creates a threaded HTTP server around an already loaded KBManager. Its SearchService is `server.service`."""
+    service = SearchService(kb_manager)
+    handler = type("BoundSearchRequestHandler", (SearchRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves the semantic knowledge base over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data-dir", default="data/knowledge_items")
+    parser.add_argument("--embeddings-dir", default="embeddings")
+    parser.add_argument("--model", default="all-mpnet-base-v2")
+    parser.add_argument("--index-type", default="flat", choices=("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "pq"))
+    parser.add_argument("--metric", default="l2", choices=("l2", "cosine"))
+    parser.add_argument("--encoder-backend", default="torch", choices=("torch", "int8", "onnx", "onnx_int8"),
+                        help="fp32 PyTorch, int8-quantised PyTorch, ONNX Runtime or int8 ONNX Runtime")
+    parser.add_argument("--retrieval", default="dense", choices=("dense", "lexical", "hybrid"),
+                        help="With hybrid, result scores are reciprocal-rank sums (about 0.01-0.03), not similarities")
+    parser.add_argument("--partitions", action="store_true",
+                        help="Serve every sub-folder of --data-dir as a separate partition sharing one model")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    options = dict(model_name=args.model, index_type=args.index_type, metric=args.metric, retrieval=args.retrieval,
+                   encoder_backend=args.encoder_backend)
+    if args.partitions:
+        kb_manager = PartitionedKB(args.data_dir, args.embeddings_dir, **options)
+        kb_manager.encoder.encode(["warm up"])  # The first encode is slow; pay for it before serving requests
+        items = sum(partition["items"] for partition in kb_manager.stats().values())
+        print(f"Loaded {items} items in {len(kb_manager.names)} partitions in {time.perf_counter() - start_time:.1f}s")
+    else:
+        kb_manager = KBManager(data_dir=args.data_dir, embeddings_dir=args.embeddings_dir, **options)
+        # The first encode is slow; pay for it before serving requests. Encoding directly also loads the model
+        # for an empty index and keeps the warm-up query out of the result cache.
+        kb_manager.load_model().encode(["warm up"])
+        print(f"Loaded {len(kb_manager.items)} items in {time.perf_counter() - start_time:.1f}s")
+
+    server = make_server(kb_manager, args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Handler threads may still be adding a document; the write lock waits for them to finish
+        server.service.lock.acquire_write()
+        try:
+            kb_manager.flush()  # Write additions that are only in the log to the snapshots
+        finally:
+            server.service.lock.release_write()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import hashlib
+import numpy as np
+import pytest
+
+
+class FakeEncoder:
+    """Stands in for the SentenceTransformer model: each word adds 1 to a dimension picked by its hash, so
+    texts that share words get similar vectors. It remembers every text it encoded."""
+
+    dimension = 32
+
+    def __init__(self):
+        self.encoded = []
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype="float32")
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.strip(".,").encode()).hexdigest(), 16) % self.dimension] += 1.0
+        return vector
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, **kwargs):
+        if isinstance(texts, str):
+            self.encoded.append(texts)
+            return self._vector(texts)
+        self.encoded.extend(texts)
+        return np.array([self._vector(text) for text in texts], dtype="float32").reshape(len(texts), self.dimension)
+
+
+@pytest.fixture
+def encoder():
+    return FakeEncoder()
@@ -0,0 +1,44 @@
+import numpy as np
+from conftest import FakeEncoder
+from knowledge_base.embedder import BatchEmbedder
+
+
+class PaddingEncoder(FakeEncoder):
+    """Like a real model, its output for a text moves by a rounding-sized amount with the padding added to
+    reach the longest text in the batch."""
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, **kwargs):
+        vectors = super().encode(texts, batch_size, convert_to_numpy)
+        if isinstance(texts, str):
+            return vectors
+        longest = max(len(text.split()) for text in texts)
+        padding = np.array([longest - len(text.split()) for text in texts], dtype="float32")
+        return vectors + 1e-7 * padding[:, None]
+
+
+TEXTS = [" ".join(f"word{number}" for number in range(length)) for length in (12, 3, 40, 7, 1, 25, 3, 18)]
+
+
+def test_batches_keep_the_input_order():
+    embedder = BatchEmbedder("fake", model=FakeEncoder(), batch_size=3)
+    assert embedder._make_batches(TEXTS) == [[4, 1, 6], [3, 0, 7], [5, 2]]  # Shortest texts first
+    embeddings = embedder.encode(TEXTS)
+    assert embeddings.dtype == np.float32 and embeddings.shape == (len(TEXTS), FakeEncoder.dimension)
+    one_by_one = np.array([FakeEncoder().encode(text) for text in TEXTS])
+    assert np.array_equal(embeddings, one_by_one)
+
+
+def test_padded_batches_match_single_texts_within_tolerance():
+    embeddings = BatchEmbedder("fake", model=PaddingEncoder(), batch_size=4).encode(TEXTS)
+    one_by_one = np.array([PaddingEncoder().encode(text) for text in TEXTS])
+    assert not np.array_equal(embeddings, one_by_one)  # Not bit for bit...
+    assert np.allclose(embeddings, one_by_one, rtol=0, atol=1e-5)  # ...but within the documented tolerance
+
+
+def test_report_counts_chunks():
+    embedder = BatchEmbedder("fake", model=FakeEncoder(), batch_size=4)
+    assert embedder.report() == "No chunks embedded yet."
+    embedder.encode(TEXTS)
+    assert embedder.last_stats["chunks"] == len(TEXTS)
+    assert embedder.report().startswith(f"Embedded {len(TEXTS)} chunks in ")
+    assert "chunks/sec, batch size 4, 0 workers" in embedder.report()
@@ -0,0 +1,122 @@
+import os
+from conftest import FakeEncoder
+from knowledge_base.kb_manager import KBManager
+
+DOCUMENTS = {
+    "VPN drops": "The VPN connection drops every few minutes on home Wi-Fi. Reinstall the VPN client and reset "
+                 "the network adapter.",
+    "Printer offline": "The office printer shows offline. Restart the print spooler service and clear the "
+                       "printer queue.",
+    "Outlook access denied": "Outlook fails with error 0x80070005 access denied when opening the shared mailbox. "
+                             "Remove and add the mailbox permissions again.",
+}
+METADATA = {
+    "VPN drops": {"team": "network", "date": "2024-03-01"},
+    "Printer offline": {"team": "desktop", "date": "2024-05-10"},
+    "Outlook access denied": {"team": "desktop", "date": "2025-01-15"},
+}
+
+
+def make_kb(tmp_path, encoder, **options):
+    return KBManager(str(tmp_path / "data"), str(tmp_path / "embeddings"), encoder=encoder, **options)
+
+
+def write_documents(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for title, content in DOCUMENTS.items():
+        (data_dir / f"{title}.txt").write_text(content)
+    return data_dir
+
+
+def touch(path, seconds=10):
+    """Moves a file's modification time forward, as an edit a little later would."""
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime + seconds, stat.st_mtime + seconds))
+
+
+def titles(results):
+    return [result.title for result in results]
+
+
+def test_build_and_reload(tmp_path, encoder):
+    write_documents(tmp_path)
+    kb = make_kb(tmp_path, encoder)
+    assert sorted(kb.items) == sorted(f"{title}.txt" for title in DOCUMENTS)
+    assert kb.vector_index.ntotal == len(kb.chunks_by_id) == len(encoder.encoded)
+    assert titles(kb.search_knowledge("vpn connection drops", top_k=1)) == ["VPN drops"]
+
+    reloaded_encoder = FakeEncoder()
+    reloaded = make_kb(tmp_path, reloaded_encoder)
+    assert reloaded_encoder.encoded == []  # Nothing changed, so nothing is embedded again
+    assert reloaded.chunks_by_id == kb.chunks_by_id
+    assert reloaded.vector_index.ntotal == kb.vector_index.ntotal
+    assert titles(reloaded.search_knowledge("vpn connection drops", top_k=1)) == ["VPN drops"]
+    assert reloaded_encoder.encoded == ["vpn connection drops"]
+
+
+def test_edits_and_deletions_are_synced_on_start(tmp_path, encoder):
+    data_dir = write_documents(tmp_path)
+    kb = make_kb(tmp_path, encoder, chunk_size=8, chunk_overlap=2)
+    old_ids = {vector_id for vector_id, _, _ in kb.manifest.documents["Printer offline.txt"]["chunks"]}
+    assert len(old_ids) > 1
+
+    new_content = "The printer needs new toner cartridges before it prints again."
+    (data_dir / "Printer offline.txt").write_text(new_content)
+    touch(data_dir / "Printer offline.txt")
+    (data_dir / "VPN drops.txt").unlink()
+    touch(data_dir / "Outlook access denied.txt")  # Touched but not edited: its content hash still matches
+
+    reloaded_encoder = FakeEncoder()
+    reloaded = make_kb(tmp_path, reloaded_encoder, chunk_size=8, chunk_overlap=2)
+    assert sorted(reloaded.items) == ["Outlook access denied.txt", "Printer offline.txt"]
+    assert reloaded_encoder.encoded and all(text in new_content for text in reloaded_encoder.encoded)
+    new_ids = {vector_id for vector_id, _, _ in reloaded.manifest.documents["Printer offline.txt"]["chunks"]}
+    assert not new_ids & old_ids
+    assert set(reloaded.chunks_by_id) == set(reloaded.manifest.all_vector_ids())
+    assert reloaded.vector_index.ntotal == len(reloaded.chunks_by_id)
+
+    results = reloaded.search_knowledge("printer toner cartridges")
+    assert titles(results)[0] == "Printer offline"
+    assert all("spooler" not in passage for passage in results[0].passages)
+    assert "VPN drops" not in titles(reloaded.search_knowledge("vpn connection drops"))
+
+
+def test_log_is_replayed_up_to_a_truncated_record(tmp_path, encoder):
+    kb = make_kb(tmp_path, encoder, flush_every=1000, flush_interval=3600)
+    for title in ("VPN drops", "Printer offline"):
+        kb.add_knowledge(title, DOCUMENTS[title], METADATA[title])
+    kb.add_knowledge("Outlook access denied", DOCUMENTS["Outlook access denied"])
+    assert kb.wal.records == 3
+    kb.wal.close()
+    # The process dies while the last record is being written
+    wal_path = tmp_path / "embeddings" / "wal.log"
+    os.truncate(wal_path, wal_path.stat().st_size - 10)
+
+    reloaded_encoder = FakeEncoder()
+    reloaded = make_kb(tmp_path, reloaded_encoder)
+    assert sorted(reloaded.items) == sorted(f"{title}.txt" for title in DOCUMENTS)
+    # The two complete records come back from the log; only the file of the torn one is embedded again
+    assert reloaded_encoder.encoded == [DOCUMENTS["Outlook access denied"]]
+    assert reloaded.items["VPN drops.txt"].metadata == METADATA["VPN drops"]
+    assert reloaded.vector_index.ntotal == len(reloaded.chunks_by_id) == 3
+    assert reloaded.wal.size() == 0  # The recovered state was written to a snapshot
+    for title, content in DOCUMENTS.items():
+        assert titles(reloaded.search_knowledge(content, top_k=1)) == [title]
+
+
+def test_filters_and_hybrid_search(tmp_path, encoder):
+    kb = make_kb(tmp_path, encoder, retrieval="hybrid")
+    kb.add_knowledge_batch([(title, content, METADATA[title]) for title, content in DOCUMENTS.items()])
+
+    results = kb.search_knowledge("0x80070005")
+    assert titles(results)[0] == "Outlook access denied"  # The exact code is found by BM25
+    assert results[0].score < 0.05  # Reciprocal-rank fusion scores, not similarities
+
+    assert set(titles(kb.search_knowledge("restart", filters={"team": "desktop"}))) == {
+        "Printer offline", "Outlook access denied"}
+    assert titles(kb.search_knowledge("vpn", filters={"team": "network"})) == ["VPN drops"]
+    assert titles(kb.search_knowledge("offline", filters={"date": {"gte": "2025-01-01"}})) == [
+        "Outlook access denied"]
+    assert len(kb.search_knowledge("error", filters={"team": ["network", "desktop"]})) == 3
+    assert kb.search_knowledge("vpn", filters={"team": "sales"}) == []